@@ -2,6 +2,8 @@
 ASGI config for OnlineShop project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+It serves the notification stream and long-poll endpoints, which wait on
+Redis without tying up a worker per open connection.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
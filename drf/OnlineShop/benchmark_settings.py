@@ -0,0 +1,37 @@
+from .settings import *
+
+# For a local server measured by manage.py benchmark_http, e.g.
+#   DJANGO_SETTINGS_MODULE=OnlineShop.benchmark_settings gunicorn OnlineShop.wsgi
+
+# Checkout without leaving the machine
+PAYMENT_GATEWAY = "payments.gateways.FakeGateway"
+
+# The X-Query-Count header queries per request are read from
+if "query_budget.QueryBudgetMiddleware" not in MIDDLEWARE:
+    MIDDLEWARE.insert(0, "query_budget.QueryBudgetMiddleware")
+
+# Still throttled, so their cost is measured, but never hitting the limits
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_THROTTLE_RATES": {
+        **REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+        "anon": "1000000/second",
+        "user": "1000000/second",
+    },
+}
+
+# BENCHMARK_DATABASE=sqlite swaps PostgreSQL for benchmark.sqlite3, and
+# BENCHMARK_CACHE=locmem Redis for a cache in each process. SQLite fails
+# concurrent writes with "database is locked", so measure the cart and
+# checkout scenarios there with --concurrency 1.
+if config("BENCHMARK_DATABASE", default="postgresql") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "benchmark.sqlite3",
+            "OPTIONS": {"timeout": 20},
+        }
+    }
+if config("BENCHMARK_CACHE", default="redis") == "locmem":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    NOTIFICATIONS_PUBSUB_URL = ""
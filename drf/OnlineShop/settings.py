@@ -23,6 +23,8 @@ SECRET_KEY = config(
 )
 MERCHANT = config("Zarinpal_MERCHANT", default="0000")
 SANDBOX = config("SANDBOX", default=False, cast=bool)
+# Dotted path of the payments.gateways.PaymentGateway used at checkout
+PAYMENT_GATEWAY = config("PAYMENT_GATEWAY", default="payments.gateways.ZarinpalGateway")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config("DEBUG", default=False, cast=bool)
 
@@ -55,6 +57,7 @@ INSTALLED_APPS = [
     "payments",
     "zarinpal",
     "notifications",
+    "jobs",
 ]
 
 MIDDLEWARE = [
@@ -68,6 +71,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Count the queries of every request into X-Query-* response headers and
+# log views going over their query_budget, see query_budget.py
+QUERY_BUDGETS = config("QUERY_BUDGETS", default=DEBUG, cast=bool)
+if QUERY_BUDGETS:
+    MIDDLEWARE.insert(0, "query_budget.QueryBudgetMiddleware")
+
 ROOT_URLCONF = "OnlineShop.urls"
 
 TEMPLATES = [
@@ -113,6 +122,58 @@ CACHES = {
     }
 }
 
+# Seconds a worker may keep its in-process index of active discounts.
+# Discount changes and discount start/end times rebuild it sooner.
+DISCOUNT_INDEX_MAX_AGE = 60 * 5
+
+# Seconds checkout holds stock for an order while its payment is pending
+INVENTORY_RESERVATION_TTL = 60 * 15
+
+# Run jobs.queue.enqueue'd calls right away instead of leaving them to the
+# run_jobs worker
+JOBS_EAGER = config("JOBS_EAGER", default=False, cast=bool)
+# Attempts a job gets unless enqueued with max_attempts. Retry n waits
+# JOBS_RETRY_DELAY * 2 ** (n - 1) seconds, at most JOBS_RETRY_MAX_DELAY.
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 60 * 60
+# Most jobs of a queue running at once, over all workers
+JOBS_QUEUE_CONCURRENCY = {
+    "payments": 4,
+    "sms": 2,
+}
+# Seconds after which a running job is taken for the leftover of a dead
+# worker and queued again
+JOBS_STALLED_AFTER = 60 * 10
+# Days finished jobs of each status are kept, for job_stats and the admin,
+# before run_jobs deletes them. None keeps them for good.
+JOBS_RETENTION = {
+    "done": 7,
+    "failed": 30,
+}
+
+# Redis new notifications are published on for the streaming endpoints.
+# Left empty, open streams look for new rows every NOTIFICATIONS_POLL_INTERVAL
+# seconds instead.
+NOTIFICATIONS_PUBSUB_URL = config(
+    "NOTIFICATIONS_PUBSUB_URL", default=config("REDIS_LOCATION")
+)
+NOTIFICATIONS_POLL_INTERVAL = 2
+# Seconds a notification stream stays open before the client reconnects,
+# and a long poll waits at most
+NOTIFICATIONS_STREAM_TIMEOUT = 60 * 5
+NOTIFICATIONS_LONG_POLL_TIMEOUT = 25
+# Seconds a cached unread notification count lives before being counted
+# again from the database
+NOTIFICATIONS_UNREAD_COUNT_TIMEOUT = 60 * 10
+# Days read notifications of each type stay before archive_notifications
+# moves them to the archive table. None keeps them for good.
+NOTIFICATION_RETENTION = {
+    "new_order": 30,
+    "order_status": 180,
+    "custom": None,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -158,6 +219,10 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "account.User"
 
+# The browsable API and admin renderers are for development. Without them
+# every endpoint answers JSON, without looking at the Accept header.
+BROWSABLE_API = config("BROWSABLE_API", default=DEBUG, cast=bool)
+
 # REST_FRAMEWORK
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
@@ -171,13 +236,26 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    # Same output as the rest_framework JSON classes, through orjson
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",  # comment on production
-        "rest_framework.renderers.AdminRenderer",  # comment on production
+        "renderers.FastJSONRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
+if BROWSABLE_API:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] += [
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "rest_framework.renderers.AdminRenderer",
+    ]
+else:
+    REST_FRAMEWORK["DEFAULT_CONTENT_NEGOTIATION_CLASS"] = (
+        "renderers.JSONOnlyContentNegotiation"
+    )
 
 
 SPECTACULAR_SETTINGS = {
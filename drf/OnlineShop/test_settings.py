@@ -6,3 +6,16 @@ DATABASES = {
         "NAME": "db.sqlite3",
     }
 }
+
+# Test transactions roll back without signals, so a per-process index of
+# discounts would outlive the rows it was built from
+DISCOUNT_INDEX_MAX_AGE = 0
+
+PAYMENT_GATEWAY = "payments.gateways.FakeGateway"
+
+# Tests have no run_jobs worker to pick queued jobs up
+JOBS_EAGER = True
+
+# Notification streams look for new rows in the database, quickly
+NOTIFICATIONS_PUBSUB_URL = ""
+NOTIFICATIONS_POLL_INTERVAL = 0.05
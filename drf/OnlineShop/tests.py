@@ -0,0 +1,451 @@
+import io
+
+from account.factories import AddressFactory, UserFactory
+from asgiref.sync import sync_to_async
+from cart.models import Cart, CartItem
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from notifications.models import Notification
+from orders.factories import OrderFactory
+from orders.models import Order
+from payments.factories import CouponFactory
+from payments.models import Payment
+from PIL import Image
+from products.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductImageFactory,
+    ProductVariantFactory,
+    ReviewFactory,
+    TagFactory,
+)
+from query_budget import QueryRecorder, get_budget
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Routes that are not measured, by URL name, and why
+UNMEASURED = {
+    "admin": "Django admin",
+    "schema": "OpenAPI schema, no database",
+    "swagger-ui": "OpenAPI schema, no database",
+    "redoc": "OpenAPI schema, no database",
+    "zarinpal:request": "Calls out to the payment gateway",
+    "zarinpal:verify": "Calls out to the payment gateway",
+    "notifications:notification-stream": "Async, its queries run in other threads",
+    "notifications:notification-poll": "Async, its queries run in other threads",
+}
+
+
+def png():
+    data = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(data, "PNG")
+    return SimpleUploadedFile("pixel.png", data.getvalue(), "image/png")
+
+
+def url_names(resolver=None, namespace=None):
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            inner = pattern.namespace or namespace
+            if pattern.app_name == "admin":
+                yield "admin"
+                continue
+            yield from url_names(pattern, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f"{namespace}:{pattern.name}" if namespace else pattern.name
+
+
+@override_settings(JOBS_EAGER=False)
+class QueryBudgetTest(APITestCase):
+    """
+    Every route runs within the query budget its view declares, and the
+    same number of queries whether there are a few or several times more
+    rows behind it. Writes are rolled back, so each request sees the same
+    data. Caches are cleared first, so it is the uncached path measured,
+    and jobs are queued as in production rather than run in the request.
+    """
+
+    SIZES = (2, 5)
+
+    def setUp(self):
+        self.admin = UserFactory(is_staff=True, is_admin=True)
+        self.customer = UserFactory()
+        self.address = AddressFactory(user=self.customer)
+        self.category = CategoryFactory()
+        self.tag = TagFactory()
+        self.cart = Cart.objects.create(user=self.customer)
+        self.coupon = CouponFactory(
+            usage_count=0, applicable_to=[], applicable_categories=[self.category]
+        )
+        self.size = 0
+
+    def grow(self, size):
+        """
+        Bring every collection up to ``size`` rows: products, the images,
+        variants and reviews of the first one, cart items, orders and their
+        items, addresses and notifications.
+        """
+        for _ in range(size - self.size):
+            product = ProductFactory(category=self.category)
+            self.product = getattr(self, "product", product)
+            self.tag.products.add(product)
+            ProductImageFactory(product=self.product)
+            # One price, so deleting one leaves the card's price range as is
+            variant = ProductVariantFactory(product=self.product, price=1000)
+            ProductVariantFactory(product=product)
+            ReviewFactory(product=self.product)
+            self.coupon.applicable_to.add(variant)
+            CartItem.objects.create(
+                cart=self.cart, product_variant=variant, quantity=1, price=variant.price
+            )
+            self.order = OrderFactory(
+                user=self.customer,
+                shipping_address=self.address,
+                status=Order.Status.PAID,
+                items__size=size,
+            )
+            Payment.objects.create(
+                order=self.order,
+                amount=1000,
+                transaction_id=self.order.transaction_id,
+            )
+            AddressFactory(user=self.customer)
+            Notification.objects.create(
+                user=self.customer, notification_type="custom", message="Hello"
+            )
+        self.size = size
+        self.variant = self.product.variants.first()
+        self.image = self.product.images.first()
+        self.cart_item = self.cart.items.first()
+        self.notification = self.customer.notifications.first()
+
+    def routes(self):
+        """(URL name, method, user, URL kwargs, data) of every measured request."""
+        product = {"pk": self.product.pk}
+        variant = {"pk": self.variant.pk}
+        image = {"pk": self.image.pk}
+        category = {"pk": self.category.pk}
+        tag = {"slug": self.tag.slug}
+        order = {"pk": self.order.pk}
+        notification = {"pk": self.notification.pk}
+        product_fields = {
+            "category": self.category.pk,
+            "title": "Budget product",
+            "attributes": {"color": "red", "size": "M"},
+        }
+        variant_fields = {
+            "product": self.product.pk,
+            "title": "Budget variant",
+            "price": 1000,
+            "attributes": {"color": "red", "size": "M"},
+        }
+        return [
+            ("products:product-list", "GET", None, {}, {}),
+            ("products:product-list", "POST", self.admin, {}, product_fields),
+            ("products:product-detail", "GET", None, product, {}),
+            ("products:product-detail", "PUT", self.admin, product, {"title": "New"}),
+            ("products:product-detail", "DELETE", self.admin, product, {}),
+            ("products:product-search-filter", "GET", None, {}, {"facets": "true"}),
+            ("products:product-variant-list", "GET", None, {}, {}),
+            ("products:product-variant-list", "POST", self.admin, {}, variant_fields),
+            ("products:product-variant-detail", "GET", None, variant, {}),
+            (
+                "products:product-variant-detail",
+                "PUT",
+                self.admin,
+                variant,
+                {"price": 5},
+            ),
+            ("products:product-variant-detail", "DELETE", self.admin, variant, {}),
+            ("products:product-image-list", "GET", None, {}, {}),
+            (
+                "products:product-image-list",
+                "POST",
+                self.admin,
+                {},
+                {"product": self.product.pk, "image": png()},
+            ),
+            ("products:product-image-detail", "GET", None, image, {}),
+            (
+                "products:product-image-detail",
+                "PUT",
+                self.admin,
+                image,
+                {"alt_text": "A"},
+            ),
+            ("products:product-image-detail", "DELETE", self.admin, image, {}),
+            ("products:category-list", "GET", None, {}, {}),
+            ("products:category-list", "POST", self.admin, {}, {"title": "Budget"}),
+            ("products:category-detail", "GET", None, category, {}),
+            ("products:category-detail", "PUT", self.admin, category, {"title": "New"}),
+            ("products:category-detail", "DELETE", self.admin, category, {}),
+            ("products:tag-list", "GET", None, {}, {}),
+            (
+                "products:tag-list",
+                "POST",
+                self.admin,
+                {},
+                {"name": "Budget", "products": [self.product.pk]},
+            ),
+            ("products:tag-detail", "GET", None, tag, {}),
+            ("products:tag-detail", "PUT", self.admin, tag, {"name": "New"}),
+            ("products:tag-detail", "DELETE", self.admin, tag, {}),
+            (
+                "products:inventory-detail",
+                "GET",
+                None,
+                {"product_variant_id": self.variant.pk},
+                {},
+            ),
+            (
+                "products:inventory-detail",
+                "PUT",
+                self.admin,
+                {"product_variant_id": self.variant.pk},
+                {"quantity": 50},
+            ),
+            (
+                "products:inventory-detail",
+                "DELETE",
+                self.admin,
+                {"product_variant_id": self.variant.pk},
+                {},
+            ),
+            ("products:review-list", "GET", None, {"product_id": self.product.pk}, {}),
+            (
+                "products:review-list",
+                "POST",
+                self.admin,
+                {"product_id": self.product.pk},
+                {"rating": 4, "comment": "Fine"},
+            ),
+            ("cart:cart-add-get", "GET", self.customer, {}, {}),
+            (
+                "cart:cart-add-get",
+                "POST",
+                self.customer,
+                {},
+                {"product_variant": self.variant.pk, "quantity": 1},
+            ),
+            ("cart:cart-review", "GET", self.customer, {}, {}),
+            (
+                "cart:cart-item-edit",
+                "PUT",
+                self.customer,
+                {"item_id": self.cart_item.pk},
+                {"quantity": 2},
+            ),
+            (
+                "cart:cart-item-edit",
+                "DELETE",
+                self.customer,
+                {"item_id": self.cart_item.pk},
+                {},
+            ),
+            ("cart:cart-clear", "DELETE", self.customer, {}, {}),
+            (
+                "cart:apply-coupon",
+                "POST",
+                self.customer,
+                {},
+                {"coupon_code": self.coupon.code},
+            ),
+            ("orders:user-order-list", "GET", self.customer, {}, {}),
+            ("orders:all-order-list", "GET", self.admin, {}, {}),
+            ("orders:order-detail", "GET", self.admin, order, {}),
+            (
+                "orders:order-detail",
+                "PUT",
+                self.admin,
+                order,
+                {"status": Order.Status.SHIPPED},
+            ),
+            ("orders:order-detail", "DELETE", self.admin, order, {}),
+            ("orders:refound-order", "POST", self.admin, order, {}),
+            (
+                "payments:checkout",
+                "POST",
+                self.customer,
+                {},
+                {"shipping_address": self.address.pk},
+            ),
+            (
+                "payments:verify_payment",
+                "GET",
+                None,
+                {},
+                {"Authority": self.order.transaction_id, "Status": "OK"},
+            ),
+            (
+                "account:check_login_phone",
+                "POST",
+                None,
+                {},
+                {"phone_number": self.customer.phone_number},
+            ),
+            ("account:send-otp", "POST", None, {}, {"phone_number": "09120000000"}),
+            (
+                "account:verify_otp",
+                "POST",
+                None,
+                {},
+                {"phone_number": "09120000000", "otp": "12345"},
+            ),
+            (
+                "account:token_obtain_pair",
+                "POST",
+                None,
+                {},
+                {"phone_number": self.customer.phone_number, "password": "secret"},
+            ),
+            (
+                "account:token_refresh",
+                "POST",
+                None,
+                {},
+                {"refresh": str(RefreshToken.for_user(self.customer))},
+            ),
+            ("account:user-info", "GET", self.customer, {}, {}),
+            ("account:user-info", "POST", self.customer, {}, {"first_name": "Sam"}),
+            ("account:user-addresses", "GET", self.customer, {}, {}),
+            (
+                "account:add-address",
+                "POST",
+                self.customer,
+                {},
+                {
+                    "country": "Iran",
+                    "state": "Tehran",
+                    "city": "Tehran",
+                    "street": "Azadi",
+                    "postal_code": "1234567890",
+                },
+            ),
+            ("notifications:notification-list", "GET", self.customer, {}, {}),
+            (
+                "notifications:notification-detail",
+                "GET",
+                self.customer,
+                notification,
+                {},
+            ),
+            (
+                "notifications:notification-detail",
+                "PATCH",
+                self.customer,
+                notification,
+                {"is_read": True},
+            ),
+            (
+                "notifications:notification-detail",
+                "DELETE",
+                self.customer,
+                notification,
+                {},
+            ),
+            (
+                "notifications:notification-get-by-timeframe",
+                "POST",
+                self.customer,
+                {},
+                {
+                    "start_date": "2020-01-01T00:00:00Z",
+                    "end_date": timezone.now().isoformat(),
+                },
+            ),
+            ("notifications:notification-unread-count", "GET", self.customer, {}, {}),
+            ("notifications:notification-mark-all-read", "POST", self.customer, {}, {}),
+        ]
+
+    def request(self, name, method, user, kwargs, data):
+        if user is None:
+            self.client.credentials()
+        else:
+            token = RefreshToken.for_user(user).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        if name == "account:token_obtain_pair":
+            self.customer.set_password("secret")
+            self.customer.save()
+        if name == "account:verify_otp":
+            cache.set("otp:09120000000", "12345")
+
+        url = reverse(name, kwargs=kwargs)
+        if method == "GET":
+            return self.client.get(url, data)
+        data_format = "multipart" if name == "products:product-image-list" else "json"
+        return getattr(self.client, method.lower())(url, data, format=data_format)
+
+    def measure(self):
+        """``{(URL name, method): (response, recorder)}`` of every route."""
+        results = {}
+        for name, method, user, kwargs, data in self.routes():
+            with transaction.atomic():
+                cache.clear()
+                with QueryRecorder() as recorder:
+                    response = self.request(name, method, user, kwargs, data)
+                transaction.set_rollback(True)
+            results[name, method] = response, recorder
+        return results
+
+    def test_routes_within_budget(self):
+        counts = {}
+        for size in self.SIZES:
+            self.grow(size)
+            for (name, method), (response, recorder) in self.measure().items():
+                budget = get_budget(response.resolver_match.func, method)
+                with self.subTest(name, method=method, size=size):
+                    self.assertLess(response.status_code, 500)
+                    self.assertIsNotNone(budget, "Declare a query_budget")
+                    self.assertLessEqual(recorder.count, budget, "Over budget")
+                counts.setdefault((name, method), []).append(recorder.count)
+
+        for (name, method), (small, large) in counts.items():
+            with self.subTest(name, method=method):
+                self.assertEqual(small, large, "Queries grow with the data")
+
+    def test_every_route_is_measured(self):
+        self.grow(1)
+        measured = {name for name, *_ in self.routes()}
+        for name in set(url_names()) - {"api-root", "notifications:api-root"}:
+            with self.subTest(name):
+                self.assertTrue(
+                    name in measured or name in UNMEASURED,
+                    "Add the route to QueryBudgetTest.routes",
+                )
+
+    @override_settings(
+        MIDDLEWARE=["query_budget.QueryBudgetMiddleware"],
+    )
+    def test_debug_headers(self):
+        self.grow(1)
+        response = self.client.get(reverse("products:product-list"))
+        self.assertEqual(int(response["X-Query-Duplicates"]), 0)
+        self.assertLessEqual(
+            int(response["X-Query-Count"]), int(response["X-Query-Budget"])
+        )
+
+    @override_settings(
+        MIDDLEWARE=["query_budget.QueryBudgetMiddleware"],
+        NOTIFICATIONS_STREAM_TIMEOUT=0.1,
+    )
+    async def test_debug_headers_under_asgi(self):
+        await sync_to_async(self.grow)(1)
+        response = await self.async_client.get(reverse("products:product-list"))
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+        self.assertLessEqual(
+            int(response["X-Query-Count"]), int(response["X-Query-Budget"])
+        )
+
+        token = RefreshToken.for_user(self.customer).access_token
+        response = await self.async_client.get(
+            reverse("notifications:notification-stream"), {"token": str(token)}
+        )
+        self.assertEqual(response.status_code, 200)
+        # Most of a stream's queries run after the headers are sent
+        self.assertNotIn("X-Query-Count", response)
+        async for _ in response.streaming_content:
+            pass
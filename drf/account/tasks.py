@@ -0,0 +1,14 @@
+from django.core.cache import cache
+from utils import send_otp_code
+
+
+def send_otp_sms(phone_number):
+    """
+    Text the code ``phone_number`` is waiting to verify. Read from the cache
+    here, so the code never lands in the jobs table.
+    """
+    otp_code = cache.get(f"otp:{phone_number}")
+    # Expired or already used, there is nothing worth sending
+    if otp_code is None:
+        return
+    send_otp_code(phone_number, otp_code)
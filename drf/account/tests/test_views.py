@@ -1,5 +1,6 @@
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
@@ -7,6 +8,9 @@ from rest_framework.test import APIClient
 
 from account.factories import AddressFactory, UserFactory
 from account.models import Address, User
+from account.tasks import send_otp_sms
+from account.views import GenerateSendOTP
+from jobs.models import Job
 
 
 class UserCheckLoginPhoneTest(TestCase):
@@ -60,6 +64,21 @@ class GenerateSendOTPTest(TestCase):
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(JOBS_EAGER=False)
+    @patch("account.tasks.send_otp_code")
+    def test_sms_job_reads_the_code_from_the_cache(self, mock_send_otp_code):
+        view = GenerateSendOTP()
+        view.save_otp("09123456789", "12345")
+        view.send_otp("09123456789")
+        # Only the phone number is stored with the job
+        self.assertEqual(Job.objects.get().args, ["09123456789"])
+
+        send_otp_sms("09123456789")
+        mock_send_otp_code.assert_called_once_with("09123456789", "12345")
+        cache.delete("otp:09123456789")
+        send_otp_sms("09123456789")
+        self.assertEqual(mock_send_otp_code.call_count, 1)
+
 
 @override_settings(
     REST_FRAMEWORK={"DEFAULT_THROTTLE_CLASSES": [], "DEFAULT_THROTTLE_RATES": {}}
@@ -1,4 +1,5 @@
 from django.urls import path
+from query_budget import query_budget
 from rest_framework_simplejwt import views as jwt_views
 
 from . import views
@@ -13,8 +14,16 @@ urlpatterns = [
     ),
     path("send-otp/", views.GenerateSendOTP.as_view(), name="send-otp"),
     path("verify-otp/", views.VerifyOTP.as_view(), name="verify_otp"),
-    path("login/", jwt_views.TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("login/refresh/", jwt_views.TokenRefreshView.as_view(), name="token_refresh"),
+    path(
+        "login/",
+        query_budget(2)(jwt_views.TokenObtainPairView.as_view()),
+        name="token_obtain_pair",
+    ),
+    path(
+        "login/refresh/",
+        query_budget(0)(jwt_views.TokenRefreshView.as_view()),
+        name="token_refresh",
+    ),
     path(
         "user-info/", views.UserInfoView.as_view(), name="user-info"
     ),  # also use for setting password in post method
@@ -1,15 +1,17 @@
 from django.core.cache import cache
 from django.utils import timezone
+from jobs.queue import enqueue
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from utils import generate_otp, send_otp_code
+from utils import generate_otp
 
 from .models import Address, User
 from .serializers import AddressSerializer, UserSerializer
+from .tasks import send_otp_sms
 
 
 # TODO: Fix bugs in add new address with default=True.
@@ -24,6 +26,8 @@ class UserCheckLoginPhone(APIView):
         - havePass: True if the user already have password. False if user doesn't set password. \n
     """
 
+    query_budget = 1
+
     def post(self, request, *args, **kwargs):
         phone_number = request.data.get("phone_number")
         if not phone_number:
@@ -58,6 +62,8 @@ class GenerateSendOTP(APIView):
         - message: Informational message \n
     """
 
+    query_budget = 0
+
     def post(self, request, *args, **kwargs):
         phone_number = request.data.get("phone_number")
 
@@ -68,7 +74,7 @@ class GenerateSendOTP(APIView):
         try:
             otp_code = generate_otp()
             self.save_otp(phone_number, otp_code)
-            # self.send_otp(phone_number, otp_code) # uncomment in production
+            # self.send_otp(phone_number) # uncomment in production
 
             return Response(
                 {
@@ -111,11 +117,10 @@ class GenerateSendOTP(APIView):
         cache_key = f"otp:{phone_number}"
         cache.set(cache_key, otp_code, timeout=300) # 5 minutes expiration
 
-    def send_otp(self, phone_number, otp_code):
-        try:
-            send_otp_code(phone_number, otp_code)
-        except Exception as e:
-            raise ValidationError(f"Failed to send OTP. Please try again later. {e}")
+    def send_otp(self, phone_number):
+        # The SMS API is slow and flaky, the jobs worker sends and retries.
+        # The task reads the code from the cache, see save_otp.
+        enqueue(send_otp_sms, phone_number, queue="sms")
 
 
 class VerifyOTP(APIView):
@@ -132,6 +137,8 @@ class VerifyOTP(APIView):
         - refresh: JWT refresh token if OTP is valid \n
     """
 
+    query_budget = 3
+
     def post(self, request):
         try:
             phone_number = request.data.get("phone_number")
@@ -190,6 +197,7 @@ class VerifyOTP(APIView):
 
 class UserInfoView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {"GET": 1, "POST": 2}
 
     def get(self, request):
         """
@@ -243,6 +251,7 @@ class UserInfoView(APIView):
 
 class AddressView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {"GET": 2, "POST": 4}
 
     def get(self, request, *args, **kwargs):
         """
@@ -57,7 +57,7 @@ class CartItem(models.Model):
         return self.quantity * self.price
 
     def clean(self):
-        if self.quantity > self.product_variant.inventory.quantity:
+        if self.quantity > self.product_variant.inventory.available:
             raise ValidationError("Requested quantity exceeds available stock.")
         if self.product_variant.product.available is False:
             raise ValidationError("Requested product is not available at the moment.")
@@ -1,6 +1,5 @@
-from django.db import models
-from django.utils import timezone
-from payments.models import Discount
+from django.db.models import Prefetch, prefetch_related_objects
+from payments.discounts import get_active_discounts
 from payments.serializers import CouponSerializer
 from products.models import ProductVariant
 from rest_framework import serializers
@@ -36,27 +35,17 @@ class CartItemSerializer(serializers.ModelSerializer):
         representation["subtotal"] = discounted_price * instance.quantity
         return representation
 
+    def get_active_discounts(self):
+        # Shared through the root serializer's context, so a whole cart is
+        # priced from a single load
+        context = self.context
+        if "active_discounts" not in context:
+            context["active_discounts"] = get_active_discounts()
+        return context["active_discounts"]
+
     def get_discounted_price(self, instance):
-        product_variant = instance.product_variant
-        original_price = product_variant.price
-
-        # Check for applicable discounts
-        discounts = Discount.objects.filter(
-            models.Q(applicable_to=product_variant)
-            | models.Q(applicable_categories=product_variant.product.category),
-            is_active=True,
-            valid_from__lte=timezone.now(),
-            valid_to__gte=timezone.now(),
-        ).order_by(
-            "-discount_percent"
-        )  # Get the highest discount
-
-        if discounts.exists():
-            discount = discounts.first()
-            discounted_price = original_price * (1 - discount.discount_percent / 100)
-            return max(discounted_price, 0)  # Ensure price doesn't go below 0
-
-        return original_price
+        # Highest active discount on the variant or its category
+        return self.get_active_discounts().price_for(instance.product_variant)
 
     def validate_product_variant(self, product_variant):
         if product_variant.product.available is False:
@@ -76,7 +65,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             except ProductVariant.DoesNotExist:
                 raise serializers.ValidationError("Invalid product variant.")
 
-        if quantity > product_variant.inventory.quantity:
+        if quantity > product_variant.inventory.available:
             raise serializers.ValidationError(
                 "Requested quantity exceeds available stock."
             )
@@ -120,13 +109,21 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "updated_at"]
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        total_price = sum(
-            item.product_variant.price * item.quantity for item in instance.items.all()
+        # Items with their variant and product in one query, reused by the
+        # nested items and the totals below
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                "items",
+                queryset=CartItem.objects.select_related("product_variant__product"),
+            ),
         )
+        representation = super().to_representation(instance)
+        items = instance.items.all()
+        total_price = sum(item.product_variant.price * item.quantity for item in items)
         total_discounted_price = sum(
             self.fields["items"].child.get_discounted_price(item) * item.quantity
-            for item in instance.items.all()
+            for item in items
         )
 
         representation["total_price"] = total_price
@@ -135,7 +132,7 @@ class CartSerializer(serializers.ModelSerializer):
         final_price = total_discounted_price
         if instance.coupon and instance.coupon.is_valid():
             final_price *= 1 - instance.coupon.discount_percent / 100
-        else:
+        elif instance.coupon_id:
             # Remove invalid coupon from cart
             instance.coupon = None
             instance.save()
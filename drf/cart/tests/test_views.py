@@ -1,8 +1,8 @@
 from account.factories import UserFactory
 from django.urls import reverse
 from django.utils import timezone
-from payments.factories import CouponFactory
-from products.factories import ProductVariantFactory
+from payments.factories import CouponFactory, DiscountFactory
+from products.factories import CategoryFactory, ProductFactory, ProductVariantFactory
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -23,6 +23,26 @@ class CartViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("items", response.data)
 
+    def test_get_cart_query_count_is_constant(self):
+        category = CategoryFactory()
+        product = ProductFactory(category=category)
+        variants = [
+            ProductVariantFactory(product=product, title=f"Variant {i}", price=1000)
+            for i in range(20)
+        ]
+        for variant in variants:
+            CartItemFactory(cart=self.cart, product_variant=variant, quantity=1)
+        DiscountFactory(discount_percent=10, applicable_categories=[category])
+        DiscountFactory(discount_percent=30, applicable_to=variants[:2])
+
+        url = reverse("cart:cart-review")
+        # Cart, its items with variants and products, then two for discounts
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["items"]), 20)
+        self.assertEqual(response.data["total_price"], 20000)
+        self.assertEqual(response.data["total_discounted_price"], 2 * 700 + 18 * 900)
+
     def test_add_item_to_cart(self):
         url = reverse("cart:cart-add-get")
         data = {"product_variant": self.product_variant.id, "quantity": 2}
@@ -1,3 +1,4 @@
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from payments.models import Coupon
 from rest_framework import status
@@ -11,6 +12,7 @@ from .serializers import CartItemSerializer, CartSerializer
 
 class CartView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {"GET": 5, "POST": 12, "PUT": 12, "DELETE": 3}
 
     def get_cart(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
@@ -96,6 +98,7 @@ class CartView(APIView):
 
 class ClearCartView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
 
     def delete(self, request):
         """
@@ -122,6 +125,7 @@ class ClearCartView(APIView):
 
 class ApplyCouponView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 10
 
     def post(self, request):
         """
@@ -156,13 +160,12 @@ class ApplyCouponView(APIView):
                 {"error": "Coupon is not valid"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if the coupon is applicable to the items in the cart
-        if not any(
-            item.product_variant in coupon.applicable_to.all()
-            or item.product_variant.product.category
-            in coupon.applicable_categories.all()
-            for item in cart.items.all()
-        ):
+        # Check if the coupon is applicable to the items in the cart, in one
+        # query however many there are
+        applicable = Q(product_variant__in=coupon.applicable_to.all()) | Q(
+            product_variant__product__category__in=coupon.applicable_categories.all()
+        )
+        if not cart.items.filter(applicable).exists():
             return Response(
                 {"error": "Coupon is not applicable to any items in your cart"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "task",
+        "queue",
+        "status",
+        "attempts",
+        "duration",
+        "created_at",
+    )
+    list_filter = ("status", "queue")
+    search_fields = ("task", "dedup_key")
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from jobs.models import Job
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Show how the jobs of the last hours went per queue and task: how "
+        "many ran, failed and were retried, how long they waited past their "
+        "due time and how long they ran."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"])
+        rows = Job.objects.filter(finished_at__gte=since).values_list(
+            "queue",
+            "task",
+            "status",
+            "attempts",
+            "duration",
+            "run_after",
+            "started_at",
+        )
+        groups = defaultdict(list)
+        for queue, task, *row in rows:
+            groups[queue, task].append(row)
+
+        backlog = Job.objects.filter(status=Job.Status.QUEUED).count()
+        self.stdout.write(f"{backlog} jobs queued.")
+        self.stdout.write(
+            f"{'queue':<14}{'task':<48}{'done':>7}{'failed':>7}{'retried':>8}"
+            f"{'wait p95':>10}{'run avg':>9}{'run p95':>9}{'run max':>9}"
+        )
+        for (queue, task), jobs in sorted(groups.items()):
+            done = sum(status == Job.Status.DONE for status, *_ in jobs)
+            failed = sum(status == Job.Status.FAILED for status, *_ in jobs)
+            retried = sum(attempts > 1 for _, attempts, *_ in jobs)
+            durations = [duration for _, _, duration, *_ in jobs if duration]
+            # Jobs queued for a retry are due after their last start
+            waits = [
+                (started_at - run_after).total_seconds()
+                for *_, run_after, started_at in jobs
+                if started_at >= run_after
+            ]
+            average = sum(durations) / len(durations) if durations else 0
+            self.stdout.write(
+                f"{queue:<14}{task[-47:]:<48}{done:>7}{failed:>7}{retried:>8}"
+                f"{percentile(waits, 0.95):>10.3f}{average:>9.3f}"
+                f"{percentile(durations, 0.95):>9.3f}"
+                f"{max(durations, default=0):>9.3f}"
+            )
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from jobs.worker import (
+    claim_job,
+    purge_finished_jobs,
+    requeue_stalled_jobs,
+    run_job,
+)
+
+# Seconds between two purges of the finished jobs, see JOBS_RETENTION
+PURGE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs, polling for new ones until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue",
+            action="append",
+            dest="queues",
+            help="Only run jobs of this queue, can be repeated",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=1,
+            help="Jobs run at once by this worker, within the queue limits",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=1,
+            help="Seconds to wait before looking again when no job is due",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as no job is due instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.ran = 0
+        self.ran_lock = threading.Lock()
+        self.next_purge = 0
+        self.purge_lock = threading.Lock()
+        requeue_stalled_jobs()
+
+        # The main thread works too, extra threads each get a connection
+        threads = [
+            threading.Thread(target=self.work, args=(options,))
+            for _ in range(options["threads"] - 1)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self.work(options)
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Let the running jobs finish
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Ran {self.ran} jobs."))
+
+    def work(self, options):
+        try:
+            while not self.stop.is_set():
+                job = claim_job(options["queues"])
+                if job is None:
+                    self.purge_if_due()
+                    if options["once"]:
+                        return
+                    requeue_stalled_jobs()
+                    self.stop.wait(options["poll"])
+                    continue
+                run_job(job)
+                with self.ran_lock:
+                    self.ran += 1
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                # Each thread opened its own connection
+                connection.close()
+
+    def purge_if_due(self):
+        # By whichever thread is idle first
+        with self.purge_lock:
+            if time.monotonic() < self.next_purge:
+                return
+            self.next_purge = time.monotonic() + PURGE_INTERVAL
+        purge_finished_jobs()
@@ -0,0 +1,69 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A function call to run outside the request, by the run_jobs worker.
+    Rows are written in the caller's transaction, so a job only becomes
+    visible to the worker once the work that queued it has committed.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    queue = models.CharField(max_length=50, default="default")
+    # Dotted path of the function to call
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    # Only one queued job per key, see jobs.queue.enqueue
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Failed attempts are retried with a growing delay until this many ran
+    max_attempts = models.PositiveIntegerField(default=1)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Seconds the last attempt ran for
+    duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(status="queued"),
+                name="unique_queued_job",
+            ),
+        ]
+        indexes = [
+            # What the worker polls for
+            models.Index(
+                fields=["queue", "run_after"],
+                name="job_queued_idx",
+                condition=models.Q(status="queued"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+
+class JobQueue(models.Model):
+    """
+    One row per queue with a concurrency limit, locked by workers while
+    they count the queue's running jobs.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,75 @@
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task_path(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, *args, queue="default", dedup_key=None, max_attempts=None, **kwargs):
+    """
+    Have the run_jobs worker call ``func(*args, **kwargs)``; arguments must
+    be JSON serializable. A failing call is retried up to ``max_attempts``
+    times (JOBS_MAX_ATTEMPTS by default), so it should be safe to repeat.
+    While a job with the same ``dedup_key`` is still queued no other one is
+    added and that job is returned instead.
+    With JOBS_EAGER set, ``func`` is called once right away, errors are
+    logged like the worker does, and None is returned.
+    """
+    if settings.JOBS_EAGER:
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Eager job %s failed", task_path(func))
+        return None
+
+    job = Job(
+        queue=queue,
+        task=task_path(func),
+        args=list(args),
+        kwargs=kwargs,
+        dedup_key=dedup_key,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(dedup_key=dedup_key, status=Job.Status.QUEUED)
+    return job
+
+
+def enqueue_each(func, calls, queue="default", dedup_key=None, max_attempts=None):
+    """
+    enqueue ``func(*args)`` for each ``args`` of ``calls``, in one INSERT
+    whatever their number. ``dedup_key(*args)`` gives the key of each job;
+    calls whose key is still queued are left out. With JOBS_EAGER set, the
+    calls are made right away, one after the other.
+    """
+    if settings.JOBS_EAGER:
+        for args in calls:
+            enqueue(func, *args)
+        return
+
+    Job.objects.bulk_create(
+        [
+            Job(
+                queue=queue,
+                task=task_path(func),
+                args=list(args),
+                dedup_key=dedup_key(*args) if dedup_key else None,
+                max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+            )
+            for args in calls
+        ],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,180 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import enqueue, enqueue_each
+from jobs.worker import (
+    claim_job,
+    purge_finished_jobs,
+    requeue_stalled_jobs,
+    run_job,
+)
+
+calls = []
+
+
+def record(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+def explode():
+    raise ValueError("boom")
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_stores_the_call(self):
+        job = enqueue(record, 1, "two", queue="mail", key="value")
+        job.refresh_from_db()
+        self.assertEqual(job.task, "jobs.tests.test_models.record")
+        self.assertEqual(job.queue, "mail")
+        self.assertEqual(job.args, [1, "two"])
+        self.assertEqual(job.kwargs, {"key": "value"})
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertEqual(calls, [])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_enqueue_calls_right_away(self):
+        self.assertIsNone(enqueue(record, 1, key="value"))
+        self.assertEqual(calls, [((1,), {"key": "value"})])
+        self.assertFalse(Job.objects.exists())
+
+    def test_dedup_key_only_queues_once(self):
+        job = enqueue(record, 1, dedup_key="same")
+        self.assertEqual(enqueue(record, 2, dedup_key="same"), job)
+        self.assertEqual(Job.objects.count(), 1)
+
+        run_job(claim_job())
+        self.assertNotEqual(enqueue(record, 3, dedup_key="same"), job)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_enqueue_each_in_one_query(self):
+        enqueue(record, 1, dedup_key="key-1")
+        with self.assertNumQueries(1):
+            enqueue_each(
+                record,
+                [(1,), (2,), (3,)],
+                queue="cards",
+                dedup_key=lambda number: f"key-{number}",
+            )
+        self.assertEqual(
+            sorted(Job.objects.values_list("dedup_key", "args")),
+            [("key-1", [1]), ("key-2", [2]), ("key-3", [3])],
+        )
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_enqueue_each_calls_right_away(self):
+        enqueue_each(record, [(1,), (2,)])
+        self.assertEqual(calls, [((1,), {}), ((2,), {})])
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_runs_due_jobs_of_its_queues(self):
+        enqueue(record, 1)
+        enqueue(record, 2, queue="other")
+        later = enqueue(record, 3)
+        Job.objects.filter(pk=later.pk).update(
+            run_after=timezone.now() + timezone.timedelta(minutes=5)
+        )
+
+        call_command("run_jobs", "--once", "--queue", "default", stdout=StringIO())
+        self.assertEqual(calls, [((1,), {})])
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).get().args, [1])
+
+    def test_failed_job_keeps_the_error(self):
+        enqueue(explode, max_attempts=1)
+        with self.assertLogs("jobs.worker", "ERROR"):
+            job = run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("ValueError: boom", job.last_error)
+        self.assertIsNone(claim_job())
+
+    @override_settings(JOBS_RETRY_DELAY=10, JOBS_RETRY_MAX_DELAY=30)
+    def test_failed_job_retried_with_backoff(self):
+        job = enqueue(explode, max_attempts=4)
+        delays = []
+        for _ in range(3):
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            with self.assertLogs("jobs.worker", "WARNING"):
+                job = run_job(claim_job())
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.QUEUED)
+            self.assertIsNone(claim_job())
+            delays.append(round((job.run_after - job.finished_at).total_seconds()))
+        self.assertEqual(delays, [10, 20, 30])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs("jobs.worker", "ERROR"):
+            job = run_job(claim_job())
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 4)
+        self.assertIsNotNone(job.duration)
+
+    @override_settings(JOBS_QUEUE_CONCURRENCY={"limited": 1})
+    def test_queue_concurrency_limit(self):
+        enqueue(record, 1, queue="limited")
+        enqueue(record, 2, queue="limited")
+        enqueue(record, 3)
+        first = claim_job()
+        self.assertEqual(first.args, [1])
+        # The other limited job waits for the running one
+        self.assertEqual(claim_job().args, [3])
+        self.assertIsNone(claim_job())
+
+        run_job(first)
+        self.assertEqual(claim_job().args, [2])
+
+    @override_settings(JOBS_STALLED_AFTER=60)
+    def test_stalled_jobs_are_queued_again(self):
+        enqueue(record, 1)
+        job = claim_job()
+        self.assertEqual(requeue_stalled_jobs(), 0)
+        Job.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - timezone.timedelta(minutes=5)
+        )
+        self.assertEqual(requeue_stalled_jobs(), 1)
+        self.assertEqual(claim_job(), job)
+
+    @override_settings(JOBS_RETENTION={"done": 7, "failed": None})
+    def test_finished_jobs_purged_past_retention(self):
+        old = timezone.now() - timezone.timedelta(days=8)
+        recent = timezone.now() - timezone.timedelta(days=6)
+        jobs = {
+            (status, finished_at): Job.objects.create(
+                task="jobs.tests.test_models.record",
+                status=status,
+                finished_at=finished_at,
+            )
+            for status in (Job.Status.DONE, Job.Status.FAILED)
+            for finished_at in (old, recent)
+        }
+        queued = enqueue(record, 1)
+
+        self.assertEqual(purge_finished_jobs(batch_size=1), 1)
+        self.assertFalse(Job.objects.filter(pk=jobs[Job.Status.DONE, old].pk).exists())
+        self.assertEqual(Job.objects.count(), len(jobs))
+        self.assertTrue(Job.objects.filter(pk=queued.pk).exists())
+
+    def test_job_stats(self):
+        enqueue(record, 1)
+        enqueue(explode, max_attempts=1)
+        with self.assertLogs("jobs.worker"):
+            call_command("run_jobs", "--once", stdout=StringIO())
+        out = StringIO()
+        call_command("job_stats", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "0 jobs queued.")
+        self.assertEqual(
+            [line.split()[:4] for line in lines[2:]],
+            [
+                ["default", "jobs.tests.test_models.explode", "0", "1"],
+                ["default", "jobs.tests.test_models.record", "1", "0"],
+            ],
+        )
@@ -0,0 +1,169 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job, JobQueue
+
+logger = logging.getLogger(__name__)
+
+
+def has_free_slot(queue):
+    limit = settings.JOBS_QUEUE_CONCURRENCY.get(queue)
+    if limit is None:
+        return True
+    # Holding the queue row makes counting and claiming one step for all
+    # workers, so the limit holds however many of them poll the queue
+    JobQueue.objects.get_or_create(name=queue)
+    JobQueue.objects.select_for_update().get(name=queue)
+    running = Job.objects.filter(queue=queue, status=Job.Status.RUNNING).count()
+    return running < limit
+
+
+def claim_job(queues=None):
+    """
+    Mark the next due job of ``queues`` (all of them when None) as running
+    and return it, or None. Workers skip the rows others have locked, so
+    any number of them can poll the same queue. Queues already running
+    their JOBS_QUEUE_CONCURRENCY limit of jobs are passed over.
+    """
+    full = set()
+    while True:
+        with transaction.atomic():
+            jobs = Job.objects.select_for_update(skip_locked=True).filter(
+                status=Job.Status.QUEUED, run_after__lte=timezone.now()
+            )
+            if queues:
+                jobs = jobs.filter(queue__in=queues)
+            job = jobs.exclude(queue__in=full).order_by("run_after", "pk").first()
+            if job is None:
+                return None
+            if not has_free_slot(job.queue):
+                full.add(job.queue)
+                continue
+            job.status = Job.Status.RUNNING
+            job.started_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=["status", "started_at", "attempts"])
+        return job
+
+
+def retry_delay(attempts):
+    delay = settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.JOBS_RETRY_MAX_DELAY))
+
+
+def run_job(job):
+    """
+    Call a claimed job. A failure is queued again after retry_delay while
+    the job has attempts left.
+    """
+    wait = (job.started_at - job.run_after).total_seconds()
+    started = time.perf_counter()
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        job.status = Job.Status.FAILED
+        job.last_error = traceback.format_exc()
+    else:
+        job.status = Job.Status.DONE
+        job.last_error = ""
+    job.duration = time.perf_counter() - started
+    job.finished_at = timezone.now()
+
+    retry = job.status == Job.Status.FAILED and job.attempts < job.max_attempts
+    if retry:
+        job.status = Job.Status.QUEUED
+        job.run_after = job.finished_at + retry_delay(job.attempts)
+    try:
+        with transaction.atomic():
+            job.save(
+                update_fields=[
+                    "status",
+                    "last_error",
+                    "duration",
+                    "finished_at",
+                    "run_after",
+                ]
+            )
+    except IntegrityError:
+        # A job with the same dedup_key was queued meanwhile and does the
+        # same work
+        retry = False
+        job.status = Job.Status.FAILED
+        job.save(update_fields=["status", "last_error", "duration", "finished_at"])
+
+    if job.status == Job.Status.DONE:
+        logger.info(
+            "Job %s (%s) done in %.3fs, %.3fs after it was due",
+            job.pk,
+            job.task,
+            job.duration,
+            wait,
+        )
+    elif retry:
+        logger.warning(
+            "Job %s (%s) failed attempt %s of %s, retrying at %s\n%s",
+            job.pk,
+            job.task,
+            job.attempts,
+            job.max_attempts,
+            job.run_after,
+            job.last_error,
+        )
+    else:
+        logger.error(
+            "Job %s (%s) failed for good after %s attempts\n%s",
+            job.pk,
+            job.task,
+            job.attempts,
+            job.last_error,
+        )
+    return job
+
+
+def requeue_stalled_jobs():
+    """
+    Queue again the jobs left running for longer than JOBS_STALLED_AFTER,
+    whose worker presumably died. Returns how many there were.
+    """
+    stalled_before = timezone.now() - timedelta(seconds=settings.JOBS_STALLED_AFTER)
+    requeued = 0
+    for job in Job.objects.filter(
+        status=Job.Status.RUNNING, started_at__lt=stalled_before
+    ):
+        job.status = Job.Status.QUEUED
+        job.run_after = timezone.now()
+        job.last_error = "Stalled, the worker running it went away"
+        try:
+            with transaction.atomic():
+                job.save(update_fields=["status", "run_after", "last_error"])
+        except IntegrityError:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.Status.FAILED, last_error=job.last_error
+            )
+            continue
+        requeued += 1
+    return requeued
+
+
+def purge_finished_jobs(batch_size=1000):
+    """
+    Delete the finished jobs older than JOBS_RETENTION allows, in batches
+    so the table is never locked for long. Returns how many went.
+    """
+    purged = 0
+    for status, days in settings.JOBS_RETENTION.items():
+        if days is None:
+            continue
+        expired = Job.objects.filter(
+            status=status, finished_at__lt=timezone.now() - timedelta(days=days)
+        )
+        while batch := list(expired.values_list("pk", flat=True)[:batch_size]):
+            purged += Job.objects.filter(pk__in=batch).delete()[0]
+    return purged
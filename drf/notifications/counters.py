@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from notifications.models import Notification
+
+# Unread counts live in the cache and move by deltas as notifications are
+# created, read and deleted. A missing count is taken from the database
+# again, and every count expires after NOTIFICATIONS_UNREAD_COUNT_TIMEOUT,
+# so a delta lost along the way is never wrong for long.
+
+
+def unread_key(user_id):
+    return f"notifications_unread_{user_id}"
+
+
+def get_unread_count(user_id):
+    key = unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(key, count, timeout=settings.NOTIFICATIONS_UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_unread_counts(deltas):
+    """Apply ``{user_id: delta}`` to the cached counts once committed."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def apply():
+        for user_id, delta in deltas.items():
+            key = unread_key(user_id)
+            try:
+                count = cache.incr(key, delta)
+            except ValueError:
+                # Not cached, the next read counts
+                continue
+            if count < 0:
+                cache.delete(key)
+
+    transaction.on_commit(apply)
+
+
+def forget_unread_count(user_id):
+    transaction.on_commit(lambda: cache.delete(unread_key(user_id)))
+
+
+def count_new(notifications):
+    return Counter(
+        notification.user_id
+        for notification in notifications
+        if not notification.is_read
+    )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from notifications.retention import archive_batch, expired_notifications, retention_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Move read notifications past their NOTIFICATION_RETENTION to the "
+        "archive table, in small batches. Meant to run nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches, to go easy on replication",
+        )
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete the expired notifications instead of archiving them",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the expired notifications",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for notification_type, days in sorted(retention_days().items()):
+            expired = expired_notifications(notification_type, days)
+            if options["dry_run"]:
+                moved = expired.count()
+            else:
+                moved = 0
+                while batch := archive_batch(
+                    expired, options["batch_size"], options["purge"]
+                ):
+                    moved += batch
+                    time.sleep(options["sleep"])
+            self.stdout.write(f"{notification_type}: {moved} older than {days} days")
+            total += moved
+
+        if options["dry_run"]:
+            action = "would go"
+        else:
+            action = "purged" if options["purge"] else "archived"
+        self.stdout.write(self.style.SUCCESS(f"{total} notifications {action}."))
@@ -29,8 +29,80 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="notification_user_created_idx",
+            ),
+            # Unread counts and unread lists
+            models.Index(
+                fields=["user", "-created_at"],
+                name="notification_user_unread_idx",
+                condition=models.Q(is_read=False),
+            ),
+            # Read notifications past their retention, see archive_notifications
+            models.Index(
+                fields=["notification_type", "created_at"],
+                name="notification_read_created_idx",
+                condition=models.Q(is_read=True),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        notification = super().from_db(db, field_names, values)
+        # Lets the unread counters tell a notification being read
+        notification._loaded_is_read = notification.__dict__.get("is_read")
+        return notification
 
     def __str__(self):
         return (
             f"{self.user.phone_number} - {self.notification_type} - {self.created_at}"
         )
+
+
+class ArchivedNotification(models.Model):
+    """
+    A read notification past its NOTIFICATION_RETENTION, moved out of the
+    table the API works on by the archive_notifications command. It keeps
+    the id it had.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archived_notifications"
+    )
+    notification_type = models.CharField(
+        max_length=20, choices=Notification.Type.choices
+    )
+    message = models.TextField()
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Copied from Notification as they are
+    ARCHIVED_FIELDS = [
+        "id",
+        "user_id",
+        "notification_type",
+        "message",
+        "is_read",
+        "created_at",
+        "content_type_id",
+        "object_id",
+    ]
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at"], name="archived_user_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.notification_type} - {self.created_at}"
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import ArchivedNotification, Notification
+
+
+def expired_notifications(notification_type, days, now=None):
+    """Read notifications of ``notification_type`` older than ``days``."""
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Notification.objects.filter(
+        notification_type=notification_type, is_read=True, created_at__lt=cutoff
+    )
+
+
+@transaction.atomic
+def archive_batch(notifications, batch_size, purge=False):
+    """
+    Move up to ``batch_size`` of ``notifications`` to the archive, or only
+    delete them when ``purge``. Each batch is its own short transaction, so
+    the API never waits long on the rows it locks. Returns how many went.
+    """
+    ids = list(
+        notifications.select_for_update(skip_locked=True)
+        .order_by("pk")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    if not purge:
+        rows = Notification.objects.filter(pk__in=ids).values(
+            *ArchivedNotification.ARCHIVED_FIELDS
+        )
+        ArchivedNotification.objects.bulk_create(
+            [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+        )
+    Notification.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def retention_days():
+    """``{notification_type: days}`` of the types that expire at all."""
+    return {
+        notification_type: days
+        for notification_type, days in settings.NOTIFICATION_RETENTION.items()
+        if days is not None
+    }
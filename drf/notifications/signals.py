@@ -1,30 +1,55 @@
-from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from jobs.queue import enqueue
 from orders.models import Order
 
+from notifications.counters import adjust_unread_counts, forget_unread_count
 from notifications.models import Notification
-
-User = get_user_model()
+from notifications.streams import publish
+from notifications.tasks import notify_new_order, notify_order_status
 
 
 @receiver(post_save, sender=Order)
-def create_order_notification(sender, instance, created, **kwargs):
+def create_order_notification(sender, instance, created, update_fields, **kwargs):
+    # The notifications are written by the jobs worker, checkout only
+    # queues them
     if created:
-        # Notify admins about new order
-        admins = User.objects.filter(is_staff=True)
-        for admin in admins:
-            Notification.objects.create(
-                user=admin,
-                notification_type="new_order",
-                message=f"New order #{instance.id} has been placed.",
-                content_object=instance,
+        enqueue(notify_new_order, instance.pk, queue="notifications")
+    elif update_fields is None or "status" in update_fields:
+        # Orders are saved several times over a checkout, only an actual
+        # status change is news to the customer
+        loaded_status = getattr(instance, "_loaded_status", None)
+        if instance.status != loaded_status:
+            enqueue(
+                notify_order_status,
+                instance.pk,
+                instance.status,
+                queue="notifications",
+                dedup_key=f"order-status-{instance.pk}-{instance.status}",
             )
+    instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
+    # Bulk inserts send no signals, notifications.tasks publishes those
+    if created:
+        publish([instance])
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, **kwargs):
+    # Nothing existed before a creation, it counts as read
+    was_read = True if created else getattr(instance, "_loaded_is_read", None)
+    if was_read is None:
+        # Not loaded from the database, so no telling what changed
+        forget_unread_count(instance.user_id)
     else:
-        # Notify user about order status change
-        Notification.objects.create(
-            user=instance.user,
-            notification_type=Notification.Type.CHANGE_ORDER,
-            message=f"Your order #{instance.id} status has been updated to {instance.status}.",
-            content_object=instance,
-        )
+        adjust_unread_counts({instance.user_id: was_read - instance.is_read})
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_counts({instance.user_id: -1})
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+from functools import lru_cache
+
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer
+
+# New notifications are published on a per-user Redis channel once their
+# rows commit. Open streams and long polls listen on it, so waiting for
+# news costs Postgres nothing: it is only read once per connection, to
+# catch up on what was missed while disconnected.
+
+logger = logging.getLogger(__name__)
+
+CATCH_UP_LIMIT = 100
+
+
+def channel_name(user_id):
+    return f"notifications:{user_id}"
+
+
+@lru_cache(maxsize=1)
+def get_publisher():
+    return redis.Redis.from_url(settings.NOTIFICATIONS_PUBSUB_URL)
+
+
+def publish(notifications):
+    """Push ``notifications`` to their users' open streams after commit."""
+    if not settings.NOTIFICATIONS_PUBSUB_URL:
+        return
+    messages = [
+        (channel_name(notification.user_id), as_message(notification))
+        for notification in notifications
+    ]
+
+    def send():
+        try:
+            with get_publisher().pipeline(transaction=False) as pipe:
+                for channel, message in messages:
+                    pipe.publish(channel, message)
+                pipe.execute()
+        except redis.RedisError:
+            # Streams catch up from the database when they reconnect
+            logger.warning("Could not publish notifications", exc_info=True)
+
+    transaction.on_commit(send)
+
+
+def as_message(notification):
+    return json.dumps(NotificationSerializer(notification).data, cls=DjangoJSONEncoder)
+
+
+def notifications_after(user_id, after, since=None, limit=CATCH_UP_LIMIT):
+    notifications = Notification.objects.filter(user_id=user_id)
+    if after is not None:
+        notifications = notifications.filter(pk__gt=after)
+    elif since is not None:
+        notifications = notifications.filter(created_at__gt=since)
+    return NotificationSerializer(notifications.order_by("pk")[:limit], many=True).data
+
+
+def catch_up(user_id, after, since):
+    try:
+        return notifications_after(user_id, after, since)
+    finally:
+        # Django only closes it once the request finishes, minutes away for
+        # an open stream, and every waiting client would keep one idle.
+        # Left alone inside a transaction, like a test case's.
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+class Subscription:
+    """
+    The notifications of one user, oldest first, from the one after the id
+    ``after`` on, or those created after ``since`` when there is no id yet.
+    The first ``get`` catches up from the database, later ones wait for
+    published notifications. Without NOTIFICATIONS_PUBSUB_URL the database
+    is asked again every NOTIFICATIONS_POLL_INTERVAL instead.
+    """
+
+    def __init__(self, user_id, after=None, since=None):
+        self.user_id = user_id
+        self.after = after
+        self.since = since
+        self.caught_up = False
+        self.client = self.pubsub = None
+
+    async def __aenter__(self):
+        if settings.NOTIFICATIONS_PUBSUB_URL:
+            self.client = aioredis.Redis.from_url(settings.NOTIFICATIONS_PUBSUB_URL)
+            self.pubsub = self.client.pubsub()
+            # Subscribe before catching up, so nothing committed in between
+            # is missed
+            await self.pubsub.subscribe(channel_name(self.user_id))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            await self.client.aclose()
+
+    async def get(self, timeout):
+        """
+        Return the next notifications, or an empty list when none came
+        within ``timeout`` seconds.
+        """
+        if not self.caught_up:
+            self.caught_up = True
+            notifications = await self.fetch()
+            if notifications:
+                return notifications
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            notifications = await self.wait(remaining)
+            if notifications:
+                return notifications
+        return []
+
+    async def wait(self, timeout):
+        if self.pubsub is None:
+            await asyncio.sleep(min(timeout, settings.NOTIFICATIONS_POLL_INTERVAL))
+            return await self.fetch()
+
+        # Ignored messages, like the subscription confirmation, come back
+        # as None too
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=timeout
+        )
+        notifications = []
+        while message is not None:
+            notifications.append(json.loads(message["data"]))
+            message = await self.pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=0
+            )
+        return self.advance(notifications)
+
+    async def fetch(self):
+        return self.advance(
+            await sync_to_async(catch_up)(self.user_id, self.after, self.since)
+        )
+
+    def advance(self, notifications):
+        # What was caught up on may be published again, skip it
+        if self.after is not None:
+            notifications = [item for item in notifications if item["id"] > self.after]
+        if notifications:
+            self.after = notifications[-1]["id"]
+        return notifications
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from orders.models import Order
+
+from notifications.counters import adjust_unread_counts, count_new
+from notifications.models import Notification
+from notifications.streams import publish
+
+User = get_user_model()
+
+
+def notify_staff(notification_type, message, order_id):
+    """Tell every staff member about an order, in a single INSERT."""
+    order_type = ContentType.objects.get_for_model(Order)
+    staff_ids = User.objects.filter(is_staff=True).values_list("pk", flat=True)
+    notifications = Notification.objects.bulk_create(
+        [
+            Notification(
+                user_id=staff_id,
+                notification_type=notification_type,
+                message=message,
+                content_type=order_type,
+                object_id=order_id,
+            )
+            for staff_id in staff_ids
+        ],
+        batch_size=500,
+    )
+    adjust_unread_counts(count_new(notifications))
+    publish(notifications)
+
+
+def notify_new_order(order_id):
+    notify_staff(
+        Notification.Type.NEW_ORDER,
+        f"New order #{order_id} has been placed.",
+        order_id,
+    )
+
+
+def notify_refund_needed(order_id, payment_id):
+    notify_staff(
+        Notification.Type.CUSTOM,
+        f"Order #{order_id} was paid after its stock sold out, "
+        f"refund payment #{payment_id}.",
+        order_id,
+    )
+
+
+def notify_order_status(order_id, status):
+    """Tell the customer their order moved to ``status``."""
+    user_id = (
+        Order.objects.filter(pk=order_id).values_list("user_id", flat=True).first()
+    )
+    if user_id is None:
+        return
+    Notification.objects.create(
+        user_id=user_id,
+        notification_type=Notification.Type.CHANGE_ORDER,
+        message=f"Your order #{order_id} status has been updated to {status}.",
+        content_type=ContentType.objects.get_for_model(Order),
+        object_id=order_id,
+    )
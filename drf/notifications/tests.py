@@ -1,13 +1,26 @@
+import asyncio
 import json
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from jobs.models import Job
+from orders.factories import OrderFactory
+from orders.models import Order
 
-from notifications.models import Notification
+from notifications.counters import get_unread_count
+from notifications.models import ArchivedNotification, Notification
 from notifications.serializers import NotificationSerializer
 
 User = get_user_model()
@@ -117,6 +130,35 @@ class NotificationViewSetTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_list_notifications_cursor_pagination(self):
+        for index in range(3):
+            Notification.objects.create(
+                user=self.user, notification_type="custom", message=f"Message {index}"
+            )
+        last_checked = self.user.last_notification_check
+        url = reverse("notifications:notification-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["message"] for item in response.data["results"]],
+            ["Message 2", "Message 1", "Message 0"],
+        )
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["id"], self.notification.id)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_notification_check, last_checked)
+
+    def test_list_moves_the_check_without_saving_the_user(self):
+        date_updated = self.user.date_updated
+        response = self.client.get(reverse("notifications:notification-list"))
+        self.assertEqual(len(response.data), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.date_updated, date_updated)
+        response = self.client.get(reverse("notifications:notification-list"))
+        self.assertEqual(response.data, [])
+
     def test_retrieve_notification(self):
         response = self.client.get(
             reverse(
@@ -171,3 +213,310 @@ class NotificationViewSetTest(TestCase):
         self.client.logout()
         response = self.client.get(reverse("notifications:notification-list"))
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class OrderNotificationTest(TestCase):
+    def setUp(self):
+        self.staff = [
+            User.objects.create_user(
+                phone_number=f"091200000{index}", password="testpass123", is_staff=True
+            )
+            for index in range(3)
+        ]
+        self.order = OrderFactory(status=Order.Status.PENDING, items__have_items=False)
+
+    def test_new_order_notifies_every_staff_member(self):
+        notifications = Notification.objects.filter(
+            notification_type=Notification.Type.NEW_ORDER, object_id=self.order.pk
+        )
+        self.assertCountEqual(
+            notifications.values_list("user", flat=True),
+            [user.pk for user in self.staff],
+        )
+
+    def test_saves_without_status_change_notify_nobody(self):
+        self.order.transaction_id = "abc"
+        self.order.save()
+        order = Order.objects.get(pk=self.order.pk)
+        order.save(update_fields=["updated_at"])
+        order.save()
+        self.assertFalse(
+            Notification.objects.filter(
+                notification_type=Notification.Type.CHANGE_ORDER
+            ).exists()
+        )
+
+    def test_status_change_notifies_customer_once(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = Order.Status.PAID
+        order.save(update_fields=["status", "updated_at"])
+        order.save()
+        notification = Notification.objects.get(
+            notification_type=Notification.Type.CHANGE_ORDER
+        )
+        self.assertEqual(notification.user, self.order.user)
+        self.assertEqual(notification.content_object, order)
+        self.assertIn("paid", notification.message)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_notifications_are_left_to_the_worker(self):
+        order = OrderFactory(status=Order.Status.PENDING, items__have_items=False)
+        order.status = Order.Status.PAID
+        order.save()
+        # A second save while the first event is still queued adds nothing
+        Order.objects.get(pk=order.pk).save()
+        order = Order.objects.get(pk=order.pk)
+        order.status = Order.Status.PENDING
+        order.save()
+        order.status = Order.Status.PAID
+        order.save()
+        self.assertFalse(Notification.objects.filter(object_id=order.pk).exists())
+        self.assertEqual(Job.objects.filter(queue="notifications").count(), 3)
+
+        call_command("run_jobs", "--once", stdout=StringIO())
+        self.assertEqual(
+            Notification.objects.filter(
+                object_id=order.pk, notification_type=Notification.Type.NEW_ORDER
+            ).count(),
+            len(self.staff),
+        )
+        self.assertEqual(
+            Notification.objects.filter(
+                object_id=order.pk, notification_type=Notification.Type.CHANGE_ORDER
+            ).count(),
+            2,
+        )
+
+
+@override_settings(NOTIFICATIONS_STREAM_TIMEOUT=0.3)
+class NotificationStreamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number="1234567890", password="testpass123"
+        )
+        self.user.last_notification_check = timezone.now() - timezone.timedelta(
+            minutes=1
+        )
+        self.user.save()
+        self.old = self.add_notification("Seen")
+        Notification.objects.filter(pk=self.old.pk).update(
+            created_at=timezone.now() - timezone.timedelta(days=1)
+        )
+        self.new = self.add_notification("New")
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.auth = {"Authorization": f"Bearer {self.token}"}
+
+    def add_notification(self, message):
+        return Notification.objects.create(
+            user=self.user, notification_type="custom", message=message
+        )
+
+    async def poll(self, **params):
+        return await self.async_client.get(
+            reverse("notifications:notification-poll"), params, headers=self.auth
+        )
+
+    async def test_poll_returns_unseen_notifications(self):
+        response = await self.poll()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([item["message"] for item in data["results"]], ["New"])
+        self.assertEqual(data["after"], self.new.pk)
+
+    async def test_poll_times_out_without_news(self):
+        response = await self.poll(after=self.new.pk, timeout=0.1)
+        self.assertEqual(response.json(), {"results": [], "after": self.new.pk})
+
+    async def test_poll_waits_for_news(self):
+        async def notify_later():
+            await asyncio.sleep(0.1)
+            return await sync_to_async(self.add_notification)("Later")
+
+        response, later = await asyncio.gather(
+            self.poll(after=self.new.pk, timeout=5), notify_later()
+        )
+        self.assertEqual(
+            response.json(),
+            {"results": [NotificationSerializer(later).data], "after": later.pk},
+        )
+
+    async def test_poll_closes_its_connection_after_catching_up(self):
+        # Test cases run in a transaction, where it is left open
+        with mock.patch("notifications.streams.connection") as connection:
+            connection.in_atomic_block = False
+            response = await self.poll()
+        self.assertEqual(len(response.json()["results"]), 1)
+        connection.close.assert_called_once_with()
+
+    async def test_poll_requires_authentication(self):
+        response = await self.async_client.get(
+            reverse("notifications:notification-poll")
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.poll(after="latest")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def stream(self, params=None, headers=None):
+        response = await self.async_client.get(
+            reverse("notifications:notification-stream"), params, headers=headers
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return "".join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_stream_sends_unseen_notifications(self):
+        events = await self.stream({"token": self.token})
+        self.assertTrue(events.startswith("retry: "))
+        self.assertIn(f"id: {self.new.pk}\nevent: notification\n", events)
+        self.assertNotIn(f"id: {self.old.pk}\n", events)
+        self.assertTrue(events.endswith(": keep-alive\n\n"))
+
+    async def test_stream_resumes_after_last_event_id(self):
+        events = await self.stream(
+            headers={"Last-Event-ID": str(self.old.pk), **self.auth}
+        )
+        self.assertIn(f"id: {self.new.pk}\n", events)
+        events = await self.stream(
+            headers={"Last-Event-ID": str(self.new.pk), **self.auth}
+        )
+        self.assertNotIn("event: notification", events)
+
+
+class UnreadCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            phone_number="1234567890", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.notifications = [self.add_notification() for _ in range(3)]
+
+    def add_notification(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                user=self.user, notification_type="custom", message="Hi", **kwargs
+            )
+
+    def unread_count(self):
+        response = self.client.get(reverse("notifications:notification-unread-count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["unread"]
+
+    def test_count_is_cached(self):
+        self.assertEqual(get_unread_count(self.user.pk), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 3)
+
+    def test_count_follows_changes(self):
+        self.assertEqual(self.unread_count(), 3)
+        self.add_notification(is_read=True)
+        self.add_notification()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse(
+                    "notifications:notification-detail",
+                    kwargs={"pk": self.notifications[0].pk},
+                ),
+                {"is_read": True},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.unread_count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse(
+                    "notifications:notification-detail",
+                    kwargs={"pk": self.notifications[1].pk},
+                )
+            )
+        self.assertEqual(self.unread_count(), 2)
+        self.assertEqual(
+            Notification.objects.filter(user=self.user, is_read=False).count(), 2
+        )
+
+    def test_mark_all_read(self):
+        self.assertEqual(self.unread_count(), 3)
+        url = reverse("notifications:notification-mark-all-read")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"up_to": self.notifications[1].pk})
+        self.assertEqual(response.data, {"marked": 2})
+        self.assertEqual(self.unread_count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.data, {"marked": 1})
+        self.assertEqual(self.unread_count(), 0)
+        self.assertFalse(
+            Notification.objects.filter(user=self.user, is_read=False).exists()
+        )
+
+        response = self.client.post(url, {"up_to": "last"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_fan_out_counts(self):
+        staff = User.objects.create_user(
+            phone_number="0912000000", password="testpass123", is_staff=True
+        )
+        self.assertEqual(get_unread_count(staff.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderFactory(items__have_items=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(staff.pk), 1)
+
+
+@override_settings(NOTIFICATION_RETENTION={"new_order": 30, "custom": None})
+class ArchiveNotificationsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number="1234567890", password="testpass123"
+        )
+        self.expired = [
+            self.add_notification("new_order", days=31, is_read=True) for _ in range(3)
+        ]
+        self.kept = [
+            self.add_notification("new_order", days=31, is_read=False),
+            self.add_notification("new_order", days=29, is_read=True),
+            self.add_notification("custom", days=400, is_read=True),
+            self.add_notification("order_status", days=400, is_read=True),
+        ]
+
+    def add_notification(self, notification_type, days, is_read):
+        notification = Notification.objects.create(
+            user=self.user,
+            notification_type=notification_type,
+            message="Old",
+            is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timezone.timedelta(days=days)
+        )
+        notification.refresh_from_db()
+        return notification
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_notifications", *args, stdout=out)
+        return out.getvalue()
+
+    def test_archives_expired_read_notifications_in_batches(self):
+        out = self.archive("--batch-size", "2")
+        self.assertIn("new_order: 3 older than 30 days", out)
+        self.assertCountEqual(
+            Notification.objects.values_list("pk", flat=True),
+            [notification.pk for notification in self.kept],
+        )
+        archived = ArchivedNotification.objects.get(pk=self.expired[0].pk)
+        self.assertEqual(archived.user, self.user)
+        self.assertEqual(archived.created_at, self.expired[0].created_at)
+        self.assertEqual(ArchivedNotification.objects.count(), 3)
+
+    def test_dry_run_and_purge(self):
+        self.assertIn("3 notifications would go.", self.archive("--dry-run"))
+        self.assertEqual(Notification.objects.count(), 7)
+
+        self.assertIn("3 notifications purged.", self.archive("--purge"))
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertFalse(ArchivedNotification.objects.exists())
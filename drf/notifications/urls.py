@@ -1,7 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from notifications.views import NotificationViewSet
+from notifications.views import (
+    NotificationViewSet,
+    notification_poll,
+    notification_stream,
+)
 
 router = DefaultRouter()
 router.register(r"notifications", NotificationViewSet, basename="notification")
@@ -9,5 +13,8 @@ router.register(r"notifications", NotificationViewSet, basename="notification")
 app_name = "notifications"
 
 urlpatterns = [
+    # Ahead of the router, whose detail route would take these for ids
+    path("notifications/stream/", notification_stream, name="notification-stream"),
+    path("notifications/poll/", notification_poll, name="notification-poll"),
     path("", include(router.urls)),
 ]
@@ -1,30 +1,70 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views.decorators.http import require_GET
+from pagination import KeysetPagination
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from .counters import adjust_unread_counts, get_unread_count
 from .models import Notification
 from .serializers import NotificationSerializer
+from .streams import Subscription
+
+User = get_user_model()
+
+# Seconds between the comments keeping an idle stream from being cut by
+# proxies, and milliseconds a browser waits before reconnecting
+STREAM_HEARTBEAT = 15
+STREAM_RETRY = 3000
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {
+        "list": 3,
+        "retrieve": 2,
+        "partial_update": 3,
+        "destroy": 4,
+        "get_by_timeframe": 2,
+        "unread_count": 2,
+        "mark_all_read": 2,
+    }
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
     def list(self, request):
+        paginator = KeysetPagination()
+        if paginator.is_requested(request):
+            # Cursor mode browses the whole history and leaves the
+            # last_notification_check marker alone
+            page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+            serializer = self.get_serializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         # Get all new notifications since the last time notifications were received
         last_checked = request.user.last_notification_check
         queryset = self.get_queryset().filter(created_at__gt=last_checked)
         serializer = self.get_serializer(queryset, many=True)
 
-        # Update the last_notification_check
+        # Update the last_notification_check, without writing back the rest
+        # of the user row
         request.user.last_notification_check = timezone.now()
-        request.user.save()
+        User.objects.filter(pk=request.user.pk).update(
+            last_notification_check=request.user.last_notification_check
+        )
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -43,6 +83,28 @@ class NotificationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["get"])
+    def unread_count(self, request):
+        return Response({"unread": get_unread_count(request.user.pk)})
+
+    @action(detail=False, methods=["post"])
+    def mark_all_read(self, request):
+        notifications = self.get_queryset().filter(is_read=False)
+        # Only what the client has shown, when it says so
+        up_to = request.data.get("up_to")
+        if up_to is not None:
+            try:
+                notifications = notifications.filter(pk__lte=int(up_to))
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "up_to must be a notification id."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        # One UPDATE, which sends no signals, so the count moves here
+        marked = notifications.update(is_read=True)
+        adjust_unread_counts({request.user.pk: -marked})
+        return Response({"marked": marked}, status=status.HTTP_200_OK)
+
     def create(self, request):
         # This method should be used internally, not exposed via API
         return Response(
@@ -55,3 +117,107 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 "You don't have permission to delete this notification."
             )
         instance.delete()
+
+
+async def authenticate(request):
+    # EventSource cannot set headers, so the access token may also come as
+    # the token query parameter
+    token = request.GET.get("token")
+    if token and "HTTP_AUTHORIZATION" not in request.META:
+        request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def get_after(request):
+    """The id of the last notification the client has, if it told us."""
+    after = request.headers.get("Last-Event-ID") or request.GET.get("after")
+    return None if after is None else int(after)
+
+
+def unauthorized():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."},
+        status=status.HTTP_401_UNAUTHORIZED,
+    )
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    Method: GET \n
+        Server-sent events of the user's new notifications. Serve it from the
+        ASGI application; the stream ends after NOTIFICATIONS_STREAM_TIMEOUT
+        and the browser reconnects on its own. \n
+    Input: \n
+        - token: access token, for clients that cannot send headers \n
+        - after / Last-Event-ID header: id of the last notification received \n
+    """
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+    try:
+        after = get_after(request)
+    except ValueError:
+        return JsonResponse(
+            {"error": "after must be a notification id."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    response = StreamingHttpResponse(
+        event_stream(user, after), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keep nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def event_stream(user, after):
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + settings.NOTIFICATIONS_STREAM_TIMEOUT
+    async with Subscription(user.pk, after, user.last_notification_check) as stream:
+        yield f"retry: {STREAM_RETRY}\n\n"
+        while (remaining := closes_at - loop.time()) > 0:
+            notifications = await stream.get(min(remaining, STREAM_HEARTBEAT))
+            for notification in notifications:
+                data = json.dumps(notification, cls=DjangoJSONEncoder)
+                yield f"id: {notification['id']}\nevent: notification\ndata: {data}\n\n"
+            if not notifications:
+                yield ": keep-alive\n\n"
+
+
+@require_GET
+async def notification_poll(request):
+    """
+    Method: GET \n
+        Long poll for the user's new notifications, answered as soon as there
+        are some or after the timeout with none. \n
+    Input: \n
+        - after: id of the last notification received \n
+        - timeout: seconds to wait at most, up to NOTIFICATIONS_LONG_POLL_TIMEOUT \n
+    Return: \n
+        - results: the new notifications, oldest first \n
+        - after: id to send with the next poll \n
+    """
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+    try:
+        after = get_after(request)
+        timeout = float(
+            request.GET.get("timeout", settings.NOTIFICATIONS_LONG_POLL_TIMEOUT)
+        )
+    except ValueError:
+        return JsonResponse(
+            {"error": "after must be a notification id and timeout a number."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    timeout = min(max(timeout, 0), settings.NOTIFICATIONS_LONG_POLL_TIMEOUT)
+
+    async with Subscription(user.pk, after, user.last_notification_check) as poll:
+        notifications = await poll.get(timeout)
+    return JsonResponse({"results": notifications, "after": poll.after})
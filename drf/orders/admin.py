@@ -1,5 +1,37 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+
 from .models import Order, OrderItem
+from .reservations import InsufficientStock, change_order_status, delete_order
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    # Stock holds follow the status, see orders.reservations
+    readonly_fields = ["reserved_until"]
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        if change and "status" in form.changed_data:
+            try:
+                change_order_status(obj.pk, obj.status)
+            except InsufficientStock:
+                self.message_user(
+                    request,
+                    "The stock of this order is gone, its status was kept.",
+                    messages.ERROR,
+                )
+            obj.status, obj.reserved_until = Order.objects.values_list(
+                "status", "reserved_until"
+            ).get(pk=obj.pk)
+        super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        delete_order(obj)
+
+    def delete_queryset(self, request, queryset):
+        for order in queryset:
+            delete_order(order)
+
 
-admin.site.register(Order)
 admin.site.register(OrderItem)
@@ -0,0 +1,97 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from orders.reservations import InsufficientStock, reserve_stock
+from products.models import Inventory, Product, ProductVariant
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checkout throughput for a single hot variant, with its stock "
+        "in one inventory row and spread over shards. Needs PostgreSQL: SQLite "
+        "serializes every writer whatever the layout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checkouts", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--shards", type=int, default=8)
+        parser.add_argument(
+            "--work-ms",
+            type=float,
+            default=5,
+            help="Time each checkout keeps its transaction open after holding "
+            "the stock, standing in for the rest of the checkout",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stderr.write(
+                self.style.WARNING(
+                    "Not running on PostgreSQL, the numbers will not mean much."
+                )
+            )
+
+        self.stdout.write(
+            f"{'layout':<12}{'checkouts':>10}{'failed':>8}{'seconds':>10}{'per sec':>10}"
+        )
+        for shard_count in (0, options["shards"]):
+            layout = f"{shard_count} shards" if shard_count else "single row"
+            succeeded, failed, elapsed = self.run(shard_count, options)
+            self.stdout.write(
+                f"{layout:<12}{succeeded:>10}{failed:>8}{elapsed:>10.2f}"
+                f"{succeeded / elapsed:>10.1f}"
+            )
+
+    def run(self, shard_count, options):
+        product = Product.objects.create(
+            title="Benchmark hot SKU", slug=f"benchmark-{uuid.uuid4().hex}"
+        )
+        variant = ProductVariant.objects.create(
+            product=product,
+            title="Hot variant",
+            slug=f"benchmark-{uuid.uuid4().hex}",
+            price=1000,
+        )
+        inventory = Inventory.objects.create(
+            product_variant=variant, quantity=options["checkouts"]
+        )
+        if shard_count:
+            inventory.set_shards(shard_count)
+
+        work = options["work_ms"] / 1000
+        tickets = iter(range(options["checkouts"]))
+        tickets_lock = threading.Lock()
+        results = []
+
+        def buyer():
+            # One connection per thread, like one per gunicorn worker
+            try:
+                while True:
+                    with tickets_lock:
+                        if next(tickets, None) is None:
+                            return
+                    try:
+                        with transaction.atomic():
+                            reserve_stock({variant.pk: 1})
+                            time.sleep(work)
+                        results.append(True)
+                    except (InsufficientStock, DatabaseError):
+                        results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.delete()
+        succeeded = sum(results)
+        return succeeded, len(results) - succeeded, elapsed
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from orders.models import Order
+from orders.reservations import expired_order_ids, release_order
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel pending orders whose stock hold has expired and give the stock "
+        "back. Meant to run every minute or so, from cron or with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=float,
+            metavar="SECONDS",
+            help="Keep running, releasing again after this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.release_expired()
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
+            # The database may have restarted meanwhile
+            close_old_connections()
+
+    def release_expired(self):
+        released = 0
+        for order_id in list(expired_order_ids()):
+            # One transaction per order, so a long backlog never holds locks
+            if release_order(order_id, Order.Status.CANCELLED):
+                released += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Released the reservations of {released} orders.")
+        )
@@ -1,6 +1,8 @@
 from account.models import Address, User
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Count, F, Subquery, Sum
+from django.db.models.functions import Coalesce
 from products.models import ProductVariant
 
 
@@ -21,12 +23,61 @@ class Order(models.Model):
         max_length=10, choices=Status.choices, default=Status.PENDING
     )
     shipping_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
+    # Until when the stock of a pending order is held, see orders.reservations
+    reserved_until = models.DateTimeField(null=True, blank=True)
+    # Set at checkout and kept in sync by orders.signals, so order lists
+    # never have to add up the items
+    total_amount = models.PositiveBigIntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Expired holds, for the release_expired_reservations sweeper
+            models.Index(
+                fields=["reserved_until"],
+                name="order_pending_hold_idx",
+                condition=models.Q(status="pending"),
+            ),
+            # Keyset pagination of the user and admin order lists
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="order_user_created_idx"
+            ),
+            models.Index(fields=["-created_at", "-id"], name="order_created_idx"),
+            # Payment verification finds the order by its gateway authority
+            models.Index(fields=["transaction_id"], name="order_transaction_idx"),
+            # The admin order list filtered by status
+            models.Index(
+                fields=["status", "-created_at", "-id"],
+                name="order_status_created_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        # Lets post_save receivers tell a status change from any other save
+        order._loaded_status = order.__dict__.get("status")
+        return order
 
     def __str__(self):
         return f"Order {self.id} by user {str(self.user)}"
 
+    @classmethod
+    def refresh_totals(cls, order_id):
+        """Store what the items of the order add up to, in one UPDATE."""
+        totals = (
+            OrderItem.objects.filter(order=order_id)
+            .order_by()
+            .values("order")
+            .annotate(amount=Sum(F("price") * F("quantity")), count=Count("pk"))
+        )
+        cls.objects.filter(pk=order_id).update(
+            total_amount=Coalesce(Subquery(totals.values("amount")), 0),
+            item_count=Coalesce(Subquery(totals.values("count")), 0),
+        )
+
     def get_total_price(self):
-        return sum(item.get_cost() for item in self.items.all())
+        return self.total_amount
 
 
 class OrderItem(models.Model):
@@ -0,0 +1,315 @@
+import math
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+from jobs.queue import enqueue_each
+from products.models import Inventory, InventoryShard
+from products.tasks import refresh_product_card
+
+from .models import Order
+
+# Stock moves in single conditional UPDATEs over every variant of an order:
+# the WHERE clause only matches rows that can take the change, so concurrent
+# checkouts never need to lock inventory rows or read them first. Sharded
+# variants get the same treatment on one of their shards instead.
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_variant_ids=()):
+        super().__init__("Insufficient stock")
+        self.product_variant_ids = list(product_variant_ids)
+
+
+class StockChange:
+    """
+    A per-unit change of an inventory row or shard, e.g. ``reserved=1``,
+    only allowed where ``condition(quantity)`` holds. ``capacity(row)``
+    is how many units a loaded row can take.
+    """
+
+    def __init__(self, condition, capacity, **deltas):
+        self.condition = condition
+        self.capacity = capacity
+        self.deltas = deltas
+
+    def updates(self, quantity):
+        return {
+            field: F(field) + sign * quantity for field, sign in self.deltas.items()
+        }
+
+    def updates_per_variant(self, quantities):
+        return {
+            field: F(field)
+            + Case(
+                *[
+                    When(product_variant_id=variant_id, then=sign * quantity)
+                    for variant_id, quantity in quantities.items()
+                ]
+            )
+            for field, sign in self.deltas.items()
+        }
+
+
+def has_available(quantity):
+    return Q(quantity__gte=F("reserved") + quantity)
+
+
+def available_capacity(row):
+    return row.quantity - row.reserved
+
+
+RESERVE = StockChange(has_available, available_capacity, reserved=1)
+TAKE = StockChange(has_available, available_capacity, quantity=-1)
+COMMIT = StockChange(
+    lambda quantity: Q(reserved__gte=quantity, quantity__gte=quantity),
+    lambda row: min(row.reserved, row.quantity),
+    quantity=-1,
+    reserved=-1,
+)
+RELEASE = StockChange(
+    lambda quantity: Q(reserved__gte=quantity), lambda row: row.reserved, reserved=-1
+)
+RESTOCK = StockChange(lambda quantity: Q(), lambda row: math.inf, quantity=1)
+
+
+def sharded_inventories(variant_ids):
+    return dict(
+        Inventory.objects.filter(
+            product_variant_id__in=variant_ids, shard_count__gt=0
+        ).values_list("product_variant_id", "pk")
+    )
+
+
+def change_shards(inventory_id, quantity, change):
+    """
+    Apply ``change`` to one randomly picked shard able to take all of it,
+    so concurrent buyers of a hot variant land on different rows. When no
+    single shard can, lock them all and spread it. False if even that fails.
+    """
+    shards = InventoryShard.objects.filter(inventory_id=inventory_id)
+    shard_ids = list(shards.values_list("pk", flat=True))
+    random.shuffle(shard_ids)
+    for shard_id in shard_ids:
+        if shards.filter(change.condition(quantity), pk=shard_id).update(
+            **change.updates(quantity)
+        ):
+            return True
+
+    locked = list(shards.select_for_update().order_by("pk"))
+    if sum(change.capacity(shard) for shard in locked) < quantity:
+        return False
+    for shard in locked:
+        part = min(quantity, change.capacity(shard))
+        if part:
+            shards.filter(pk=shard.pk).update(**change.updates(part))
+            quantity -= part
+        if not quantity:
+            break
+    return True
+
+
+def available_stock(variant_ids):
+    available = dict(
+        Inventory.objects.filter(product_variant_id__in=variant_ids).values_list(
+            "product_variant_id", F("quantity") - F("reserved")
+        )
+    )
+    sharded = (
+        InventoryShard.objects.filter(inventory__product_variant_id__in=variant_ids)
+        .values("inventory__product_variant_id")
+        .annotate(available=Sum(F("quantity") - F("reserved")))
+        .values_list("inventory__product_variant_id", "available")
+    )
+    for variant_id, shard_available in sharded:
+        available[variant_id] += shard_available
+    return available
+
+
+def apply_change(quantities, change, strict=True):
+    """
+    Apply ``change`` for every ``{product_variant_id: quantity}``. When
+    ``strict``, either every variant takes it or, with nothing written,
+    InsufficientStock names the ones that fell short.
+    """
+    try:
+        with transaction.atomic():
+            sharded = sharded_inventories(quantities)
+            plain = {
+                variant_id: quantity
+                for variant_id, quantity in quantities.items()
+                if variant_id not in sharded
+            }
+            matches = Q()
+            for variant_id, quantity in plain.items():
+                matches |= Q(product_variant_id=variant_id) & change.condition(quantity)
+            updated = (
+                Inventory.objects.filter(matches).update(
+                    **change.updates_per_variant(plain)
+                )
+                if plain
+                else 0
+            )
+            changed = updated == len(plain)
+            for variant_id, inventory_id in sharded.items():
+                changed &= change_shards(inventory_id, quantities[variant_id], change)
+            if strict and not changed:
+                raise InsufficientStock()
+    except InsufficientStock:
+        available = available_stock(quantities)
+        raise InsufficientStock(
+            sorted(
+                variant_id
+                for variant_id, quantity in quantities.items()
+                if available.get(variant_id, 0) < quantity
+            )
+        )
+
+
+def refresh_cards(variant_ids):
+    # Bulk updates skip the Inventory signals. The cards only show whether
+    # there is stock, so checkout leaves them to the jobs worker.
+    product_ids = Inventory.objects.filter(
+        product_variant_id__in=variant_ids
+    ).values_list("product_variant__product_id", flat=True)
+    enqueue_each(
+        refresh_product_card,
+        [(product_id,) for product_id in sorted(set(product_ids))],
+        queue="cards",
+        dedup_key=lambda product_id: f"product-card-{product_id}",
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Hold ``{product_variant_id: quantity}`` out of the available stock.
+    Raises InsufficientStock, with nothing held, if any variant falls short.
+    """
+    apply_change(quantities, RESERVE)
+    sold_out = [
+        variant_id
+        for variant_id, available in available_stock(quantities).items()
+        if available == 0
+    ]
+    refresh_cards(sold_out)
+
+
+def take_stock(quantities):
+    """Take stock straight off the shelves, without a prior hold."""
+    apply_change(quantities, TAKE)
+    refresh_cards(quantities)
+
+
+def commit_stock(quantities):
+    """Turn held stock into sold stock."""
+    apply_change(quantities, COMMIT)
+
+
+def release_stock(quantities):
+    """Give held stock back to the available stock."""
+    apply_change(quantities, RELEASE, strict=False)
+    refresh_cards(quantities)
+
+
+def restock(quantities):
+    """Put sold stock back on the shelves, e.g. after a refund."""
+    apply_change(quantities, RESTOCK, strict=False)
+    refresh_cards(quantities)
+
+
+def order_quantities(order):
+    quantities = Counter()
+    for variant_id, quantity in order.items.values_list(
+        "product_variant_id", "quantity"
+    ):
+        quantities[variant_id] += quantity
+    return dict(quantities)
+
+
+def hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.INVENTORY_RESERVATION_TTL)
+
+
+def locked_order(order_id):
+    return Order.objects.select_for_update().get(pk=order_id)
+
+
+@transaction.atomic
+def release_order(order_id, status=Order.Status.FAILED):
+    """
+    Give a pending order's held stock back and close it with ``status``.
+    Returns False if the order was no longer pending.
+    """
+    order = locked_order(order_id)
+    if order.status != Order.Status.PENDING:
+        return False
+    if order.reserved_until is not None:
+        release_stock(order_quantities(order))
+    order.status = status
+    order.reserved_until = None
+    order.save(update_fields=["status", "reserved_until", "updated_at"])
+    return True
+
+
+@transaction.atomic
+def confirm_order(order_id):
+    """
+    Mark a paid order as paid and turn its hold into sold stock. An order
+    whose hold was already released gets its stock again if there is still
+    enough; returns False when there is not.
+    """
+    order = locked_order(order_id)
+    if order.status == Order.Status.PAID:
+        return True
+    quantities = order_quantities(order)
+    try:
+        if order.status != Order.Status.PENDING:
+            take_stock(quantities)
+        elif order.reserved_until is not None:
+            commit_stock(quantities)
+        # Pending orders without a hold predate reservations, their stock
+        # was taken at checkout
+    except InsufficientStock:
+        return False
+    order.status = Order.Status.PAID
+    order.reserved_until = None
+    order.save(update_fields=["status", "reserved_until", "updated_at"])
+    return True
+
+
+@transaction.atomic
+def change_order_status(order_id, status):
+    """
+    Move an order to ``status`` by hand, as the admin does. Closing a
+    pending order gives its hold back and moving it on sells the held
+    stock, so nothing stays reserved for good. Raises InsufficientStock
+    when the stock of an already released hold is gone.
+    """
+    order = locked_order(order_id)
+    if order.status == status:
+        return
+    if order.status == Order.Status.PENDING:
+        if status in (Order.Status.CANCELLED, Order.Status.FAILED):
+            release_order(order_id, status)
+            return
+        if not confirm_order(order_id):
+            raise InsufficientStock(order_quantities(order))
+    Order.objects.filter(pk=order_id).update(status=status, updated_at=timezone.now())
+
+
+@transaction.atomic
+def delete_order(order):
+    """Delete an order, giving a pending order's held stock back first."""
+    if order.status == Order.Status.PENDING:
+        release_order(order.pk, Order.Status.CANCELLED)
+    order.delete()
+
+
+def expired_order_ids(now=None):
+    return Order.objects.filter(
+        status=Order.Status.PENDING, reserved_until__lt=now or timezone.now()
+    ).values_list("pk", flat=True)
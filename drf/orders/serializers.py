@@ -1,4 +1,5 @@
 from account.models import Address
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from .models import Order, OrderItem
@@ -32,7 +33,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, required=False)
-    total_price = serializers.SerializerMethodField()
+    # Stored on the order, see Order.refresh_totals
+    total_price = serializers.IntegerField(source="total_amount", read_only=True)
     # user = serializers.StringRelatedField(source='user.phone_number')
     # Adding format to the datetime fields
     created_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%S%z", read_only=True)
@@ -48,15 +50,13 @@ class OrderSerializer(serializers.ModelSerializer):
             "user",
             "items",
             "total_price",
+            "item_count",
             "status",
             "created_at",
             "updated_at",
             "shipping_address",
         ]
-
-        extra_kwargs = {
-            "total_price": {"read_only": True},
-        }
+        read_only_fields = ["item_count"]
 
     def create(self, validated_data):
         items_data = validated_data.pop("items", None)
@@ -69,8 +69,14 @@ class OrderSerializer(serializers.ModelSerializer):
                 OrderItem.objects.create(order=order, **item_data)
         return order
 
-    def get_total_price(self, obj):
-        return sum(item.get_cost() for item in obj.items.all())
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.prefetch_related(
+            Prefetch(
+                "items",
+                queryset=OrderItem.objects.select_related("product_variant__product"),
+            )
+        )
 
 
 class OrderAdminSerializer(OrderSerializer):
@@ -78,3 +84,7 @@ class OrderAdminSerializer(OrderSerializer):
 
     class Meta(OrderSerializer.Meta):
         fields = OrderSerializer.Meta.fields + ["user_email"]
+
+    @staticmethod
+    def setup_queryset(queryset):
+        return OrderSerializer.setup_queryset(queryset.select_related("user"))
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.signals import deleted_along_with
+
+from orders.models import Order, OrderItem
+
+# Checkout stores the totals of a new order itself. These receivers follow
+# items added, changed or removed one at a time afterwards, e.g. in the admin.
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_totals_on_item_change(sender, instance, origin=None, **kwargs):
+    if origin is not None and not deleted_along_with(origin, OrderItem):
+        # Removed by a cascade, from a deleted order or product
+        return
+    Order.refresh_totals(instance.order_id)
+    if OrderItem.order.is_cached(instance):
+        instance.order.refresh_from_db(fields=["total_amount", "item_count"])
@@ -1,4 +1,8 @@
+from io import StringIO
+from unittest import mock
+
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
@@ -10,6 +14,15 @@ from orders.factories import (
     UserFactory,
 )
 from orders.models import Order, OrderItem
+from orders.reservations import (
+    InsufficientStock,
+    change_order_status,
+    commit_stock,
+    confirm_order,
+    delete_order,
+    release_stock,
+    reserve_stock,
+)
 
 
 class OrderModelTest(TestCase):
@@ -45,6 +58,24 @@ class OrderModelTest(TestCase):
         OrderItemFactory(order=self.order, price=5000, quantity=1)
         self.assertEqual(self.order.get_total_price(), 25000)
 
+    def test_totals_follow_items(self):
+        item = OrderItemFactory(order=self.order, price=10000, quantity=2)
+        OrderItemFactory(order=self.order, price=5000, quantity=1)
+        self.assertEqual((self.order.total_amount, self.order.item_count), (25000, 2))
+
+        item.quantity = 3
+        item.save()
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.total_amount, self.order.item_count), (5000, 1))
+
+    def test_totals_kept_when_a_product_is_deleted(self):
+        item = OrderItemFactory(order=self.order, price=10000, quantity=2)
+        item.product_variant.product.delete()
+        self.order.refresh_from_db()
+        # What the customer was charged for
+        self.assertEqual((self.order.total_amount, self.order.item_count), (20000, 1))
+
 
 class OrderItemModelTest(TestCase):
     def setUp(self):
@@ -78,3 +109,148 @@ class OrderItemModelTest(TestCase):
 
     def test_order_item_added_at(self):
         self.assertTrue(isinstance(self.order_item.added_at, timezone.datetime))
+
+
+class OrderReservationTest(TestCase):
+    def setUp(self):
+        self.product_variant = ProductVariantFactory(create_inventory__quantity=5)
+        self.inventory = self.product_variant.inventory
+
+    def create_held_order(self, quantity, reserved_until):
+        reserve_stock({self.product_variant.id: quantity})
+        order = OrderFactory(
+            status=Order.Status.PENDING,
+            reserved_until=reserved_until,
+            items__have_items=False,
+        )
+        OrderItemFactory(
+            order=order, product_variant=self.product_variant, quantity=quantity
+        )
+        return order
+
+    def test_expired_holds_are_released(self):
+        now = timezone.now()
+        expired = self.create_held_order(2, now - timezone.timedelta(minutes=1))
+        held = self.create_held_order(1, now + timezone.timedelta(minutes=10))
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.available, 2)
+
+        call_command("release_expired_reservations", stdout=StringIO())
+
+        expired.refresh_from_db()
+        held.refresh_from_db()
+        self.assertEqual(expired.status, Order.Status.CANCELLED)
+        self.assertEqual(held.status, Order.Status.PENDING)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (5, 1))
+
+    def test_release_keeps_running_with_every(self):
+        expired = self.create_held_order(2, timezone.now() - timezone.timedelta(1))
+        sleep = "orders.management.commands.release_expired_reservations.time.sleep"
+        # The second wait ends the loop
+        with mock.patch(sleep, side_effect=[None, KeyboardInterrupt]) as waited:
+            with self.assertRaises(KeyboardInterrupt):
+                call_command(
+                    "release_expired_reservations", every=60, stdout=StringIO()
+                )
+
+        waited.assert_called_with(60)
+        self.assertEqual(waited.call_count, 2)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, Order.Status.CANCELLED)
+
+    def test_late_payment_takes_stock_if_still_there(self):
+        order = self.create_held_order(2, timezone.now() - timezone.timedelta(1))
+        call_command("release_expired_reservations", stdout=StringIO())
+
+        self.assertTrue(confirm_order(order.id))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (3, 0))
+
+    def test_late_payment_fails_once_stock_is_gone(self):
+        order = self.create_held_order(2, timezone.now() - timezone.timedelta(1))
+        call_command("release_expired_reservations", stdout=StringIO())
+        reserve_stock({self.product_variant.id: 4})
+
+        self.assertFalse(confirm_order(order.id))
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+
+    def test_closing_by_hand_releases_the_hold(self):
+        order = self.create_held_order(2, timezone.now() + timezone.timedelta(1))
+        change_order_status(order.id, Order.Status.CANCELLED)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+        self.assertIsNone(order.reserved_until)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (5, 0))
+
+    def test_moving_on_by_hand_sells_the_hold(self):
+        order = self.create_held_order(2, timezone.now() + timezone.timedelta(1))
+        change_order_status(order.id, Order.Status.SHIPPED)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.SHIPPED)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (3, 0))
+
+    def test_deleting_a_pending_order_releases_the_hold(self):
+        order = self.create_held_order(2, timezone.now() + timezone.timedelta(1))
+        delete_order(order)
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.reserved, 0)
+
+    def test_inventory_save_keeps_reservations(self):
+        stale = self.product_variant.inventory
+        reserve_stock({self.product_variant.id: 2})
+        stale.quantity = 10
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual((stale.quantity, stale.reserved), (10, 2))
+
+
+class ShardedReservationTest(TestCase):
+    def setUp(self):
+        self.product_variant = ProductVariantFactory(create_inventory__quantity=10)
+        self.other_variant = ProductVariantFactory(create_inventory__quantity=10)
+        self.inventory = self.product_variant.inventory
+        self.inventory.set_shards(4)
+
+    def totals(self):
+        self.inventory.refresh_from_db()
+        return self.inventory.totals()
+
+    def test_reserve_commit_and_release_on_shards(self):
+        for _ in range(3):
+            reserve_stock({self.product_variant.id: 2, self.other_variant.id: 1})
+        self.assertEqual(self.totals(), (10, 6))
+        # The single row of the sharded variant is not used
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (0, 0))
+
+        commit_stock({self.product_variant.id: 4})
+        release_stock({self.product_variant.id: 2})
+        self.assertEqual(self.totals(), (6, 0))
+
+    def test_reservation_spread_over_shards(self):
+        # No shard holds 7 units on its own
+        reserve_stock({self.product_variant.id: 7})
+        self.assertEqual(self.totals(), (10, 7))
+
+    def test_insufficient_sharded_stock_holds_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.other_variant.id: 1, self.product_variant.id: 11})
+        self.assertEqual(
+            raised.exception.product_variant_ids, [self.product_variant.id]
+        )
+        self.assertEqual(self.totals(), (10, 0))
+        self.other_variant.inventory.refresh_from_db()
+        self.assertEqual(self.other_variant.inventory.reserved, 0)
+
+    def test_unsharding_keeps_reservations(self):
+        reserve_stock({self.product_variant.id: 3})
+        self.inventory.set_shards(0)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (10, 3))
+        self.assertFalse(self.inventory.shards.exists())
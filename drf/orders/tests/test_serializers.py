@@ -64,6 +64,7 @@ class OrderSerializerTest(TestCase):
                 "user",
                 "items",
                 "total_price",
+                "item_count",
                 "status",
                 "created_at",
                 "updated_at",
@@ -128,6 +129,7 @@ class OrderAdminSerializerTest(TestCase):
                 "user_email",
                 "items",
                 "total_price",
+                "item_count",
                 "status",
                 "created_at",
                 "updated_at",
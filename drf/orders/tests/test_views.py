@@ -1,11 +1,15 @@
+from datetime import datetime
+
 from account.factories import UserFactory
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from orders.factories import OrderFactory, OrderItemFactory
 from orders.models import Order
+from orders.reservations import reserve_stock
 
 
 class OrderViewTestCase(TestCase):
@@ -35,6 +39,83 @@ class OrderViewTestCase(TestCase):
             len(response.data), 2
         )  # Both orders should be visible to admin
 
+    def test_user_order_list_cursor_pagination(self):
+        OrderFactory.create_batch(2, user=self.user, items__size=1)
+        self.client.force_authenticate(user=self.user)
+        url = reverse("orders:user-order-list")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertNotIn("count", response.data)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["id"], self.order.id)
+        self.assertIsNone(response.data["next"])
+
+    def test_admin_order_list_cursor_pagination(self):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("orders:all-order-list")
+        response = self.client.get(url, {"pagination": "cursor", "count": "true"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+    def test_admin_order_list_pages(self):
+        OrderFactory.create_batch(10, items__size=1)
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("orders:all-order-list")
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 10)
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(
+            {order["id"] for order in response.data},
+            {self.order.id, self.admin_order.id},
+        )
+
+    def test_admin_order_list_filters(self):
+        Order.objects.filter(pk=self.order.pk).update(
+            status=Order.Status.SHIPPED,
+            created_at=timezone.make_aware(datetime(2024, 3, 10, 23, 30)),
+        )
+        Order.objects.filter(pk=self.admin_order.pk).update(
+            status=Order.Status.PAID,
+            created_at=timezone.make_aware(datetime(2024, 3, 11, 0, 30)),
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("orders:all-order-list")
+
+        def ids(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [order["id"] for order in response.data]
+
+        self.assertEqual(ids({"status": "shipped"}), [self.order.id])
+        self.assertEqual(ids({"date_to": "2024-03-10"}), [self.order.id])
+        self.assertEqual(ids({"date_from": "2024-03-11"}), [self.admin_order.id])
+        self.assertEqual(
+            ids({"date_from": "2024-03-10", "date_to": "2024-03-11"}),
+            [self.admin_order.id, self.order.id],
+        )
+        self.assertEqual(ids({"status": "paid", "date_to": "2024-03-10"}), [])
+
+    def test_admin_order_list_invalid_filters(self):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("orders:all-order-list")
+        for params in [{"status": "lost"}, {"date_from": "10/03/2024"}]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_lists_show_stored_totals(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse("orders:all-order-list"))
+        order = next(o for o in response.data if o["id"] == self.admin_order.id)
+        item = self.admin_order.items.get()
+        self.assertEqual(order["total_price"], item.price * item.quantity)
+        self.assertEqual(order["item_count"], 1)
+
     def test_admin_order_detail_view(self):
         self.client.force_authenticate(user=self.admin_user)
         url = reverse("orders:order-detail", kwargs={"pk": self.order.id})
@@ -57,6 +138,43 @@ class OrderViewTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Order.objects.filter(id=self.order.id).exists())
 
+    def test_admin_order_update_releases_held_stock(self):
+        self.client.force_authenticate(user=self.admin_user)
+        order = OrderFactory(status=Order.Status.PENDING, items__have_items=False)
+        item = OrderItemFactory(order=order, quantity=2)
+        inventory = item.product_variant.inventory
+        reserve_stock({item.product_variant_id: 2})
+        Order.objects.filter(pk=order.pk).update(
+            reserved_until=timezone.now() + timezone.timedelta(minutes=10)
+        )
+
+        url = reverse("orders:order-detail", kwargs={"pk": order.id})
+        response = self.client.put(url, {"status": Order.Status.CANCELLED})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Order.Status.CANCELLED)
+        order.refresh_from_db()
+        self.assertIsNone(order.reserved_until)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.reserved, 0)
+
+    def test_admin_order_delete_releases_held_stock(self):
+        self.client.force_authenticate(user=self.admin_user)
+        order = OrderFactory(status=Order.Status.PENDING, items__have_items=False)
+        item = OrderItemFactory(order=order, quantity=2)
+        inventory = item.product_variant.inventory
+        reserve_stock({item.product_variant_id: 2})
+        Order.objects.filter(pk=order.pk).update(
+            reserved_until=timezone.now() + timezone.timedelta(minutes=10)
+        )
+
+        url = reverse("orders:order-detail", kwargs={"pk": order.id})
+        response = self.client.delete(url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.reserved, 0)
+
     def test_admin_refund_order(self):
         self.client.force_authenticate(user=self.admin_user)
         order = OrderFactory(status=Order.Status.DELIVERED, items__have_items=False)
@@ -1,16 +1,30 @@
+from datetime import datetime, time, timedelta
+
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from pagination import KeysetPagination
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import Order
+from .reservations import (
+    InsufficientStock,
+    change_order_status,
+    delete_order,
+    order_quantities,
+    restock,
+)
 from .serializers import OrderAdminSerializer, OrderSerializer  # , RefundSerializer
 
 
 class UserOrderListView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 3
 
     def get(self, request):
         """
@@ -18,54 +32,152 @@ class UserOrderListView(APIView):
             Retrieve the orders list
         Input:
             - Authenticated request
+            - optional: pagination=cursor or cursor, page_size, count=true
         Return:
             - list of orders
+            - in cursor mode: ['next', 'previous', 'results']
         """
-        orders = Order.objects.filter(user=request.user).order_by("-created_at")
+        orders = OrderSerializer.setup_queryset(
+            Order.objects.filter(user=request.user).order_by("-created_at")
+        )
+        paginator = KeysetPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(orders, request, view=self)
+            serializer = OrderSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class AdminOrderListView(APIView):
     permission_classes = [IsAdminUser]
+    query_budget = 4
 
     def get(self, request):
-        orders = Order.objects.all().order_by("-created_at")
-        serializer = OrderAdminSerializer(orders, many=True)
+        """
+        Method: GET
+            Retrieve the orders of all users, newest first, 10 per page
+        Input:
+            - optional: page
+            - optional: status, one of the order statuses
+            - optional: date_from, date_to, YYYY-MM-DD, both inclusive
+            - optional: pagination=cursor or cursor, page_size, count=true
+        Return:
+            - list of orders
+            - in cursor mode: ['next', 'previous', 'results']
+        """
+        try:
+            filters = self.get_filters(request)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = OrderAdminSerializer.setup_queryset(
+            Order.objects.filter(**filters).order_by("-created_at", "-pk")
+        )
+        paginator = KeysetPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(orders, request, view=self)
+            serializer = OrderAdminSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+        page = Paginator(orders, 10).get_page(request.query_params.get("page", 1))
+        serializer = OrderAdminSerializer(page, many=True)
         return Response(serializer.data)
 
+    def get_filters(self, request):
+        filters = {}
+        order_status = request.query_params.get("status")
+        if order_status:
+            if order_status not in Order.Status.values:
+                raise ValueError(
+                    f"status must be one of {', '.join(Order.Status.values)}"
+                )
+            filters["status"] = order_status
+
+        # Bounds on created_at itself rather than on its date, which the
+        # indexes could not serve
+        date_from = self.get_date_param(request, "date_from")
+        if date_from:
+            filters["created_at__gte"] = self.start_of(date_from)
+        date_to = self.get_date_param(request, "date_to")
+        if date_to:
+            filters["created_at__lt"] = self.start_of(date_to + timedelta(days=1))
+        return filters
+
+    def get_date_param(self, request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(f"{name} must be a date as YYYY-MM-DD")
+        return parsed
+
+    def start_of(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
 
 class AdminOrderDetailView(APIView):
     permission_classes = [IsAdminUser]
+    query_budget = {"GET": 3, "PUT": 5, "DELETE": 6}
 
     def get_object(self, pk):
-        return get_object_or_404(Order, pk=pk)
+        return get_object_or_404(
+            OrderAdminSerializer.setup_queryset(Order.objects.all()), pk=pk
+        )
 
     def get(self, request, pk):
         order = self.get_object(pk)
         serializer = OrderAdminSerializer(order)
         return Response(serializer.data)
 
+    @transaction.atomic
     def put(self, request, pk):
         order = self.get_object(pk)
         serializer = OrderAdminSerializer(order, data=request.data, partial=True)
         if serializer.is_valid():
+            new_status = serializer.validated_data.get("status", order.status)
+            # A pending order's held stock goes with its status
+            if order.status == Order.Status.PENDING and new_status != order.status:
+                del serializer.validated_data["status"]
+                try:
+                    change_order_status(order.pk, new_status)
+                except InsufficientStock as error:
+                    return Response(
+                        {
+                            "error": "Requested quantity exceeds available stock.",
+                            "product_variants": error.product_variant_ids,
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                order.refresh_from_db(fields=["status", "reserved_until", "updated_at"])
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
-        order = self.get_object(pk)
-        order.delete()
+        # Without the items get_object prefetches, the delete collects them
+        order = get_object_or_404(Order, pk=pk)
+        delete_order(order)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class AdminRefundOrderView(APIView):
     permission_classes = [IsAdminUser]
+    query_budget = 10
 
     @transaction.atomic
     def post(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
+        # Locked, so two refunds of the same order can not both restock it
+        order = get_object_or_404(
+            OrderAdminSerializer.setup_queryset(
+                Order.objects.select_for_update(of=("self",))
+            ),
+            pk=pk,
+        )
         if order.status in [
             Order.Status.CANCELLED,
             Order.Status.FAILED,
@@ -76,10 +188,7 @@ class AdminRefundOrderView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        for item in order.items.all():
-            inventory = item.product_variant.inventory
-            inventory.quantity += item.quantity
-            inventory.save()
+        restock(order_quantities(order))
 
         order.status = Order.Status.CANCELLED
         order.save()
@@ -0,0 +1,134 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in cursor pagination over (created_at, pk), newest first.
+
+    Each page is a single range scan that starts right after the row the
+    cursor points at, so deep pages cost the same as the first one and rows
+    inserted meanwhile never shift a page. Nothing is counted unless the
+    client asks for it with `count=true`.
+
+    Enabled per request with `pagination=cursor` or by sending `cursor`.
+    """
+
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering_field = "created_at"
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get("pagination") == "cursor"
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "true":
+            self.count = queryset.count()
+
+        field = self.ordering_field
+        if position is not None:
+            value, pk = position
+            lookup = "gt" if reverse else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{lookup}": value})
+                | Q(**{field: value, f"pk__{lookup}": pk})
+            )
+        ordering = (field, "pk") if reverse else (f"-{field}", "-pk")
+
+        # Fetch one extra row to learn whether there is more in this direction
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = OrderedDict(
+            [
+                ("next", self.get_next_link()),
+                ("previous", self.get_previous_link()),
+                ("results", data),
+            ]
+        )
+        if self.count is not None:
+            response["count"] = self.count
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_link(self.page[0], reverse=True)
+
+    def build_link(self, instance, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "pagination")
+        # Counting is paid for once, on the request that asked for it
+        url = remove_query_param(url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(instance, reverse)
+        )
+
+    def encode_cursor(self, instance, reverse):
+        payload = {
+            "v": getattr(instance, self.ordering_field).isoformat(),
+            "p": instance.pk,
+            "r": reverse,
+        }
+        data = json.dumps(payload, separators=(",", ":")).encode("ascii")
+        return base64.urlsafe_b64encode(data).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            # Parsed here, a tampered value would only fail in the query
+            value = parse_datetime(payload["v"])
+            position = value, int(payload["p"])
+            reverse = bool(payload["r"])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
@@ -0,0 +1,51 @@
+from django.db import transaction
+from orders.models import Order, OrderItem
+from orders.reservations import hold_expiry, reserve_stock
+
+
+class EmptyCart(Exception):
+    pass
+
+
+@transaction.atomic
+def place_order(cart, user, shipping_address):
+    """
+    Turn the cart into a pending order: one locked read of the cart items,
+    one conditional UPDATE holding their stock until the payment is
+    verified, the order with its totals, one bulk insert of its items.
+    Returns the order and its total amount.
+    """
+    # Locking the items keeps the same cart from being checked out twice
+    items = list(
+        cart.items.select_related("product_variant")
+        .select_for_update(of=("self",))
+        .order_by("pk")
+    )
+    if not items:
+        raise EmptyCart()
+
+    reserve_stock({item.product_variant_id: item.quantity for item in items})
+
+    order_items = [
+        OrderItem(
+            product_variant=item.product_variant,
+            price=item.product_variant.price,
+            quantity=item.quantity,
+        )
+        for item in items
+    ]
+    order = Order.objects.create(
+        user=user,
+        shipping_address=shipping_address,
+        reserved_until=hold_expiry(),
+        total_amount=sum(item.get_cost() for item in order_items),
+        item_count=len(order_items),
+    )
+    for item in order_items:
+        item.order = order
+    OrderItem.objects.bulk_create(order_items)
+
+    cart.items.all().delete()
+    cart.coupon = None
+    cart.save()
+    return order, order.total_amount
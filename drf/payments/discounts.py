@@ -0,0 +1,130 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Discount
+
+# Bumped on every discount change, so each worker can tell its index is stale
+DISCOUNTS_VERSION_KEY = "active_discounts_version"
+
+# (ActiveDiscounts, version it was built at, time it stops being valid)
+_index = None
+
+
+def apply_discount(price, percent):
+    """Price after a percentage discount, never below 0."""
+    if not percent:
+        return price
+    return max(price * (1 - percent / 100), 0)
+
+
+class ActiveDiscounts:
+    """
+    The best percentage of every currently active Discount, per variant and
+    per category. Loaded with a fixed number of queries, so pricing a whole
+    cart costs the same however many items it holds.
+    """
+
+    def __init__(self, by_variant, by_category):
+        self.by_variant = by_variant
+        self.by_category = by_category
+
+    @classmethod
+    def load(cls, now=None):
+        now = now or timezone.now()
+        active = {
+            "discount__is_active": True,
+            "discount__valid_from__lte": now,
+            "discount__valid_to__gte": now,
+        }
+        by_variant = cls._best_percents(
+            Discount.applicable_to.through.objects.filter(**active),
+            "productvariant_id",
+        )
+        by_category = cls._best_percents(
+            Discount.applicable_categories.through.objects.filter(**active),
+            "category_id",
+        )
+        return cls(by_variant, by_category)
+
+    @staticmethod
+    def _best_percents(links, target_field):
+        best = {}
+        for target_id, percent in links.values_list(
+            target_field, "discount__discount_percent"
+        ):
+            if percent > best.get(target_id, 0):
+                best[target_id] = percent
+        return best
+
+    def percent_for(self, variant_id, category_id=None):
+        return max(
+            self.by_variant.get(variant_id, 0),
+            self.by_category.get(category_id, 0) if category_id else 0,
+        )
+
+    def price_for(self, variant):
+        """Discounted price of a variant, its product must be loaded already."""
+        percent = self.percent_for(variant.pk, variant.product.category_id)
+        return apply_discount(variant.price, percent)
+
+
+def next_discount_boundary(now):
+    """
+    The earliest moment an active discount starts or ends after ``now``, the
+    point where the set of active discounts changes on its own.
+    """
+    boundaries = Discount.objects.filter(is_active=True).aggregate(
+        next_start=Min("valid_from", filter=Q(valid_from__gt=now)),
+        next_end=Min("valid_to", filter=Q(valid_to__gte=now)),
+    )
+    return min(filter(None, boundaries.values()), default=None)
+
+
+def get_active_discounts():
+    """
+    ActiveDiscounts kept in this process until a discount changes anywhere,
+    the next start or end of a discount passes, or DISCOUNT_INDEX_MAX_AGE
+    seconds go by. A max age of 0 loads from the database every time.
+    """
+    global _index
+    max_age = settings.DISCOUNT_INDEX_MAX_AGE
+    if not max_age:
+        return ActiveDiscounts.load()
+
+    now = timezone.now()
+    # Read before loading, so a change made during the load forces a rebuild
+    version = cache.get(DISCOUNTS_VERSION_KEY)
+    if _index is not None:
+        discounts, built_version, expires_at = _index
+        if built_version == version and now < expires_at:
+            return discounts
+
+    discounts = ActiveDiscounts.load(now)
+    expires_at = now + timedelta(seconds=max_age)
+    boundary = next_discount_boundary(now)
+    if boundary is not None:
+        expires_at = min(expires_at, boundary)
+    _index = (discounts, version, expires_at)
+    return discounts
+
+
+def bump_discounts_version():
+    try:
+        cache.incr(DISCOUNTS_VERSION_KEY)
+    except ValueError:
+        # Start from the clock, so an evicted counter never repeats a version
+        cache.add(DISCOUNTS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_active_discounts():
+    """Make every worker rebuild its index on its next request."""
+    bump_discounts_version()
+    if connection.in_atomic_block:
+        # Another worker may rebuild from pre-commit rows in between
+        transaction.on_commit(bump_discounts_version)
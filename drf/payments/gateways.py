@@ -0,0 +1,75 @@
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from zarinpal import views as zarinpal_views
+
+
+# Failure codes of calls that never got an answer, the payment may still
+# have gone through
+UNREACHABLE = {"timeout", "connection error"}
+
+
+def is_unreachable(result):
+    return not result["status"] and result.get("code") in UNREACHABLE
+
+
+class PaymentGateway:
+    """
+    What checkout needs from a payment provider. Both calls return a dict
+    with a boolean "status"; on failure "code" says why, one of UNREACHABLE
+    when the provider could not be reached.
+    """
+
+    def request_payment(self, amount):
+        """On success the dict also holds "authority" and the "url" to pay at."""
+        raise NotImplementedError
+
+    def verify(self, authority, amount):
+        raise NotImplementedError
+
+
+class ZarinpalGateway(PaymentGateway):
+    def request_payment(self, amount):
+        return self.as_result(zarinpal_views.send_request(None, {"amount": amount}))
+
+    def verify(self, authority, amount):
+        return self.as_result(zarinpal_views.verify(authority, amount))
+
+    def as_result(self, response):
+        # The zarinpal helpers hand back the raw HTTP response on non-200s
+        if isinstance(response, dict):
+            return response
+        return {"status": False, "code": str(response.status_code)}
+
+
+class FakeGateway(PaymentGateway):
+    """
+    Accepts every payment without leaving the process, for tests and local
+    development. Set ``fail`` to have every call declined, ``unreachable``
+    to have verifications time out.
+    """
+
+    fail = False
+    unreachable = False
+
+    def request_payment(self, amount):
+        if self.fail:
+            return {"status": False, "code": "declined"}
+        authority = uuid.uuid4().hex
+        return {
+            "status": True,
+            "url": f"http://localhost/fake-gateway/{authority}/",
+            "authority": authority,
+        }
+
+    def verify(self, authority, amount):
+        if self.unreachable:
+            return {"status": False, "code": "timeout"}
+        if self.fail:
+            return {"status": False, "code": "declined"}
+        return {"status": True, "RefID": authority}
+
+
+def get_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.8 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_lookup_indexes"),
+        ("payments", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["order", "transaction_id"], name="payment_order_transaction_idx"
+            ),
+        ),
+        # The composite index leads with order, so the FK's own one can go
+        migrations.AlterField(
+            model_name="payment",
+            name="order",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to="orders.order",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.8 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0002_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Waiting for payment"),
+                    ("successful", "Successful"),
+                    ("failed", "Failed"),
+                    ("to_refund", "Paid, order not fulfilled, to be refunded"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
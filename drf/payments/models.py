@@ -10,6 +10,8 @@ class Payment(models.Model):
         PENDING = "pending", "Waiting for payment"
         SUCCESSFUL = "successful", "Successful"
         FAILED = "failed", "Failed"
+        # Verified by the gateway after the order's stock was gone
+        TO_REFUND = "to_refund", "Paid, order not fulfilled, to be refunded"
 
     class Method(models.TextChoices):
         CARD_TO_CARD = "CARD_TO_CARD", "Cart to cart"
@@ -17,7 +19,10 @@ class Payment(models.Model):
         WALLET = "WALLET", "Wallet payment"
         CASH_ON_DELIVERY = "CASH_ON_DELIVERY", "Cash on delivery"
 
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="payments")
+    # Indexed together with transaction_id, see Meta
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="payments", db_index=False
+    )
     amount = models.PositiveBigIntegerField()
     payment_method = models.CharField(
         max_length=50, choices=Method.choices, default=Method.ONLINE_GATEWAY
@@ -28,6 +33,14 @@ class Payment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     transaction_id = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            # Payment verification, and the order's payments on their own
+            models.Index(
+                fields=["order", "transaction_id"], name="payment_order_transaction_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Payment for Order {self.order.id} {self.status=}"
 
@@ -0,0 +1,18 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from payments.discounts import invalidate_active_discounts
+from payments.models import Discount
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_on_discount_change(sender, **kwargs):
+    invalidate_active_discounts()
+
+
+@receiver(m2m_changed, sender=Discount.applicable_to.through)
+@receiver(m2m_changed, sender=Discount.applicable_categories.through)
+def invalidate_on_discount_targets_change(sender, action, **kwargs):
+    if action.startswith("post_"):
+        invalidate_active_discounts()
@@ -0,0 +1,64 @@
+import logging
+
+from django.db import transaction
+from jobs.queue import enqueue
+from notifications.tasks import notify_refund_needed
+from orders.models import Order
+from orders.reservations import confirm_order, release_order
+
+from payments.gateways import get_gateway, is_unreachable
+from payments.models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayUnreachable(Exception):
+    pass
+
+
+def verify_payment(payment_id):
+    """
+    Verify a payment whose callback could not reach the gateway and settle
+    its order. Raises GatewayUnreachable, for the job to be retried, while
+    the gateway still does not answer.
+    """
+    payment = Payment.objects.get(pk=payment_id)
+    if payment.status != Payment.Status.PENDING:
+        return
+    result = get_gateway().verify(payment.transaction_id, payment.amount)
+    if is_unreachable(result):
+        raise GatewayUnreachable(result["code"])
+    if result["status"]:
+        settle_paid_payment(payment)
+    else:
+        payment.status = Payment.Status.FAILED
+        payment.save(update_fields=["status"])
+        release_order(payment.order_id, Order.Status.FAILED)
+
+
+@transaction.atomic
+def settle_paid_payment(payment):
+    """
+    Confirm the order of a payment the gateway verified, then record the
+    payment. When the order's hold had lapsed and its stock sold out, the
+    payment is marked TO_REFUND and the staff are told. Returns whether
+    the order was confirmed.
+    """
+    confirmed = confirm_order(payment.order_id)
+    if confirmed:
+        payment.status = Payment.Status.SUCCESSFUL
+    else:
+        payment.status = Payment.Status.TO_REFUND
+        logger.error(
+            "Payment %s was verified but order %s is out of stock, refund it",
+            payment.pk,
+            payment.order_id,
+        )
+        enqueue(
+            notify_refund_needed,
+            payment.order_id,
+            payment.pk,
+            queue="notifications",
+        )
+    payment.save(update_fields=["status"])
+    return confirmed
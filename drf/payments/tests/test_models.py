@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from products.factories import CategoryFactory, ProductFactory, ProductVariantFactory
+
+from payments import discounts
+from payments.factories import DiscountFactory
+
+
+@override_settings(DISCOUNT_INDEX_MAX_AGE=300)
+class ActiveDiscountsIndexTest(TestCase):
+    def setUp(self):
+        discounts._index = None
+        self.addCleanup(setattr, discounts, "_index", None)
+        self.category = CategoryFactory()
+        self.variant = ProductVariantFactory(
+            product=ProductFactory(category=self.category), price=1000
+        )
+
+    def test_index_reused_until_discounts_change(self):
+        DiscountFactory(discount_percent=10, applicable_categories=[self.category])
+        index = discounts.get_active_discounts()
+        self.assertEqual(index.price_for(self.variant), 900)
+        with self.assertNumQueries(0):
+            self.assertIs(discounts.get_active_discounts(), index)
+
+        DiscountFactory(discount_percent=20, applicable_to=[self.variant])
+        index = discounts.get_active_discounts()
+        self.assertEqual(index.price_for(self.variant), 800)
+
+    def test_index_expires_when_a_discount_starts(self):
+        now = timezone.now()
+        DiscountFactory(
+            discount_percent=10,
+            valid_from=now + timezone.timedelta(minutes=1),
+            applicable_categories=[self.category],
+        )
+        self.assertEqual(discounts.get_active_discounts().price_for(self.variant), 1000)
+
+        later = now + timezone.timedelta(minutes=2)
+        with mock.patch("payments.discounts.timezone.now", return_value=later):
+            index = discounts.get_active_discounts()
+        self.assertEqual(index.price_for(self.variant), 900)
+
+    def test_index_expires_when_a_discount_ends(self):
+        now = timezone.now()
+        DiscountFactory(
+            discount_percent=10,
+            valid_to=now + timezone.timedelta(minutes=1),
+            applicable_categories=[self.category],
+        )
+        self.assertEqual(discounts.get_active_discounts().price_for(self.variant), 900)
+
+        later = now + timezone.timedelta(minutes=2)
+        with mock.patch("payments.discounts.timezone.now", return_value=later):
+            index = discounts.get_active_discounts()
+        self.assertEqual(index.price_for(self.variant), 1000)
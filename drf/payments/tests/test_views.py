@@ -0,0 +1,205 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from account.factories import AddressFactory, UserFactory
+from cart.factories import CartItemFactory
+from cart.models import Cart
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from jobs.models import Job
+from notifications.models import Notification
+from orders.models import Order
+from orders.reservations import reserve_stock
+from products.factories import ProductVariantFactory
+from products.models import Inventory
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from payments.gateways import FakeGateway
+from payments.models import Payment
+from payments.tasks import verify_payment
+
+
+class CheckoutViewTest(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.address = AddressFactory(user=self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        self.variant1 = ProductVariantFactory(price=1000, create_inventory__quantity=5)
+        self.variant2 = ProductVariantFactory(price=2000, create_inventory__quantity=1)
+        CartItemFactory(
+            cart=self.cart, product_variant=self.variant1, quantity=2, price=1000
+        )
+        CartItemFactory(
+            cart=self.cart, product_variant=self.variant2, quantity=1, price=2000
+        )
+        self.url = reverse("payments:checkout")
+        self.client.force_authenticate(user=self.user)
+
+    def stock(self, variant):
+        inventory = Inventory.objects.get(product_variant=variant)
+        return inventory.quantity, inventory.reserved
+
+    def checkout(self):
+        return self.client.post(self.url, {"shipping_address": self.address.id})
+
+    def verify(self, order, status="OK"):
+        return self.client.get(
+            reverse("payments:verify_payment"),
+            {"Authority": order.transaction_id, "Status": status},
+        )
+
+    def test_checkout_creates_order(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(
+            sorted(order.items.values_list("product_variant_id", "quantity")),
+            [(self.variant1.id, 2), (self.variant2.id, 1)],
+        )
+        self.assertEqual((order.total_amount, order.item_count), (4000, 2))
+        payment = Payment.objects.get(order=order)
+        self.assertEqual(payment.amount, 4000)
+        self.assertEqual(payment.transaction_id, order.transaction_id)
+        self.assertIn(order.transaction_id, response.data["payment_url"])
+        self.assertIsNotNone(order.reserved_until)
+        # Held, not taken, until the payment is verified
+        self.assertEqual(self.stock(self.variant1), (5, 2))
+        self.assertEqual(self.stock(self.variant2), (1, 1))
+        self.assertFalse(self.cart.items.exists())
+        self.assertFalse(self.variant2.product.card.in_stock)
+
+    def test_verified_payment_takes_held_stock(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        response = self.verify(order)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+        self.assertIsNone(order.reserved_until)
+        self.assertEqual(self.stock(self.variant1), (3, 0))
+        self.assertEqual(self.stock(self.variant2), (0, 0))
+
+    def test_cancelled_payment_releases_held_stock(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        response = self.verify(order, status="NOK")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.FAILED)
+        self.assertEqual(self.stock(self.variant1), (5, 0))
+        self.assertEqual(self.stock(self.variant2), (1, 0))
+        self.assertTrue(self.variant2.product.card.in_stock)
+
+    def test_held_stock_is_not_available(self):
+        self.checkout()
+        other_user = UserFactory()
+        other_cart = Cart.objects.create(user=other_user)
+        CartItemFactory(
+            cart=other_cart, product_variant=self.variant1, quantity=3, price=1000
+        )
+        self.client.force_authenticate(user=other_user)
+        response = self.client.post(
+            self.url, {"shipping_address": AddressFactory(user=other_user).id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stock(self.variant1), (5, 5))
+
+        # Both holds together use up the stock, nothing is left to add
+        response = self.client.post(
+            reverse("cart:cart-add-get"),
+            {"product_variant": self.variant1.id, "quantity": 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_insufficient_stock(self):
+        Inventory.objects.filter(product_variant=self.variant1).update(quantity=1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["product_variants"], [self.variant1.id])
+        # Nothing was held, not even the variant that had enough
+        self.assertEqual(self.stock(self.variant1), (1, 0))
+        self.assertEqual(self.stock(self.variant2), (1, 0))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_checkout_empty_cart(self):
+        self.cart.items.all().delete()
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+
+    @mock.patch.object(FakeGateway, "fail", True)
+    def test_checkout_gateway_declines(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.status, Order.Status.FAILED)
+        self.assertEqual(order.payments.get().status, Payment.Status.FAILED)
+        self.assertEqual(self.stock(self.variant1), (5, 0))
+
+    @override_settings(JOBS_EAGER=False)
+    def test_unreachable_verification_is_retried_by_the_worker(self):
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        with mock.patch.object(FakeGateway, "unreachable", True):
+            response = self.verify(order)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            # Still unreachable from the worker, the job stays queued
+            Job.objects.update(run_after=timezone.now())
+            with self.assertLogs("jobs.worker", "WARNING"):
+                call_command("run_jobs", "--once", stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PENDING)
+        self.assertEqual(self.stock(self.variant1), (5, 2))
+
+        Job.objects.update(run_after=timezone.now())
+        call_command("run_jobs", "--once", stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.PAID)
+        self.assertEqual(order.payments.get().status, Payment.Status.SUCCESSFUL)
+        self.assertEqual(self.stock(self.variant1), (3, 0))
+        self.assertEqual(Job.objects.get(queue="payments").status, Job.Status.DONE)
+
+    def sell_out_after_hold_expires(self, order):
+        Order.objects.filter(pk=order.pk).update(
+            reserved_until=timezone.now() - timedelta(minutes=1)
+        )
+        call_command("release_expired_reservations", stdout=StringIO())
+        reserve_stock({self.variant2.id: 1})
+
+    def assert_refund_needed(self, order, staff):
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+        self.assertEqual(order.payments.get().status, Payment.Status.TO_REFUND)
+        self.assertEqual(self.stock(self.variant2), (1, 1))
+        notification = Notification.objects.get(
+            user=staff, notification_type=Notification.Type.CUSTOM
+        )
+        self.assertEqual(notification.object_id, order.id)
+        self.assertIn("refund", notification.message)
+
+    def test_verified_payment_after_stock_sold_out_is_refunded(self):
+        staff = UserFactory(is_staff=True)
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        self.sell_out_after_hold_expires(order)
+
+        with self.assertLogs("payments.tasks", "ERROR"):
+            response = self.verify(order)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assert_refund_needed(order, staff)
+
+    def test_retried_verification_after_stock_sold_out_is_refunded(self):
+        staff = UserFactory(is_staff=True)
+        self.checkout()
+        order = Order.objects.get(user=self.user)
+        self.sell_out_after_hold_expires(order)
+
+        with self.assertLogs("payments.tasks", "ERROR"):
+            verify_payment(order.payments.get().pk)
+        self.assert_refund_needed(order, staff)
@@ -1,27 +1,36 @@
 from account.models import Address
 from cart.models import Cart
 from django.db import transaction
-from orders.models import Order, OrderItem
+from jobs.queue import enqueue
+from orders.models import Order
+from orders.reservations import InsufficientStock, release_order
 from orders.serializers import OrderSerializer
+from query_budget import query_budget
 from rest_framework import status, viewsets
 from rest_framework import status as rest_status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from zarinpal import views as zarinpal_views
 
 from payments.models import Payment
 
+from .checkout import EmptyCart, place_order
+from .gateways import get_gateway, is_unreachable
 from .models import Coupon, Discount
 from .serializers import CouponSerializer, DiscountSerializer
+from .tasks import settle_paid_payment, verify_payment
 
 
+@query_budget(18)
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
-@transaction.atomic
 def checkout_view(request):
+    """
+    The order and its pending payment are committed first. The gateway is
+    only called afterwards, so a slow gateway never holds a transaction.
+    """
     cart = Cart.objects.filter(user=request.user).first()
-    if not cart or not cart.items.exists():
+    if not cart:
         return Response(
             {"error": "Cart is empty"}, status=rest_status.HTTP_400_BAD_REQUEST
         )
@@ -42,45 +51,38 @@ def checkout_view(request):
             status=rest_status.HTTP_400_BAD_REQUEST,
         )
 
-    total_amount = sum(
-        item.product_variant.price * item.quantity for item in cart.items.all()
-    )
-
-    order = Order.objects.create(user=request.user, shipping_address=shipping_address)
-    for cart_item in cart.items.all():
-        OrderItem.objects.create(
-            order=order,
-            product_variant=cart_item.product_variant,
-            price=cart_item.product_variant.price,
-            quantity=cart_item.quantity,
+    try:
+        with transaction.atomic():
+            order, total_amount = place_order(cart, request.user, shipping_address)
+            payment = Payment.objects.create(
+                order=order,
+                amount=total_amount,
+                payment_method=Payment.Method.ONLINE_GATEWAY,
+                status=Payment.Status.PENDING,  # Initially set to Pending
+            )
+    except EmptyCart:
+        return Response(
+            {"error": "Cart is empty"}, status=rest_status.HTTP_400_BAD_REQUEST
         )
-        # Update inventory
-        inventory = cart_item.product_variant.inventory
-        inventory.quantity -= cart_item.quantity
-        inventory.save()
-
-    cart.items.all().delete()
-    cart.coupon = None
-    cart.save()
-
-    # Create a pending payment
-    payment = Payment.objects.create(
-        order=order,
-        amount=total_amount,
-        payment_method="Zarinpal",
-        status=Payment.Status.PENDING,  # Initially set to Pending
-    )
-    # Initiate Zarinpal payment
-    payment_response = zarinpal_views.send_request(
-        request, data={"amount": payment.amount}
-    )
+    except InsufficientStock as error:
+        return Response(
+            {
+                "error": "Requested quantity exceeds available stock.",
+                "product_variants": error.product_variant_ids,
+            },
+            status=rest_status.HTTP_400_BAD_REQUEST,
+        )
+
+    payment_response = get_gateway().request_payment(payment.amount)
     if payment_response["status"]:
         # Store the payment authority in the order for later verification
         order.transaction_id = payment_response["authority"]
-        order.save()
+        order.save(update_fields=["transaction_id", "updated_at"])
         payment.transaction_id = payment_response["authority"]
-        payment.save()
+        payment.save(update_fields=["transaction_id"])
 
+        # With its items and their products in two queries, however many
+        order = OrderSerializer.setup_queryset(Order.objects.all()).get(pk=order.pk)
         return Response(
             {
                 "order": OrderSerializer(order).data,
@@ -89,15 +91,17 @@ def checkout_view(request):
             status=rest_status.HTTP_201_CREATED,
         )
     else:
-        # If payment initiation fails, mark the order and payment as failed
-        order.status = Order.Status.FAILED
-        order.save()
+        # If payment initiation fails, fail the order and release its stock
+        release_order(order.pk, Order.Status.FAILED)
+        payment.status = Payment.Status.FAILED
+        payment.save(update_fields=["status"])
         return Response(
             {"error": "Payment initiation failed"},
             status=rest_status.HTTP_400_BAD_REQUEST,
         )
 
 
+@query_budget(4)
 @api_view(["GET"])
 def payment_verification_view(request):
     authority = request.GET.get("Authority")
@@ -112,13 +116,38 @@ def payment_verification_view(request):
             )
 
         if status == "OK":
-            verification_response = zarinpal_views.verify(authority, payment.amount)
+            verification_response = get_gateway().verify(authority, payment.amount)
+            if is_unreachable(verification_response):
+                # Keep trying from the jobs worker rather than failing an
+                # order the customer may well have paid for
+                enqueue(
+                    verify_payment,
+                    payment.pk,
+                    queue="payments",
+                    dedup_key=f"verify-payment-{payment.pk}",
+                    max_attempts=6,
+                )
+                return Response(
+                    {
+                        "message": "Payment is being verified",
+                        "order_id": order.id,
+                        "payment_id": payment.id,
+                    },
+                    status=rest_status.HTTP_202_ACCEPTED,
+                )
             if verification_response["status"]:
                 # Payment was successful
-                payment.status = Payment.Status.SUCCESSFUL
-                payment.save()
-                order.status = Order.Status.PAID
-                order.save()
+                if not settle_paid_payment(payment):
+                    # The hold expired and the stock sold out in the meantime
+                    return Response(
+                        {
+                            "error": "Reserved stock is no longer available, "
+                            "the payment will be refunded",
+                            "order_id": order.id,
+                            "payment_id": payment.id,
+                        },
+                        status=rest_status.HTTP_409_CONFLICT,
+                    )
                 return Response(
                     {
                         "message": "Payment was successful",
@@ -131,8 +160,7 @@ def payment_verification_view(request):
                 # Payment failed
                 payment.status = Payment.Status.FAILED
                 payment.save()
-                order.status = Order.Status.FAILED
-                order.save()
+                release_order(order.pk, Order.Status.FAILED)
                 return Response(
                     {"error": "Payment verification failed"},
                     status=rest_status.HTTP_400_BAD_REQUEST,
@@ -140,8 +168,7 @@ def payment_verification_view(request):
         else:
             payment.status = Payment.Status.FAILED
             payment.save()
-            order.status = Order.Status.FAILED
-            order.save()
+            release_order(order.pk, Order.Status.FAILED)
             return Response(
                 {"error": "Payment was not successful"},
                 status=rest_status.HTTP_400_BAD_REQUEST,
@@ -38,11 +38,50 @@ class ProductVariantAdmin(admin.ModelAdmin):
     # ordering = ['pk']
 
 
+class InventoryAdmin(admin.ModelAdmin):
+    list_display = ("product_variant", "available", "shard_count")
+    actions = ["shard_stock", "unshard_stock"]
+
+    @admin.display(description="Available")
+    def available(self, inventory):
+        return inventory.available
+
+    def get_fields(self, request, obj=None):
+        # Saving the row never reaches the shards, see Inventory.set_shards
+        if obj is not None and obj.sharded:
+            return ["product_variant", "shard_totals"]
+        return super().get_fields(request, obj)
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.sharded:
+            return ["shard_totals"]
+        return super().get_readonly_fields(request, obj)
+
+    @admin.display(description="Stock")
+    def shard_totals(self, inventory):
+        quantity, reserved = inventory.totals()
+        return (
+            f"{quantity} on hand, {reserved} reserved, over "
+            f"{inventory.shard_count} shards. Keep the stock in a single row "
+            "to change it."
+        )
+
+    @admin.action(description="Spread stock over 8 shards (hot variants)")
+    def shard_stock(self, request, queryset):
+        for inventory in queryset:
+            inventory.set_shards(8)
+
+    @admin.action(description="Keep stock in a single row")
+    def unshard_stock(self, request, queryset):
+        for inventory in queryset:
+            inventory.set_shards(0)
+
+
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(ProductVariant, ProductVariantAdmin)
 admin.site.register(ProductImage)
-admin.site.register(Inventory)
+admin.site.register(Inventory, InventoryAdmin)
 admin.site.register(Review)
 admin.site.register(Tag)
 
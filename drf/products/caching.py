@@ -0,0 +1,73 @@
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+# List pages can live for hours: any write that changes a list bumps its
+# generation, which makes the pages cached under the old one unreachable.
+PRODUCT_LIST_TIMEOUT = 60 * 60 * 6  # 6 hours
+GLOBAL_SCOPE = "all"
+
+
+def category_scope(category_id):
+    return f"category_{category_id}"
+
+
+def generation_key(scope):
+    return f"products_list_gen_{scope}"
+
+
+def get_generation(scope):
+    key = generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock rather than 1, so a counter that was evicted
+        # can never come back to a generation whose pages are still cached
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generations(scopes):
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def product_list_cache_key(
+    category_id,
+    search_query,
+    page,
+    min_price=None,
+    max_price=None,
+    sort=None,
+    fields=None,
+):
+    """
+    Category pages live under that category's generation, everything else
+    under the global one.
+    """
+    scope = category_scope(category_id) if category_id else GLOBAL_SCOPE
+    generation = get_generation(scope)
+    fields = ",".join(sorted(fields)) if fields else None
+    return (
+        f"products_list_{generation}_{category_id}_{search_query}_{page}"
+        f"_{min_price}_{max_price}_{sort}_{fields}"
+    )
+
+
+def invalidate_product_lists(*category_ids):
+    """
+    Hide every cached list page that may show products of these categories.
+    No keys are deleted, old pages simply age out of the cache.
+    """
+    scopes = {GLOBAL_SCOPE}
+    scopes.update(category_scope(pk) for pk in category_ids if pk is not None)
+    bump_generations(scopes)
+    if connection.in_atomic_block:
+        # A reader may cache pre-commit rows under the new generation before
+        # the write lands, so bump once more after commit
+        transaction.on_commit(lambda: bump_generations(scopes))
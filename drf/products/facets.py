@@ -0,0 +1,122 @@
+from django.db.models import Count, Q
+from django.db.models.fields.json import KT
+
+from .models import Category, Product, ProductVariant
+
+# Lower bounds of the price bands, in the same unit as ProductVariant.price.
+# The last band is open-ended.
+PRICE_BUCKETS = (0, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+
+# Keys that describe a JSON schema rather than an attribute of the product
+SCHEMA_KEYWORDS = {
+    "$schema",
+    "type",
+    "title",
+    "description",
+    "required",
+    "additionalProperties",
+}
+
+
+def schema_attribute_names(schema):
+    """
+    Attribute names declared by a category schema, which is either a real
+    JSON schema with "properties" or a flat {"name": "type"} mapping.
+    """
+    if not isinstance(schema, dict):
+        return []
+    if isinstance(schema.get("properties"), dict):
+        return list(schema["properties"])
+    return [name for name in schema if name not in SCHEMA_KEYWORDS]
+
+
+def compute_facets(queryset):
+    """
+    Facet counts over the products in ``queryset``: one grouped query per
+    dimension (plus one per schema attribute), independent of result size.
+    """
+    product_ids = queryset.order_by().values("pk")
+    products = Product.objects.filter(pk__in=product_ids)
+
+    categories = list(
+        products.exclude(category=None)
+        .values("category_id", "category__slug", "category__title")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "category__title")
+    )
+    tags = list(
+        Product.tags.through.objects.filter(product_id__in=product_ids)
+        .values("tag__slug", "tag__name")
+        .annotate(count=Count("product_id", distinct=True))
+        .order_by("-count", "tag__name")
+    )
+
+    schemas = Category.objects.filter(
+        pk__in=[category["category_id"] for category in categories]
+    ).values_list("product_attributes_schema", "variant_attributes_schema")
+    product_attributes, variant_attributes = [], []
+    for product_schema, variant_schema in schemas:
+        for name in schema_attribute_names(product_schema):
+            if name not in product_attributes:
+                product_attributes.append(name)
+        for name in schema_attribute_names(variant_schema):
+            if name not in variant_attributes:
+                variant_attributes.append(name)
+
+    return {
+        "categories": [
+            {
+                "slug": category["category__slug"],
+                "title": category["category__title"],
+                "count": category["count"],
+            }
+            for category in categories
+        ],
+        "tags": [
+            {"slug": tag["tag__slug"], "name": tag["tag__name"], "count": tag["count"]}
+            for tag in tags
+        ],
+        "price": price_facet(products),
+        "attributes": {
+            name: attribute_facet(products, f"attributes__{name}", "pk")
+            for name in product_attributes
+        },
+        "variant_attributes": {
+            name: attribute_facet(
+                ProductVariant.objects.filter(product_id__in=product_ids),
+                f"attributes__{name}",
+                "product_id",
+            )
+            for name in variant_attributes
+        },
+    }
+
+
+def price_facet(products):
+    """Products per price band of their cheapest variant, in a single pass."""
+    bounds = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,)))
+    counts = products.aggregate(
+        **{
+            f"band_{index}": Count(
+                "pk",
+                filter=Q(min_price__gte=low)
+                & (Q(min_price__lt=high) if high is not None else Q()),
+            )
+            for index, (low, high) in enumerate(bounds)
+        }
+    )
+    return [
+        {"min": low, "max": high, "count": counts[f"band_{index}"]}
+        for index, (low, high) in enumerate(bounds)
+    ]
+
+
+def attribute_facet(queryset, lookup, product_field):
+    rows = (
+        queryset.annotate(value=KT(lookup))
+        .exclude(value=None)
+        .values("value")
+        .annotate(count=Count(product_field, distinct=True))
+        .order_by("-count", "value")
+    )
+    return [{"value": row["value"], "count": row["count"]} for row in rows]
@@ -0,0 +1,221 @@
+from collections import defaultdict
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import ProductCard, ProductImage, ProductVariant, Review
+from .serializers import (
+    CategoryListSerializer,
+    CategorySerializer,
+    ProductCardSerializer,
+    ProductImageSerializer,
+    ProductSerializer,
+    ProductVariantSerializer,
+    TagListSerializer,
+)
+
+# Read-only twins of the serializers behind the hot read endpoints. They
+# build response dicts straight from ``.values_list()`` rows instead of
+# model instances walked field by field, which is most of the CPU time of
+# those endpoints. Output must stay identical to the ModelSerializer each
+# one mirrors, tests/test_serializers.py checks them side by side.
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+def format_datetime(value):
+    """As serializers.DateTimeField(format=DATETIME_FORMAT) renders it."""
+    if not value:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.strftime(DATETIME_FORMAT)
+
+
+def file_url(model, field_name):
+    """As serializers.ImageField renders a file without a request."""
+    storage = model._meta.get_field(field_name).storage
+
+    def convert(name):
+        return storage.url(name) if name else None
+
+    return convert
+
+
+class ValuesSerializer:
+    """
+    Renders rows from ``setup_queryset`` like ``mirrors`` renders instances.
+
+    ``sources`` maps output names to columns where they differ, the other
+    fields of ``mirrors`` are read from the column of the same name.
+    ``converters`` format the values that are not rendered as they come
+    from the database. Fields that are not columns at all are named in
+    ``related`` and filled in by ``add_related(rows, items)``, which gets
+    the whole batch at once; a subclass that declares ``related`` must
+    define it.
+
+    Like ModelSerializer it takes ``many`` and the sparse ``fields``.
+    """
+
+    mirrors = None
+    sources = {}
+    converters = {}
+    related = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.related and cls.add_related is ValuesSerializer.add_related:
+            raise TypeError(
+                f"{cls.__name__} declares related fields but no add_related()"
+            )
+
+    def __init__(self, instance=None, many=False, fields=None):
+        self.instance = instance
+        self.many = many
+        self.fields = [
+            name
+            for name in self.mirrors.Meta.fields
+            if fields is None or name in fields
+        ]
+        # (output name, row index, converter or None) per rendered column
+        columns = self.get_columns()
+        self.plan = [
+            (name, columns.index(name), self.converters.get(name))
+            for name in self.fields
+            if name not in self.related
+        ]
+
+    @classmethod
+    def get_columns(cls):
+        return [name for name in cls.mirrors.Meta.fields if name not in cls.related]
+
+    @classmethod
+    def setup_queryset(cls, queryset):
+        """
+        Named rows with every column, so paginators can still read them as
+        objects; sparse fields are only dropped when rendering.
+        """
+        return queryset.values_list(
+            *[cls.sources.get(name, name) for name in cls.get_columns()], named=True
+        )
+
+    def to_representation(self, row):
+        item = {}
+        for name, index, convert in self.plan:
+            value = row[index]
+            item[name] = value if convert is None else convert(value)
+        return item
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        items = [self.to_representation(row) for row in rows]
+        if any(name in self.related for name in self.fields):
+            self.add_related(rows, items)
+        return items if self.many else items[0]
+
+    def add_related(self, rows, items):
+        """Fill the ``related`` fields of ``items`` in place, none by default."""
+
+
+class CategoryValuesSerializer(ValuesSerializer):
+    mirrors = CategorySerializer
+    sources = {"id": "pk", "parent": "parent_id"}
+    converters = {"created_at": format_datetime, "updated_at": format_datetime}
+
+
+class CategoryListValuesSerializer(CategoryValuesSerializer):
+    mirrors = CategoryListSerializer
+
+
+class TagListValuesSerializer(ValuesSerializer):
+    mirrors = TagListSerializer
+    sources = {"id": "pk"}
+
+
+class ProductCardValuesSerializer(ValuesSerializer):
+    mirrors = ProductCardSerializer
+    # "pk" rather than "product_id" so KeysetPagination finds row.pk
+    sources = {"id": "pk", "category": "category_id"}
+    converters = {
+        "image": file_url(ProductCard, "image"),
+        "created_at": format_datetime,
+    }
+
+
+class ProductValuesSerializer(ValuesSerializer):
+    """The product detail, its images, variants and rating in one query each."""
+
+    mirrors = ProductSerializer
+    sources = {"id": "pk", "category": "category_id"}
+    converters = {"created_at": format_datetime, "updated_at": format_datetime}
+    related = ("images", "variants", "lowest_price", "average_rating")
+
+    image_url = staticmethod(file_url(ProductImage, "image"))
+
+    def add_related(self, rows, items):
+        product_ids = [row.pk for row in rows]
+        fields = set(self.fields)
+
+        if "images" in fields:
+            images = defaultdict(list)
+            for image_id, product_id, image, alt_text in (
+                ProductImage.objects.filter(product_id__in=product_ids)
+                .order_by("pk")
+                .values_list("pk", "product_id", "image", "alt_text")
+            ):
+                images[product_id].append(
+                    dict(
+                        zip(
+                            ProductImageSerializer.Meta.fields,
+                            (image_id, product_id, self.image_url(image), alt_text),
+                        )
+                    )
+                )
+
+        if fields & {"variants", "lowest_price"}:
+            variants = defaultdict(list)
+            for variant_id, product_id, price, attributes in (
+                ProductVariant.objects.filter(product_id__in=product_ids)
+                .order_by("pk")
+                .values_list("pk", "product_id", "price", "attributes")
+            ):
+                # ProductVariantSerializer looks for the inventory on
+                # obj.product_variant and so never finds a quantity
+                variants[product_id].append(
+                    dict(
+                        zip(
+                            ProductVariantSerializer.Meta.fields,
+                            (variant_id, product_id, price, None, attributes),
+                        )
+                    )
+                )
+
+        if "average_rating" in fields:
+            # Summed and divided here, as ProductSerializer does, rather than
+            # AVG() which PostgreSQL rounds as numeric
+            ratings = {
+                product_id: total / count
+                for product_id, total, count in Review.objects.filter(
+                    product_id__in=product_ids
+                )
+                .order_by()
+                .values("product_id")
+                .annotate(total=Sum("rating"), count=Count("pk"))
+                .values_list("product_id", "total", "count")
+            }
+
+        for item, product_id in zip(items, product_ids):
+            if "images" in fields:
+                item["images"] = images[product_id]
+            if "variants" in fields:
+                item["variants"] = variants[product_id]
+            if "lowest_price" in fields:
+                prices = [variant["price"] for variant in variants[product_id]]
+                item["lowest_price"] = min(prices) if prices else None
+            if "average_rating" in fields:
+                item["average_rating"] = ratings.get(product_id)
+
+        # Keep the key order of the mirrored serializer
+        for index, item in enumerate(items):
+            items[index] = {name: item[name] for name in self.fields}
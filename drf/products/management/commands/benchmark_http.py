@@ -0,0 +1,385 @@
+import json
+import math
+import random
+import statistics
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from account.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from payments.models import Coupon
+from products.models import Inventory, Product
+
+from .seed_load import check_seed, phone_prefix
+
+# ``send`` makes the measured request of a worker. Untimed, ``setup`` runs
+# once per worker before the scenario and ``prepare`` before every request.
+Scenario = namedtuple("Scenario", "name send setup prepare", defaults=[None, None])
+# What a baseline run may be beaten by before it counts as a regression,
+# on top of --tolerance: queries per request are counted, not timed
+QUERY_SLACK = 0.5
+
+
+class Worker:
+    """One simulated client: a logged in user with a keep-alive session."""
+
+    def __init__(self, base_url, user, password, seed):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.rng = random.Random(seed)
+        response = self.post(
+            reverse("account:token_obtain_pair"),
+            {"phone_number": user.phone_number, "password": password},
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f"Could not log in as {user.phone_number} ({response.status_code}), "
+                "seed the database with seed_load or pass its --password"
+            )
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access']}"
+        self.address_id = user.addresses.values_list("pk", flat=True).first()
+
+    def get(self, path, params=None):
+        return self.session.get(self.base_url + path, params=params)
+
+    def post(self, path, data=None):
+        return self.session.post(self.base_url + path, json=data)
+
+    def delete(self, path, params=None):
+        return self.session.delete(self.base_url + path, params=params)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the shop API over HTTP against a running server: requests "
+        "per second, p50/p95/p99 latency and queries per request of product, "
+        "cart, checkout, order and notification endpoints. Serve the seeded "
+        "database (see seed_load) with OnlineShop.benchmark_settings, which "
+        "uses the fake payment gateway and reports query counts, and run "
+        "this command with the same settings. --save stores the results as a "
+        "baseline, --compare reports the changes against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Per scenario, all workers"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Unmeasured requests per worker"
+        )
+        parser.add_argument("--scenarios", nargs="+", metavar="NAME")
+        parser.add_argument(
+            "--seed", type=int, default=1, help="Of the seed_load run to log in as"
+        )
+        parser.add_argument("--password", default="seed-password")
+        parser.add_argument("--save", metavar="PATH", help="Store as a baseline")
+        parser.add_argument("--compare", metavar="PATH", help="Baseline to compare")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Slower p95 or lower throughput by more than this share "
+            "counts as a regression",
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error when a scenario regressed",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        check_seed(options["seed"])
+        # The percentiles need at least two latencies per scenario
+        if options["concurrency"] < 1 or options["requests"] < 2:
+            raise CommandError("--concurrency must be 1+ and --requests 2+")
+        baseline = self.load_baseline(options["compare"]) if options["compare"] else {}
+        self.pick_targets()
+        workers = self.start_workers()
+
+        scenarios = self.scenarios()
+        if options["scenarios"]:
+            unknown = set(options["scenarios"]) - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [s for s in scenarios if s.name in options["scenarios"]]
+
+        self.stdout.write(
+            f"{'scenario':<20}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        )
+        results = {}
+        regressions = []
+        for scenario in scenarios:
+            result = self.run(scenario, workers)
+            results[scenario.name] = result
+            self.report(scenario.name, result)
+            if scenario.name in baseline:
+                regressions += self.compare(scenario.name, result, baseline)
+
+        if options["save"]:
+            self.save_baseline(options["save"], results)
+        if regressions and options["fail"]:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
+
+    def pick_targets(self):
+        """Products, stocked variants and a usable coupon of the seeded data."""
+        self.product_ids = list(
+            Product.objects.order_by("-pk").values_list("pk", flat=True)[:1000]
+        )
+        # Plenty left, so checkouts do not run out halfway
+        stocked = Inventory.objects.filter(
+            shard_count=0,
+            quantity__gte=F("reserved") + 100,
+            product_variant__product__available=True,
+        ).order_by("pk")
+        self.variant_ids = list(
+            stocked.values_list("product_variant_id", flat=True)[:1000]
+        )
+        if not self.product_ids or not self.variant_ids:
+            raise CommandError("Nothing to benchmark, seed the database first")
+        self.search_terms = sorted(
+            {
+                title.split()[0]
+                for title in Product.objects.filter(
+                    pk__in=self.product_ids[:100]
+                ).values_list("title", flat=True)
+            }
+        )
+        now = timezone.now()
+        coupon = (
+            Coupon.objects.filter(
+                active=True,
+                valid_from__lte=now,
+                valid_to__gte=now,
+                usage_count__lt=F("usage_limit"),
+                applicable_categories__isnull=False,
+            )
+            .order_by("pk")
+            .first()
+        )
+        self.coupon_code = coupon and coupon.code
+        # For the carts the coupon is applied to
+        self.coupon_variant_ids = coupon and list(
+            stocked.filter(
+                product_variant__product__category__in=(
+                    coupon.applicable_categories.all()
+                )
+            ).values_list("product_variant_id", flat=True)[:100]
+        )
+
+    def start_workers(self):
+        seed = self.options["seed"]
+        # Past the first, staff user
+        users = list(
+            User.objects.filter(
+                phone_number__startswith=phone_prefix(seed),
+                is_staff=False,
+                addresses__isnull=False,
+            )
+            .distinct()
+            .order_by("pk")[: self.options["concurrency"]]
+        )
+        if len(users) < self.options["concurrency"]:
+            raise CommandError(
+                f"Not enough users of seed {seed} for --concurrency, see seed_load"
+            )
+        base_url = self.options["url"].rstrip("/")
+        return [
+            Worker(base_url, user, self.options["password"], seed + n)
+            for n, user in enumerate(users)
+        ]
+
+    def scenarios(self):
+        cart = reverse("cart:cart-add-get")
+        clear = reverse("cart:cart-clear")
+
+        def add_to_cart(worker, variant_ids=self.variant_ids):
+            return worker.post(
+                cart,
+                {"product_variant": worker.rng.choice(variant_ids), "quantity": 1},
+            )
+
+        def remove_coupon(worker):
+            worker.delete(clear, {"action": "remove_coupon"})
+
+        def clear_cart(worker):
+            worker.delete(clear)
+            remove_coupon(worker)
+
+        def fill_cart(worker):
+            clear_cart(worker)
+            add_to_cart(worker)
+
+        def fill_cart_for_coupon(worker):
+            clear_cart(worker)
+            add_to_cart(worker, self.coupon_variant_ids)
+
+        scenarios = [
+            Scenario("product list", lambda w: w.get(reverse("products:product-list"))),
+            Scenario(
+                "product search",
+                lambda w: w.get(
+                    reverse("products:product-search-filter"),
+                    {"search": w.rng.choice(self.search_terms)},
+                ),
+            ),
+            Scenario(
+                "product detail",
+                lambda w: w.get(
+                    reverse(
+                        "products:product-detail",
+                        kwargs={"pk": w.rng.choice(self.product_ids)},
+                    )
+                ),
+            ),
+            Scenario("cart add", add_to_cart, setup=clear_cart),
+            Scenario("cart get", lambda w: w.get(cart)),
+            Scenario(
+                "checkout",
+                lambda w: w.post(
+                    reverse("payments:checkout"), {"shipping_address": w.address_id}
+                ),
+                prepare=fill_cart,
+            ),
+            Scenario("order list", lambda w: w.get(reverse("orders:user-order-list"))),
+            Scenario(
+                "notification poll",
+                lambda w: w.get(reverse("notifications:notification-unread-count")),
+            ),
+        ]
+        if self.coupon_variant_ids:
+            scenarios.insert(
+                5,
+                Scenario(
+                    "apply coupon",
+                    lambda w: w.post(
+                        reverse("cart:apply-coupon"), {"coupon_code": self.coupon_code}
+                    ),
+                    setup=fill_cart_for_coupon,
+                    prepare=remove_coupon,
+                ),
+            )
+        else:
+            self.stderr.write("No valid coupon, skipping apply coupon")
+        return scenarios
+
+    def run(self, scenario, workers):
+        per_worker = math.ceil(self.options["requests"] / len(workers))
+        for worker in workers:
+            if scenario.setup:
+                scenario.setup(worker)
+            for _ in range(self.options["warmup"]):
+                if scenario.prepare:
+                    scenario.prepare(worker)
+                scenario.send(worker)
+
+        with ThreadPoolExecutor(len(workers)) as pool:
+            samples = list(
+                pool.map(
+                    lambda worker: self.measure(scenario, worker, per_worker), workers
+                )
+            )
+
+        latencies = [latency for sample in samples for latency, _, _ in sample]
+        queries = [count for sample in samples for _, _, count in sample if count]
+        errors = sum(1 for sample in samples for _, ok, _ in sample if not ok)
+        # Each worker's rate while it was sending, prepare steps left out
+        throughput = sum(
+            len(sample) / sum(latency for latency, _, _ in sample) for sample in samples
+        )
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput": throughput,
+            "p50": cuts[49] * 1000,
+            "p95": cuts[94] * 1000,
+            "p99": cuts[98] * 1000,
+            "queries": statistics.mean(queries) if queries else None,
+        }
+
+    def measure(self, scenario, worker, count):
+        """(seconds, succeeded, queries) of ``count`` requests by ``worker``."""
+        sample = []
+        failure = None
+        for _ in range(count):
+            if scenario.prepare:
+                scenario.prepare(worker)
+            started = time.perf_counter()
+            response = scenario.send(worker)
+            elapsed = time.perf_counter() - started
+            queries = response.headers.get("X-Query-Count")
+            ok = response.status_code < 400
+            sample.append((elapsed, ok, int(queries) if queries else None))
+            if not ok and failure is None:
+                failure = response
+        if failure is not None:
+            self.stderr.write(
+                f"{scenario.name}: {failure.status_code} {failure.text[:200]}"
+            )
+        return sample
+
+    def report(self, name, result):
+        queries = "-" if result["queries"] is None else f"{result['queries']:.1f}"
+        self.stdout.write(
+            f"{name:<20}{result['requests']:>9}{result['errors']:>8}"
+            f"{result['throughput']:>9.1f}{result['p50']:>9.2f}{result['p95']:>9.2f}"
+            f"{result['p99']:>9.2f}{queries:>9}"
+        )
+
+    def compare(self, name, result, baseline):
+        """Print the change against the baseline, return ``[name]`` if worse."""
+        before = baseline[name]
+        tolerance = self.options["tolerance"]
+        worse = []
+        if result["p95"] > before["p95"] * (1 + tolerance):
+            worse.append(f"p95 {before['p95']:.2f} -> {result['p95']:.2f} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            worse.append(
+                f"req/s {before['throughput']:.1f} -> {result['throughput']:.1f}"
+            )
+        if (
+            result["queries"] is not None
+            and before["queries"] is not None
+            and result["queries"] > before["queries"] + QUERY_SLACK
+        ):
+            worse.append(f"queries {before['queries']:.1f} -> {result['queries']:.1f}")
+
+        if worse:
+            self.stdout.write(self.style.ERROR(f"  regressed: {', '.join(worse)}"))
+            return [name]
+        change = (result["p95"] - before["p95"]) / before["p95"] * 100
+        self.stdout.write(f"  p95 {change:+.0f}% against the baseline")
+        return []
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)["results"]
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f"Could not read the baseline {path}: {error}")
+
+    def save_baseline(self, path, results):
+        options = {
+            name: self.options[name]
+            for name in ("url", "concurrency", "requests", "warmup", "seed")
+        }
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "created_at": timezone.now().isoformat(),
+                    "options": options,
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+        self.stdout.write(f"Baseline saved to {path}")
@@ -0,0 +1,95 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from parsers import FastJSONParser
+from products.fast_serializers import (
+    ProductCardValuesSerializer,
+    ProductValuesSerializer,
+)
+from products.models import Product, ProductCard
+from renderers import FastJSONRenderer
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .benchmark_serializers import Rollback, create_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare JSONRenderer and JSONParser with their orjson counterparts "
+        "on product list payloads: milliseconds to render and to parse, and "
+        "whether the bytes match. Runs on generated products inside a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                category = create_catalog(options["products"])
+                self.stdout.write(
+                    f"{'payload':<28}{'bytes':>9}{'renderer':>18}{'ms':>8}"
+                    f"{'parse ms':>10}{'same':>6}"
+                )
+                for name, data in self.payloads(category, options["products"]):
+                    self.report(name, data, options["repeat"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def payloads(self, category, count):
+        cards = ProductCardValuesSerializer.setup_queryset(
+            ProductCard.objects.filter(category=category)
+        )
+        products = ProductValuesSerializer.setup_queryset(
+            Product.objects.filter(category=category).order_by("pk")
+        )
+        return [
+            (
+                "product list page",
+                ProductCardValuesSerializer(cards[:10], many=True).data,
+            ),
+            (
+                f"cursor page of {min(count, 100)}",
+                {
+                    "next": "http://localhost/api/products/?cursor=eyJ2IjoiMjAyNC0w",
+                    "previous": None,
+                    "results": ProductCardValuesSerializer(cards[:100], many=True).data,
+                },
+            ),
+            (
+                f"{count} product details",
+                ProductValuesSerializer(products, many=True).data,
+            ),
+        ]
+
+    def report(self, name, data, repeat):
+        baseline = JSONRenderer().render(data)
+        for renderer, parser in [
+            (JSONRenderer(), JSONParser()),
+            (FastJSONRenderer(), FastJSONParser()),
+        ]:
+            body = renderer.render(data)
+            render_ms = self.measure(lambda: renderer.render(data), repeat)
+            parse_ms = self.measure(
+                lambda: parser.parse(io.BytesIO(body), "application/json"), repeat
+            )
+            self.stdout.write(
+                f"{name:<28}{len(body):>9}{type(renderer).__name__:>18}"
+                f"{render_ms:>8.3f}{parse_ms:>10.3f}"
+                f"{'yes' if body == baseline else 'NO':>6}"
+            )
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
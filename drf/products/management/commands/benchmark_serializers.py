@@ -0,0 +1,241 @@
+import statistics
+import time
+import uuid
+
+from account.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from products.fast_serializers import (
+    CategoryListValuesSerializer,
+    ProductCardValuesSerializer,
+    ProductValuesSerializer,
+    TagListValuesSerializer,
+)
+from products.models import (
+    Category,
+    Product,
+    ProductCard,
+    ProductImage,
+    ProductVariant,
+    Review,
+    Tag,
+)
+from products.serializers import (
+    CategoryListSerializer,
+    CategorySerializer,
+    ProductCardSerializer,
+    ProductListSerializer,
+    ProductSerializer,
+    TagListSerializer,
+    TagSerializer,
+)
+from rest_framework.renderers import JSONRenderer
+
+# Roughly what an editor-written product description weighs
+DESCRIPTION = (
+    "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing. " * 40 + "</p>"
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_catalog(count):
+    """
+    A category of ``count`` products with variants, images, reviews and
+    tags, 50 subcategories and 50 tags. Returns the category.
+    """
+    run = uuid.uuid4().hex[:8]
+    schema = {"type": "object", "properties": {"color": {"type": "string"}}}
+    category = Category.objects.create(
+        title=f"Benchmark {run}",
+        slug=f"benchmark-{run}",
+        product_attributes_schema=schema,
+        variant_attributes_schema=schema,
+    )
+    Category.objects.bulk_create(
+        Category(
+            title=f"Benchmark {run} {index}",
+            slug=f"benchmark-{run}-{index}",
+            parent=category,
+            product_attributes_schema=schema,
+            variant_attributes_schema=schema,
+        )
+        for index in range(50)
+    )
+    tags = Tag.objects.bulk_create(
+        Tag(name=f"Benchmark {run} {index}", slug=f"benchmark-{run}-{index}")
+        for index in range(50)
+    )
+    users = User.objects.bulk_create(
+        User(phone_number=f"0{run[:4]}{index:04d}") for index in range(5)
+    )
+    products = Product.objects.bulk_create(
+        Product(
+            category=category,
+            title=f"Benchmark product {index}",
+            slug=f"benchmark-{run}-{index}",
+            description=DESCRIPTION,
+            attributes={"color": "black"},
+        )
+        for index in range(count)
+    )
+    ProductVariant.objects.bulk_create(
+        ProductVariant(
+            product=product,
+            title=f"Variant {index}",
+            slug=f"benchmark-{run}-{product.pk}-{index}",
+            price=1000 * (index + 1),
+            attributes={"color": "black"},
+        )
+        for product in products
+        for index in range(3)
+    )
+    ProductImage.objects.bulk_create(
+        ProductImage(
+            product=product,
+            image=f"product_images/benchmark-{index}.png",
+            alt_text=product.title,
+        )
+        for product in products
+        for index in range(2)
+    )
+    Review.objects.bulk_create(
+        Review(product=product, user=user, rating=4, comment="Fine")
+        for product in products
+        for user in users
+    )
+    Product.tags.through.objects.bulk_create(
+        Product.tags.through(product_id=product.pk, tag_id=tag.pk)
+        for product in products
+        for tag in tags
+    )
+    for product in products:
+        Product.refresh_price_range(product.pk)
+        ProductCard.objects.refresh(product.pk)
+    return category
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full serializers, the list serializers and their values "
+        "twins: JSON bytes, queries, milliseconds per page and microseconds "
+        "per row. Runs on generated products inside a transaction that is "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 50])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.category = create_catalog(options["products"])
+                self.stdout.write(
+                    f"{'case':<42}{'page':>6}{'bytes':>10}{'queries':>9}{'ms':>9}"
+                    f"{'us/row':>9}"
+                )
+                for page_size in options["page_sizes"]:
+                    for name, page, serialize in self.cases(page_size):
+                        self.report(name, page_size, page, serialize, options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def cases(self, page_size):
+        """(name, page loader, serializer class) per measured endpoint."""
+        products = Product.objects.filter(category=self.category).order_by("pk")
+        cards = ProductCard.objects.filter(category=self.category).order_by("pk")
+        categories = Category.objects.order_by("pk")
+        tags = Tag.objects.order_by("pk")
+        return [
+            (
+                "products: ProductSerializer",
+                lambda: list(products[:page_size]),
+                ProductSerializer,
+            ),
+            (
+                "products: ProductSerializer, prefetched",
+                lambda: list(
+                    products.prefetch_related("variants", "images", "reviews")[
+                        :page_size
+                    ]
+                ),
+                ProductSerializer,
+            ),
+            (
+                "products: ProductValuesSerializer",
+                lambda: list(
+                    ProductValuesSerializer.setup_queryset(products)[:page_size]
+                ),
+                ProductValuesSerializer,
+            ),
+            (
+                "products: ProductCardSerializer",
+                lambda: list(cards[:page_size]),
+                ProductCardSerializer,
+            ),
+            (
+                "products: ProductCardValuesSerializer",
+                lambda: list(
+                    ProductCardValuesSerializer.setup_queryset(cards)[:page_size]
+                ),
+                ProductCardValuesSerializer,
+            ),
+            (
+                "search: ProductListSerializer",
+                lambda: list(
+                    ProductListSerializer.setup_queryset(products)[:page_size]
+                ),
+                ProductListSerializer,
+            ),
+            (
+                "categories: CategorySerializer",
+                lambda: list(categories[:page_size]),
+                CategorySerializer,
+            ),
+            (
+                "categories: CategoryListSerializer",
+                lambda: list(categories[:page_size]),
+                CategoryListSerializer,
+            ),
+            (
+                "categories: CategoryListValuesSerializer",
+                lambda: list(
+                    CategoryListValuesSerializer.setup_queryset(categories)[:page_size]
+                ),
+                CategoryListValuesSerializer,
+            ),
+            (
+                "tags: TagSerializer",
+                lambda: list(tags[:page_size]),
+                TagSerializer,
+            ),
+            (
+                "tags: TagListSerializer",
+                lambda: list(tags[:page_size]),
+                TagListSerializer,
+            ),
+            (
+                "tags: TagListValuesSerializer",
+                lambda: list(TagListValuesSerializer.setup_queryset(tags)[:page_size]),
+                TagListValuesSerializer,
+            ),
+        ]
+
+    def report(self, name, page_size, load, serializer_class, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                body = JSONRenderer().render(serializer_class(load(), many=True).data)
+                timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"{name:<42}{page_size:>6}{len(body):>10}{len(queries):>9}"
+            f"{median * 1000:>9.2f}{median * 1e6 / page_size:>9.1f}"
+        )
@@ -0,0 +1,247 @@
+import re
+
+from account.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from orders.models import Order
+from products.models import Category, Product, Tag
+from query_budget import QueryRecorder, sql_shape
+from rest_framework.test import APIClient
+
+from .benchmark_serializers import Rollback
+
+# A plan step reading a whole table, as PostgreSQL and SQLite word it.
+# SQLite's "SCAN t USING INDEX" walks an index in order and is fine.
+SEQUENTIAL_SCAN = re.compile(r"Seq Scan on (\w+)|^SCAN (\w+)(?!.*\bUSING\b)")
+
+
+class PlanRecorder(QueryRecorder):
+    """Also keeps the SQL and parameters of the first query of each shape."""
+
+    def __init__(self):
+        super().__init__()
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.startswith("SELECT"):
+            self.queries.setdefault(sql_shape(sql), (sql, params))
+        return super().__call__(execute, sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the queries of the read endpoints and flag the "
+        "sequential scans of tables with at least --min-rows rows. Needs a "
+        "seeded database; requests run inside a transaction that is rolled "
+        "back, with caching disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-rows", type=int, default=1000)
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print the plan of every query, not only the flagged ones",
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error when a sequential scan is flagged",
+        )
+
+    def handle(self, *args, **options):
+        self.row_counts = {}
+        self.tables = set(connection.introspection.table_names())
+        flagged = []
+        try:
+            with transaction.atomic(), override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.dummy.DummyCache"
+                    }
+                },
+                ALLOWED_HOSTS=["testserver"],
+                JOBS_EAGER=False,
+            ):
+                for label, user, url, data in self.routes():
+                    flagged += self.explain_route(label, user, url, data, options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{len(flagged)} sequential scan(s) flagged")
+        if flagged and options["fail"]:
+            raise CommandError(", ".join(sorted(set(flagged))))
+
+    def routes(self):
+        """(label, user, URL, query parameters) of every explained request."""
+        order = Order.objects.select_related("user").order_by("-pk").first()
+        product = Product.objects.order_by("-pk").first()
+        category = Category.objects.order_by("-pk").first()
+        tag = Tag.objects.order_by("-pk").first()
+        if None in (order, product, category, tag):
+            raise CommandError(
+                "Nothing to explain, seed the database first, see seed_load"
+            )
+        variant = product.variants.filter(inventory__isnull=False).first()
+        customer = order.user
+        # Only ever held in memory, the transaction is rolled back anyway
+        admin = User.objects.filter(is_staff=True).first() or customer
+        admin.is_staff = True
+
+        routes = [
+            ("product list", None, reverse("products:product-list"), {}),
+            (
+                "product list by category",
+                None,
+                reverse("products:product-list"),
+                {"category": category.pk},
+            ),
+            (
+                "product list search",
+                None,
+                reverse("products:product-list"),
+                {"search": product.title[:4]},
+            ),
+            (
+                "product list, cursor",
+                None,
+                reverse("products:product-list"),
+                {"pagination": "cursor"},
+            ),
+            (
+                "product detail",
+                None,
+                reverse("products:product-detail", kwargs={"pk": product.pk}),
+                {},
+            ),
+            (
+                "product search with facets",
+                None,
+                reverse("products:product-search-filter"),
+                {"category": category.slug, "facets": "true"},
+            ),
+            ("category list", None, reverse("products:category-list"), {}),
+            (
+                "category detail",
+                None,
+                reverse("products:category-detail", kwargs={"pk": category.pk}),
+                {},
+            ),
+            ("tag list", None, reverse("products:tag-list"), {}),
+            (
+                "tag detail",
+                None,
+                reverse("products:tag-detail", kwargs={"slug": tag.slug}),
+                {},
+            ),
+            (
+                "reviews",
+                None,
+                reverse("products:review-list", kwargs={"product_id": product.pk}),
+                {},
+            ),
+            ("cart", customer, reverse("cart:cart-review"), {}),
+            ("user orders", customer, reverse("orders:user-order-list"), {}),
+            ("all orders", admin, reverse("orders:all-order-list"), {}),
+            (
+                "all orders by status",
+                admin,
+                reverse("orders:all-order-list"),
+                {"status": order.status},
+            ),
+            (
+                "order detail",
+                admin,
+                reverse("orders:order-detail", kwargs={"pk": order.pk}),
+                {},
+            ),
+            (
+                "payment verification",
+                None,
+                reverse("payments:verify_payment"),
+                {"Authority": order.transaction_id or "", "Status": "NOK"},
+            ),
+            ("addresses", customer, reverse("account:user-addresses"), {}),
+            (
+                "notifications",
+                customer,
+                reverse("notifications:notification-list"),
+                {},
+            ),
+            (
+                "unread notifications",
+                customer,
+                reverse("notifications:notification-unread-count"),
+                {},
+            ),
+        ]
+        if variant is not None:
+            routes.append(
+                (
+                    "inventory",
+                    None,
+                    reverse(
+                        "products:inventory-detail",
+                        kwargs={"product_variant_id": variant.pk},
+                    ),
+                    {},
+                )
+            )
+        return routes
+
+    def explain_route(self, label, user, url, data, options):
+        # A failing view is reported by its status, the others still run
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        with PlanRecorder() as recorder:
+            response = client.get(url, data)
+
+        self.stdout.write(f"{label} ({response.status_code}, {recorder.count} queries)")
+        flagged = []
+        for sql, params in recorder.queries.values():
+            plan = self.explain(sql, params)
+            scans = [
+                table
+                for table in self.sequential_scans(plan)
+                if self.row_count(table) >= options["min_rows"]
+            ]
+            if scans or options["verbose_plans"]:
+                self.stdout.write(f"  {sql}")
+                for line in plan:
+                    self.stdout.write(f"    {line}")
+            for table in scans:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"  sequential scan of {table} "
+                        f"({self.row_count(table)} rows)"
+                    )
+                )
+            flagged += scans
+        return flagged
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            # The plan text is the last column on both databases
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def sequential_scans(self, plan):
+        for line in plan:
+            match = SEQUENTIAL_SCAN.search(line.strip())
+            if match:
+                table = match.group(1) or match.group(2)
+                # Subqueries show up under their alias, like U0
+                if table in self.tables:
+                    yield table
+
+    def row_count(self, table):
+        if table not in self.row_counts:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}"
+                )
+                self.row_counts[table] = cursor.fetchone()[0]
+        return self.row_counts[table]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from products.models import Product, ProductCard
+from tqdm import tqdm
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized product cards used by the product list"
+
+    def handle(self, *args, **kwargs):
+        product_ids = list(Product.objects.values_list("pk", flat=True))
+        for product_id in tqdm(
+            product_ids,
+            total=len(product_ids),
+            desc="Refreshing product cards",
+            unit="product",
+            ncols=100,
+        ):
+            ProductCard.objects.refresh(product_id)
+        self.stdout.write(self.style.SUCCESS("Product cards refreshed successfully."))
@@ -0,0 +1,689 @@
+import random
+import time as clock
+import uuid
+from array import array
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from account.models import Address, User
+from cart.models import Cart, CartItem
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.fields import AutoFieldMixin
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from notifications.models import Notification
+from orders.models import Order, OrderItem
+from payments.models import Coupon, Payment
+from products.caching import invalidate_product_lists
+from products.models import (
+    Category,
+    Inventory,
+    Product,
+    ProductCard,
+    ProductImage,
+    ProductVariant,
+    Review,
+    Tag,
+)
+from products.search import update_search_vectors
+from tqdm import tqdm
+
+ADJECTIVES = [
+    "Classic",
+    "Compact",
+    "Deluxe",
+    "Eco",
+    "Essential",
+    "Lightweight",
+    "Modern",
+    "Portable",
+    "Premium",
+    "Rugged",
+    "Slim",
+    "Smart",
+    "Vintage",
+    "Wireless",
+]
+NOUNS = [
+    "Backpack",
+    "Blender",
+    "Camera",
+    "Chair",
+    "Desk Lamp",
+    "Headphones",
+    "Jacket",
+    "Kettle",
+    "Keyboard",
+    "Monitor",
+    "Phone",
+    "Sneakers",
+    "Speaker",
+    "Tablet",
+    "Watch",
+]
+DEPARTMENTS = [
+    "Appliances",
+    "Audio",
+    "Beauty",
+    "Books",
+    "Clothing",
+    "Computers",
+    "Garden",
+    "Home",
+    "Kitchen",
+    "Office",
+    "Outdoors",
+    "Phones",
+    "Sports",
+    "Toys",
+]
+WORDS = (
+    "quality design daily comfort durable battery fabric steel warranty light "
+    "travel fast easy clean soft strong fresh gift family office home sound "
+    "color size fit smooth natural premium classic modern simple perfect"
+).split()
+FIRST_NAMES = ["Ali", "Sara", "Reza", "Maryam", "Hossein", "Zahra", "Amir", "Neda"]
+LAST_NAMES = ["Ahmadi", "Hosseini", "Karimi", "Moradi", "Rahimi", "Rezaei", "Sadeghi"]
+CITIES = [
+    ("Tehran", "Tehran"),
+    ("Isfahan", "Isfahan"),
+    ("Mashhad", "Razavi Khorasan"),
+    ("Shiraz", "Fars"),
+    ("Tabriz", "East Azerbaijan"),
+]
+COLORS = ["black", "white", "red", "blue", "green", "grey", "silver", "gold"]
+SIZES = ["S", "M", "L", "XL"]
+SCHEMA = {"color": "string", "size": "string"}
+IMAGE = "product_images/default.png"
+
+# Most orders are old and delivered
+ORDER_STATUSES = {
+    Order.Status.DELIVERED: 60,
+    Order.Status.SHIPPED: 8,
+    Order.Status.PAID: 8,
+    Order.Status.PENDING: 8,
+    Order.Status.CANCELLED: 8,
+    Order.Status.FAILED: 8,
+}
+PAYMENT_STATUSES = {
+    Order.Status.DELIVERED: Payment.Status.SUCCESSFUL,
+    Order.Status.SHIPPED: Payment.Status.SUCCESSFUL,
+    Order.Status.PAID: Payment.Status.SUCCESSFUL,
+    Order.Status.CANCELLED: Payment.Status.SUCCESSFUL,
+    Order.Status.FAILED: Payment.Status.FAILED,
+}
+RATINGS = {1: 5, 2: 5, 3: 15, 4: 35, 5: 40}
+
+
+# In the order their rows are written, parents first
+SEEDED_MODELS = [
+    User,
+    Address,
+    Category,
+    Tag,
+    Coupon,
+    Coupon.applicable_categories.through,
+    Product,
+    ProductVariant,
+    Inventory,
+    ProductImage,
+    Review,
+    Product.tags.through,
+    ProductCard,
+    Order,
+    OrderItem,
+    Payment,
+    Cart,
+    CartItem,
+    Notification,
+]
+
+
+def phone_number(seed, index):
+    """09, the two digits of the seed and seven of the index of the user."""
+    return f"{phone_prefix(seed)}{index:07d}"
+
+
+def phone_prefix(seed):
+    """Shared by the phone numbers of every user of ``seed``, and only them."""
+    return f"09{seed:02d}"
+
+
+def check_seed(seed):
+    # See phone_number
+    if not 0 <= seed <= 99:
+        raise CommandError("--seed must be between 0 and 99")
+
+
+class RowWriter:
+    """
+    Collects rows of ``model`` and INSERTs them many per statement, handing
+    out the primary keys itself. bulk_create spends far longer building and
+    compiling model instances than the database takes to store the rows,
+    which at millions of rows is the difference between minutes and hours.
+    Fields left out get their default, so timestamps must be given.
+    """
+
+    def __init__(self, model):
+        meta = model._meta
+        self.model = model
+        self.fields = meta.concrete_fields
+        self.pk_name = meta.pk.attname
+        self.auto_pk = isinstance(meta.pk, AutoFieldMixin)
+        self.defaults = {
+            field.attname: None if field.primary_key else field.get_default()
+            for field in self.fields
+        }
+        self.prepare = [self.preparer(field) for field in self.fields]
+        quote = connection.ops.quote_name
+        self.sql = "INSERT INTO {} ({}) VALUES ".format(
+            quote(meta.db_table),
+            ", ".join(quote(field.column) for field in self.fields),
+        )
+        self.placeholders = "({})".format(", ".join(["%s"] * len(self.fields)))
+        max_params = connection.features.max_query_params or 10_000
+        self.rows_per_statement = max(1, max_params // len(self.fields))
+        self.next_pk = (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        self.rows = []
+
+    def preparer(self, field):
+        """
+        What turns values of ``field`` into what the database driver takes,
+        or None to pass them as they are. Datetimes skip the checks of
+        get_db_prep_save, they add up over millions of rows.
+        """
+        field_type = field.get_internal_type()
+        if field_type == "DateTimeField":
+            return connection.ops.adapt_datetimefield_value
+        if field_type == "JSONField":
+            return partial(field.get_db_prep_save, connection=connection)
+        return None
+
+    def add(self, **values):
+        """Queue a row of ``values`` by attname, and return its primary key."""
+        if self.auto_pk:
+            values[self.pk_name] = self.next_pk
+            self.next_pk += 1
+        row = {**self.defaults, **values}
+        self.rows.append([row[field.attname] for field in self.fields])
+        return values[self.pk_name]
+
+    def flush(self):
+        rows, self.rows = self.rows, []
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.rows_per_statement):
+                chunk = rows[start : start + self.rows_per_statement]
+                params = [
+                    prepare(value) if prepare else value
+                    for row in chunk
+                    for prepare, value in zip(self.prepare, row)
+                ]
+                cursor.execute(
+                    self.sql + ", ".join([self.placeholders] * len(chunk)), params
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic shop for load testing: users, a "
+        "category tree, products with variants, stock, images, reviews and "
+        "tags, orders with payments, carts and notifications. The data only "
+        "depends on --seed and --until. Rows are written in batches, each in "
+        "a transaction, with primary keys chosen up front: nothing else may "
+        "write to the database meanwhile. The first user is staff; every "
+        "user's password is --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=1, help="0 to 99, one per seeded user set"
+        )
+        parser.add_argument(
+            "--until",
+            type=parse_date,
+            default=None,
+            help="Last day of the generated history, YYYY-MM-DD, today by default",
+        )
+        parser.add_argument("--days", type=int, default=730)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--category-depth", type=int, default=3)
+        parser.add_argument("--category-breadth", type=int, default=6)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--coupons", type=int, default=100)
+        parser.add_argument("--products", type=int, default=10_000)
+        parser.add_argument(
+            "--variants", type=int, default=5, help="Per product, on average"
+        )
+        parser.add_argument(
+            "--reviews", type=int, default=3, help="Per product, on average"
+        )
+        parser.add_argument("--orders", type=int, default=50_000)
+        parser.add_argument(
+            "--items", type=int, default=3, help="Per order, on average"
+        )
+        parser.add_argument("--carts", type=int, default=1_000)
+        parser.add_argument("--notifications", type=int, default=50_000)
+        parser.add_argument("--password", default="seed-password")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.check_options()
+        seed = options["seed"]
+        self.rng = random.Random(seed)
+        self.prefix = f"seed-{seed}"
+        if (
+            Category.objects.filter(slug=f"{self.prefix}-c0").exists()
+            or User.objects.filter(phone_number__startswith=phone_prefix(seed)).exists()
+        ):
+            raise CommandError(f"Seed {seed} is already loaded, pick another --seed")
+
+        until = options["until"] or timezone.localdate()
+        self.end = timezone.make_aware(datetime.combine(until, time.min)) + timedelta(
+            days=1
+        )
+        self.start = self.end - timedelta(days=options["days"])
+        # Stamps the card rows, which only record when they were built
+        self.now = timezone.now()
+        self.writers = {model: RowWriter(model) for model in SEEDED_MODELS}
+
+        started = clock.perf_counter()
+        self.create_users()
+        self.create_catalog_structure()
+        self.create_products()
+        self.create_orders()
+        self.create_carts()
+        self.create_notifications()
+        self.reset_sequences()
+        invalidate_product_lists()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seed {seed} loaded in {clock.perf_counter() - started:.0f}s: "
+                f"{len(self.user_ids)} users, {len(self.category_ids)} categories, "
+                f"{options['products']} products, {len(self.variant_ids)} "
+                f"variants, {options['orders']} orders"
+            )
+        )
+
+    def check_options(self):
+        options = self.options
+        check_seed(options["seed"])
+        # See phone_number
+        if not 1 <= options["users"] <= 10_000_000:
+            raise CommandError("--users must be between 1 and 10000000")
+        if options["category_depth"] < 1 or options["category_breadth"] < 1:
+            raise CommandError("The category tree needs a depth and breadth of 1+")
+        if options["products"] < 1 or options["variants"] < 1:
+            raise CommandError("Orders and carts need at least one variant")
+        if options["carts"] > options["users"]:
+            raise CommandError("A user has at most one cart")
+        if options["days"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--days and --batch-size must be positive")
+
+    def insert(self, model, **values):
+        return self.writers[model].add(**values)
+
+    def batches(self, total, label):
+        """
+        (first index, count) of each batch of ``total`` rows. The rows added
+        meanwhile are written in a transaction once the batch is done.
+        """
+        size = self.options["batch_size"]
+        with tqdm(
+            total=total, desc=label, unit="row", ncols=100, file=self.stderr
+        ) as progress:
+            for first in range(0, total, size):
+                count = min(size, total - first)
+                yield first, count
+                with transaction.atomic():
+                    for writer in self.writers.values():
+                        writer.flush()
+                progress.update(count)
+
+    def reset_sequences(self):
+        """Move the id sequences past the rows given their ids here."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), SEEDED_MODELS):
+                cursor.execute(sql)
+
+    def around(self, average, minimum=1):
+        """A count spread evenly around ``average``, at least ``minimum``."""
+        return self.rng.randint(minimum, max(minimum, 2 * average - minimum))
+
+    def moment(self, index, total):
+        """
+        A time in the history, later for higher indexes, so primary keys
+        grow with creation times as they do in production.
+        """
+        position = (index + self.rng.random()) / total
+        return self.start + (self.end - self.start) * position
+
+    def any_moment(self, after=None):
+        after = after or self.start
+        return after + (self.end - after) * self.rng.random()
+
+    def text(self, words):
+        return " ".join(self.rng.choices(WORDS, k=words)).capitalize() + "."
+
+    def popular_variant(self):
+        """Index of a variant, the first ones being ordered most often."""
+        return int(len(self.variant_ids) * self.rng.random() ** 2)
+
+    def create_users(self):
+        """Users with a default address each."""
+        total = self.options["users"]
+        seed = self.options["seed"]
+        # Hashed once, with a fixed salt, rather than once per user
+        password = make_password(self.options["password"], salt=self.prefix)
+        self.user_ids = array("q")
+        self.address_ids = array("q")
+        for first, count in self.batches(total, "users"):
+            for index in range(first, first + count):
+                joined = self.moment(index, total)
+                user_id = self.insert(
+                    User,
+                    phone_number=phone_number(seed, index),
+                    password=password,
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    email=f"user{index}@{self.prefix}.example.com",
+                    is_staff=index == 0,
+                    is_admin=index == 0,
+                    is_superuser=index == 0,
+                    date_joined=joined,
+                    date_updated=joined,
+                    last_notification_check=joined,
+                )
+                city, state = self.rng.choice(CITIES)
+                address_id = self.insert(
+                    Address,
+                    user_id=user_id,
+                    is_default=True,
+                    country="Iran",
+                    state=state,
+                    city=city,
+                    street=f"{self.rng.choice(LAST_NAMES)} St. "
+                    f"{self.rng.randint(1, 300)}",
+                    postal_code=f"{self.rng.randrange(10**10):010d}",
+                    created_at=joined,
+                    updated_at=joined,
+                )
+                self.user_ids.append(user_id)
+                self.address_ids.append(address_id)
+
+    def create_catalog_structure(self):
+        """
+        A category tree of --category-breadth children per level, products
+        going on the leaves only, tags, and coupons for a few leaves each.
+        """
+        self.category_ids = []
+        self.tag_ids = []
+        options = self.options
+        for _ in self.batches(1, "categories, tags and coupons"):
+            parents = [None]
+            number = 0
+            for _ in range(options["category_depth"]):
+                level = []
+                for parent in parents:
+                    for _ in range(options["category_breadth"]):
+                        level.append(
+                            self.insert(
+                                Category,
+                                parent_id=parent,
+                                title=f"{self.rng.choice(DEPARTMENTS)} {number}",
+                                slug=f"{self.prefix}-c{number}",
+                                created_at=self.start,
+                                updated_at=self.start,
+                                product_attributes_schema=SCHEMA,
+                                variant_attributes_schema=SCHEMA,
+                            )
+                        )
+                        number += 1
+                self.category_ids.extend(level)
+                parents = level
+            self.leaf_ids = parents
+
+            for index in range(options["tags"]):
+                self.tag_ids.append(
+                    self.insert(
+                        Tag,
+                        name=f"{self.rng.choice(WORDS)} {self.prefix} {index}",
+                        slug=f"{self.prefix}-t{index}",
+                    )
+                )
+
+            for index in range(options["coupons"]):
+                usage_limit = self.rng.randint(100, 1000)
+                coupon_id = self.insert(
+                    Coupon,
+                    code=f"{self.prefix.upper()}-{index}",
+                    discount_percent=self.rng.choice([5, 10, 15, 20, 30, 50]),
+                    valid_from=self.any_moment(),
+                    valid_to=self.end + timedelta(days=self.rng.randint(-60, 60)),
+                    active=self.rng.random() < 0.8,
+                    usage_limit=usage_limit,
+                    usage_count=self.rng.randint(0, usage_limit),
+                )
+                categories = min(len(self.leaf_ids), self.rng.randint(1, 3))
+                for category_id in self.rng.sample(self.leaf_ids, categories):
+                    self.insert(
+                        Coupon.applicable_categories.through,
+                        coupon_id=coupon_id,
+                        category_id=category_id,
+                    )
+
+    def create_products(self):
+        """
+        Products with everything hanging off them, including the stored
+        price ranges, cards and search vectors the signals would maintain.
+        """
+        total = self.options["products"]
+        self.variant_ids = array("q")
+        self.variant_prices = array("q")
+        for first, count in self.batches(total, "products"):
+            for index in range(first, first + count):
+                self.create_product(index, total)
+            update_search_vectors(
+                Product.objects.filter(
+                    pk__gte=self.writers[Product].next_pk - count,
+                    pk__lt=self.writers[Product].next_pk,
+                )
+            )
+
+    def create_product(self, index, total):
+        created = self.moment(index, total)
+        title = f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)} {index}"
+        base_price = self.rng.randrange(10_000, 5_000_000, 1_000)
+        variants = [
+            {
+                "color": self.rng.choice(COLORS),
+                "size": self.rng.choice(SIZES),
+                "price": base_price + self.rng.randrange(0, base_price // 2, 1_000),
+                # Some variants sold out
+                "quantity": self.rng.choice([0, *range(5, 500, 5)]),
+            }
+            for _ in range(self.around(self.options["variants"]))
+        ]
+        prices = [variant["price"] for variant in variants]
+        available = self.rng.random() < 0.95
+        slug = f"{self.prefix}-p{index}"
+        category_id = self.rng.choice(self.leaf_ids)
+        product_id = self.insert(
+            Product,
+            category_id=category_id,
+            title=title,
+            slug=slug,
+            description="".join(
+                f"<p>{self.text(self.rng.randint(20, 60))}</p>"
+                for _ in range(self.rng.randint(1, 4))
+            ),
+            available=available,
+            attributes={"color": variants[0]["color"], "size": variants[0]["size"]},
+            created_at=created,
+            updated_at=created,
+            min_price=min(prices),
+            max_price=max(prices),
+        )
+
+        for variant in variants:
+            variant_id = self.insert(
+                ProductVariant,
+                product_id=product_id,
+                title=f"{title} {variant['color']} {variant['size']}",
+                slug=f"{self.prefix}-v{len(self.variant_ids)}",
+                price=variant["price"],
+                attributes={"color": variant["color"], "size": variant["size"]},
+            )
+            self.insert(
+                Inventory, product_variant_id=variant_id, quantity=variant["quantity"]
+            )
+            self.variant_ids.append(variant_id)
+            self.variant_prices.append(variant["price"])
+
+        for _ in range(self.rng.randint(1, 3)):
+            self.insert(
+                ProductImage, product_id=product_id, image=IMAGE, alt_text=title
+            )
+
+        # One review per user and product
+        reviewers = self.rng.sample(
+            self.user_ids,
+            min(len(self.user_ids), self.around(self.options["reviews"], minimum=0)),
+        )
+        ratings = []
+        for user_id in reviewers:
+            reviewed = self.any_moment(after=created)
+            rating = self.rng.choices(list(RATINGS), list(RATINGS.values()))[0]
+            self.insert(
+                Review,
+                product_id=product_id,
+                user_id=user_id,
+                rating=rating,
+                comment=self.text(self.rng.randint(5, 40)),
+                approval=self.rng.random() < 0.7,
+                created_at=reviewed,
+                updated_at=reviewed,
+            )
+            ratings.append(rating)
+
+        tag_count = min(len(self.tag_ids), self.rng.randint(0, 4))
+        for tag_id in self.rng.sample(self.tag_ids, tag_count):
+            self.insert(Product.tags.through, product_id=product_id, tag_id=tag_id)
+
+        self.insert(
+            ProductCard,
+            product_id=product_id,
+            category_id=category_id,
+            title=title,
+            slug=slug,
+            available=available,
+            image=IMAGE,
+            lowest_price=min(prices),
+            highest_price=max(prices),
+            average_rating=sum(ratings) / len(ratings) if ratings else None,
+            review_count=len(ratings),
+            in_stock=any(variant["quantity"] for variant in variants),
+            created_at=created,
+            refreshed_at=self.now,
+        )
+
+    def create_orders(self):
+        """Orders with their items and totals, and a payment unless pending."""
+        total = self.options["orders"]
+        statuses = list(ORDER_STATUSES)
+        weights = list(ORDER_STATUSES.values())
+        for first, count in self.batches(total, "orders"):
+            for index in range(first, first + count):
+                user = self.rng.randrange(len(self.user_ids))
+                created = self.moment(index, total)
+                quantities = {}
+                for _ in range(self.around(self.options["items"])):
+                    variant = self.popular_variant()
+                    quantities[variant] = quantities.get(variant, 0) + (
+                        self.rng.randint(1, 3)
+                    )
+                amount = sum(
+                    self.variant_prices[variant] * quantity
+                    for variant, quantity in quantities.items()
+                )
+                status = self.rng.choices(statuses, weights)[0]
+                transaction_id = str(
+                    uuid.UUID(int=self.rng.getrandbits(128), version=4)
+                )
+                order_id = self.insert(
+                    Order,
+                    user_id=self.user_ids[user],
+                    shipping_address_id=self.address_ids[user],
+                    status=status,
+                    transaction_id=transaction_id,
+                    created_at=created,
+                    updated_at=created,
+                    total_amount=amount,
+                    item_count=len(quantities),
+                )
+                for variant, quantity in quantities.items():
+                    self.insert(
+                        OrderItem,
+                        order_id=order_id,
+                        product_variant_id=self.variant_ids[variant],
+                        price=self.variant_prices[variant],
+                        quantity=quantity,
+                        added_at=created,
+                    )
+                if status in PAYMENT_STATUSES:
+                    self.insert(
+                        Payment,
+                        order_id=order_id,
+                        amount=amount,
+                        payment_method=Payment.Method.ONLINE_GATEWAY,
+                        status=PAYMENT_STATUSES[status],
+                        timestamp=created + timedelta(minutes=5),
+                        transaction_id=transaction_id,
+                    )
+
+    def create_carts(self):
+        """Open carts of recent weeks."""
+        users = self.rng.sample(range(len(self.user_ids)), self.options["carts"])
+        for first, count in self.batches(len(users), "carts"):
+            for user in users[first : first + count]:
+                created = self.any_moment(after=self.end - timedelta(days=30))
+                cart_id = self.insert(
+                    Cart,
+                    user_id=self.user_ids[user],
+                    created_at=created,
+                    updated_at=created,
+                )
+                for variant in {self.popular_variant() for _ in range(self.around(2))}:
+                    self.insert(
+                        CartItem,
+                        cart_id=cart_id,
+                        product_variant_id=self.variant_ids[variant],
+                        price=self.variant_prices[variant],
+                        quantity=self.rng.randint(1, 2),
+                        added_at=created,
+                    )
+
+    def create_notifications(self):
+        total = self.options["notifications"]
+        for first, count in self.batches(total, "notifications"):
+            for _ in range(count):
+                if self.rng.random() < 0.8:
+                    notification_type = Notification.Type.CHANGE_ORDER
+                    status = self.rng.choice(list(ORDER_STATUSES))
+                    message = f"Your order is now {status.label.lower()}"
+                else:
+                    notification_type = Notification.Type.CUSTOM
+                    message = self.text(self.rng.randint(5, 20))
+                self.insert(
+                    Notification,
+                    user_id=self.rng.choice(self.user_ids),
+                    notification_type=notification_type,
+                    message=message,
+                    is_read=self.rng.random() < 0.7,
+                    created_at=self.any_moment(),
+                )
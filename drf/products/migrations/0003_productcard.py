@@ -0,0 +1,87 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Min
+
+
+def build_product_cards(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductCard = apps.get_model("products", "ProductCard")
+    Inventory = apps.get_model("products", "Inventory")
+    Review = apps.get_model("products", "Review")
+    ProductImage = apps.get_model("products", "ProductImage")
+
+    for product in Product.objects.iterator():
+        reviews = Review.objects.filter(product=product).aggregate(
+            count=Count("pk"), average=Avg("rating")
+        )
+        image = (
+            ProductImage.objects.filter(product=product)
+            .order_by("pk")
+            .values_list("image", flat=True)
+            .first()
+        )
+        ProductCard.objects.create(
+            product=product,
+            category_id=product.category_id,
+            title=product.title,
+            slug=product.slug,
+            available=product.available,
+            created_at=product.created_at,
+            lowest_price=product.variants.aggregate(price=Min("price"))["price"],
+            in_stock=Inventory.objects.filter(
+                product_variant__product=product, quantity__gt=0
+            ).exists(),
+            review_count=reviews["count"],
+            average_rating=reviews["average"],
+            image=image or "",
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_remove_tag_products_product_tags_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("slug", models.SlugField(max_length=255)),
+                ("available", models.BooleanField(default=True)),
+                ("image", models.ImageField(blank=True, upload_to="product_images/")),
+                ("lowest_price", models.PositiveIntegerField(blank=True, null=True)),
+                ("average_rating", models.FloatField(blank=True, null=True)),
+                ("review_count", models.PositiveIntegerField(default=0)),
+                ("in_stock", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField()),
+                ("refreshed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="products.category",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_at", "-product_id"),
+            },
+        ),
+        migrations.RunPython(build_product_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_productcard"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["-created_at", "-product"], name="card_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["category", "-created_at", "-product"],
+                name="card_category_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:27
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(
+        fields=["search_vector"], name="product_search_vector_idx"
+    ),
+    django.contrib.postgres.indexes.GinIndex(
+        fields=["title"],
+        name="product_title_trgm_idx",
+        opclasses=["gin_trgm_ops"],
+    ),
+]
+
+# Mirrors products.search.build_search_vector, in one statement. Tags are
+# replaced like products.search.HTML_TAG, by a space.
+BACKFILL_SQL = """
+UPDATE products_product SET search_vector =
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(
+        to_tsvector(
+            'simple', regexp_replace(coalesce(description, ''), '<[^>]*>', ' ', 'g')
+        ),
+        'B'
+    )
+"""
+
+
+def add_search_indexes(apps, schema_editor):
+    # GIN indexes and tsvector only exist on PostgreSQL. SQLite (test
+    # settings) keeps the plain column and uses the substring fallback.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Product, index)
+    schema_editor.execute(BACKFILL_SQL)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        # Kept out of the model state so SQLite table rebuilds never see them
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
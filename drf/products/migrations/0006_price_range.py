@@ -0,0 +1,66 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:32
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+def fill_price_ranges(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductCard = apps.get_model("products", "ProductCard")
+    ProductVariant = apps.get_model("products", "ProductVariant")
+
+    prices = (
+        ProductVariant.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+    )
+    Product.objects.update(
+        min_price=Subquery(prices.annotate(price=Min("price")).values("price")),
+        max_price=Subquery(prices.annotate(price=Max("price")).values("price")),
+    )
+    ProductCard.objects.update(
+        highest_price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("max_price")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="max_price",
+            field=models.PositiveIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.PositiveIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="productcard",
+            name="highest_price",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="productcard",
+            name="lowest_price",
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["category", "lowest_price"], name="card_category_price_idx"
+            ),
+        ),
+        migrations.RunPython(fill_price_ranges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_price_range"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventory",
+            name="reserved",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
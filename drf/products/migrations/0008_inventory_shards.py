@@ -0,0 +1,50 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_inventory_reserved"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventory",
+            name="shard_count",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="InventoryShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                ("reserved", models.PositiveIntegerField(default=0)),
+                (
+                    "inventory",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="products.inventory",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="inventoryshard",
+            constraint=models.UniqueConstraint(
+                fields=("inventory", "index"), name="unique_inventory_shard"
+            ),
+        ),
+    ]
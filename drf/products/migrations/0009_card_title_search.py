@@ -0,0 +1,37 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import migrations
+from django.db.models.functions import Upper
+
+# The product list searches cards with title__icontains, which PostgreSQL
+# runs as UPPER(title) LIKE UPPER(%s). Only a trigram index on that same
+# expression can serve the leading wildcard.
+CARD_TITLE_INDEX = GinIndex(
+    OpClass(Upper("title"), name="gin_trgm_ops"), name="card_title_trgm_idx"
+)
+
+
+def add_title_index(apps, schema_editor):
+    # Like the indexes of 0005_product_search, PostgreSQL only
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    ProductCard = apps.get_model("products", "ProductCard")
+    schema_editor.add_index(ProductCard, CARD_TITLE_INDEX)
+
+
+def remove_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    ProductCard = apps.get_model("products", "ProductCard")
+    schema_editor.remove_index(ProductCard, CARD_TITLE_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_inventory_shards"),
+    ]
+
+    operations = [
+        # Kept out of the model state so SQLite table rebuilds never see it
+        migrations.RunPython(add_title_index, remove_title_index),
+    ]
@@ -0,0 +1,24 @@
+import importlib
+
+from django.db import migrations
+
+# Products saved before the fix ran their tags together, "red</p><p>shoe"
+# into "redshoe". Recomputed like the backfill that added the column.
+product_search = importlib.import_module("products.migrations.0005_product_search")
+
+
+def refresh_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(product_search.BACKFILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_card_title_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(refresh_search_vectors, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,22 @@
 from account.models import User
 from ckeditor.fields import RichTextField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    Avg,
+    Count,
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.text import slugify
 
@@ -49,6 +64,18 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField("Tag", related_name="products")
+    # Maintained on save by products.search, only populated on PostgreSQL.
+    # Its GIN index and the title trigram index are created by migration
+    # 0005 on PostgreSQL only, so they are not declared in Meta.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Cheapest and dearest variant, kept up to date by products.signals so
+    # price filters and sorting can use an index instead of a GROUP BY
+    min_price = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, db_index=True
+    )
+    max_price = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, db_index=True
+    )
 
     # class Meta:
     # ordering = ('title', )
@@ -62,6 +89,18 @@ class Product(models.Model):
                 product=self, image="product_images/default.png"
             )
 
+    @classmethod
+    def refresh_price_range(cls, product_id):
+        prices = (
+            ProductVariant.objects.filter(product=product_id)
+            .order_by()
+            .values("product")
+        )
+        cls.objects.filter(pk=product_id).update(
+            min_price=Subquery(prices.annotate(price=Min("price")).values("price")),
+            max_price=Subquery(prices.annotate(price=Max("price")).values("price")),
+        )
+
     @property
     def default_image(self):
         return self.images.first() or ProductImage(image="product_images/default.png")
@@ -137,10 +176,237 @@ class Review(models.Model):
 
 
 class Inventory(models.Model):
+    MAX_SHARDS = 64
+
     product_variant = models.OneToOneField(
         ProductVariant, on_delete=models.CASCADE, related_name="inventory"
     )
     quantity = models.PositiveIntegerField(default=0)
+    # Held for pending orders, still on hand until their payment is verified.
+    # Only ever moved by the conditional UPDATEs in orders.reservations.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # Hot variants keep their stock in this many InventoryShard rows instead,
+    # so concurrent checkouts do not all queue on this row. See set_shards.
+    shard_count = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Inventory for {self.product_variant}"
+
+    @property
+    def sharded(self):
+        return self.shard_count > 0
+
+    def totals(self):
+        """On-hand and reserved quantities, summed over the shards if any."""
+        if not self.sharded:
+            return self.quantity, self.reserved
+        totals = self.shards.aggregate(
+            quantity=Coalesce(Sum("quantity"), 0), reserved=Coalesce(Sum("reserved"), 0)
+        )
+        return totals["quantity"], totals["reserved"]
+
+    @property
+    def available(self):
+        quantity, reserved = self.totals()
+        return quantity - reserved
+
+    @transaction.atomic
+    def set_shards(self, count):
+        """
+        Spread the stock over ``count`` shards, or fold it back into this row
+        with 0. Reservations move along, so pending orders are unaffected.
+        """
+        inventory = Inventory.objects.select_for_update().get(pk=self.pk)
+        shards = list(inventory.shards.select_for_update())
+        quantity = inventory.quantity + sum(shard.quantity for shard in shards)
+        reserved = inventory.reserved + sum(shard.reserved for shard in shards)
+        inventory.shards.all().delete()
+
+        if count:
+            base, extra = divmod(quantity, count)
+            new_shards = []
+            for index in range(count):
+                shard_quantity = base + (index < extra)
+                shard_reserved = min(reserved, shard_quantity)
+                reserved -= shard_reserved
+                new_shards.append(
+                    InventoryShard(
+                        inventory=inventory,
+                        index=index,
+                        quantity=shard_quantity,
+                        reserved=shard_reserved,
+                    )
+                )
+            InventoryShard.objects.bulk_create(new_shards)
+            quantity = reserved = 0
+
+        Inventory.objects.filter(pk=self.pk).update(
+            quantity=quantity, reserved=reserved, shard_count=count
+        )
+        self.quantity, self.reserved, self.shard_count = quantity, reserved, count
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # A stale instance must not write back old reservation or shard
+            # counts, those only move through their own UPDATEs
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("reserved", "shard_count")
+            ]
+        super().save(*args, **kwargs)
+
+
+class InventoryShard(models.Model):
+    inventory = models.ForeignKey(
+        Inventory, on_delete=models.CASCADE, related_name="shards"
+    )
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["inventory", "index"], name="unique_inventory_shard"
+            )
+        ]
+
+    def __str__(self):
+        return f"Shard {self.index} of {self.inventory}"
+
+
+class ProductCardManager(models.Manager):
+    def refresh(self, product_id):
+        """
+        Recompute the card of a single product from its variants, reviews,
+        images and inventory. Removes the card if the product is gone.
+        Prices come from the product's persisted range, so refresh that first.
+        """
+        variants = ProductVariant.objects.filter(product=OuterRef("pk"))
+        reviews = (
+            Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+        )
+        images = ProductImage.objects.filter(product=OuterRef("pk")).order_by("pk")
+        row = (
+            Product.objects.filter(pk=product_id)
+            .annotate(
+                card_in_stock=Exists(
+                    variants.filter(
+                        Q(inventory__quantity__gt=F("inventory__reserved"))
+                        | Q(
+                            inventory__shards__quantity__gt=F(
+                                "inventory__shards__reserved"
+                            )
+                        )
+                    )
+                ),
+                card_review_count=Coalesce(
+                    Subquery(reviews.annotate(count=Count("pk")).values("count")),
+                    Value(0),
+                ),
+                card_average_rating=Subquery(
+                    reviews.annotate(average=Avg("rating")).values("average")
+                ),
+                card_image=Subquery(images.values("image")[:1]),
+            )
+            .values(
+                "category_id",
+                "title",
+                "slug",
+                "available",
+                "created_at",
+                "min_price",
+                "max_price",
+                "card_in_stock",
+                "card_review_count",
+                "card_average_rating",
+                "card_image",
+            )
+            .first()
+        )
+        if row is None:
+            self.filter(product_id=product_id).delete()
+            return None
+
+        values = {
+            "category_id": row["category_id"],
+            "title": row["title"],
+            "slug": row["slug"],
+            "available": row["available"],
+            "created_at": row["created_at"],
+            "lowest_price": row["min_price"],
+            "highest_price": row["max_price"],
+            "in_stock": row["card_in_stock"],
+            "review_count": row["card_review_count"],
+            "average_rating": row["card_average_rating"],
+            "image": row["card_image"] or "",
+        }
+        card = self.filter(product_id=product_id).first()
+        if card is None:
+            return self.create(product_id=product_id, **values)
+
+        # Only write (and so only invalidate cached lists) when something the
+        # list shows has actually changed
+        changed = [
+            field for field, value in values.items() if getattr(card, field) != value
+        ]
+        if changed:
+            for field in changed:
+                setattr(card, field, values[field])
+            card.save(update_fields=changed + ["refreshed_at"])
+        return card
+
+
+class ProductCard(models.Model):
+    """
+    Denormalized read model behind the product list. One row per product,
+    kept in sync by the receivers in ``products.signals``; never edit directly.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="card"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    # Its trigram index for the list search is created by migration 0009
+    # on PostgreSQL only, so it is not declared in Meta
+    title = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255)
+    available = models.BooleanField(default=True)
+    image = models.ImageField(upload_to="product_images/", blank=True)
+    lowest_price = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    highest_price = models.PositiveIntegerField(null=True, blank=True)
+    average_rating = models.FloatField(null=True, blank=True)
+    review_count = models.PositiveIntegerField(default=0)
+    in_stock = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductCardManager()
+
+    class Meta:
+        ordering = ("-created_at", "-product_id")
+        indexes = [
+            # Keyset pagination walks these, newest first
+            models.Index(fields=["-created_at", "-product"], name="card_created_idx"),
+            models.Index(
+                fields=["category", "-created_at", "-product"],
+                name="card_category_created_idx",
+            ),
+            models.Index(
+                fields=["category", "lowest_price"], name="card_category_price_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets receivers see the category a card is moving away from
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def __str__(self):
+        return f"Card of {self.title}"
@@ -0,0 +1,126 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import (
+    Case,
+    F,
+    Func,
+    IntegerField,
+    Q,
+    TextField,
+    Value,
+    When,
+)
+
+# "simple" does no stemming, which suits a catalog mixing Persian and English
+SEARCH_CONFIG = "simple"
+# Below this title similarity a typo-tolerant match is treated as noise
+TRIGRAM_THRESHOLD = 0.3
+# Tags of the rich-text description, replaced by a space rather than
+# dropped, so "<p>red</p><p>shoe</p>" stays two words. Also used in SQL by
+# update_search_vectors and the backfill of migration 0005.
+HTML_TAG = r"<[^>]*>"
+
+
+def strip_html(text):
+    return re.sub(HTML_TAG, " ", text or "")
+
+
+def uses_postgres():
+    return connection.vendor == "postgresql"
+
+
+def build_search_vector(title, description):
+    """Title weighted over description, with the rich-text HTML stripped."""
+    return SearchVector(
+        Value(title or ""), weight="A", config=SEARCH_CONFIG
+    ) + SearchVector(Value(strip_html(description)), weight="B", config=SEARCH_CONFIG)
+
+
+def build_prefix_query(text):
+    """
+    Turn free text into a raw tsquery where every term is a prefix, so
+    "smart pho" already matches "smartphone" while the user is typing.
+    """
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def update_search_vector(product):
+    if not uses_postgres():
+        return
+    type(product).objects.filter(pk=product.pk).update(
+        search_vector=build_search_vector(product.title, product.description)
+    )
+
+
+def update_search_vectors(queryset):
+    """
+    update_search_vector for every product of ``queryset`` in one UPDATE,
+    for bulk inserts. The HTML is stripped by the database instead.
+    """
+    if not uses_postgres():
+        return
+    description = Func(
+        "description",
+        Value(HTML_TAG),
+        Value(" "),
+        Value("g"),
+        function="REGEXP_REPLACE",
+        output_field=TextField(),
+    )
+    queryset.update(
+        search_vector=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(description, weight="B", config=SEARCH_CONFIG)
+    )
+
+
+def search_products(queryset, text):
+    """
+    Ranked full-text search on PostgreSQL, falling back to title similarity
+    when nothing matches (typos). Other databases, like the SQLite used by
+    the test settings, get a plain substring search instead.
+    """
+    if not uses_postgres():
+        return _search_substring(queryset, text)
+
+    raw_query = build_prefix_query(text)
+    if raw_query is None:
+        return queryset.none()
+
+    query = SearchQuery(raw_query, search_type="raw", config=SEARCH_CONFIG)
+    matches = (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-pk")
+    )
+    if matches.exists():
+        return matches
+
+    return (
+        queryset.annotate(rank=TrigramSimilarity("title", text))
+        .filter(rank__gt=TRIGRAM_THRESHOLD)
+        .order_by("-rank", "-pk")
+    )
+
+
+def _search_substring(queryset, text):
+    return (
+        queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+        .annotate(
+            rank=Case(
+                When(title__icontains=text, then=Value(2)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("-rank", "-pk")
+    )
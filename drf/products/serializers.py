@@ -6,6 +6,7 @@ from .models import (
     Category,
     Inventory,
     Product,
+    ProductCard,
     ProductImage,
     ProductVariant,
     Review,
@@ -13,7 +14,20 @@ from .models import (
 )
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Takes ``fields=[...]`` to render only those fields, for the ``fields``
+    query parameter. See products.views.get_sparse_fields.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Adding format to the datetime fields
     created_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%S%z", read_only=True)
     updated_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%S%z", read_only=True)
@@ -55,6 +69,15 @@ class CategorySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class CategoryListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """The category list, without the attribute schemas."""
+
+    class Meta:
+        model = Category
+        fields = ["id", "parent", "title", "slug"]
+        read_only_fields = fields
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
@@ -75,7 +98,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             return None
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     variants = ProductVariantSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     lowest_price = serializers.SerializerMethodField()
@@ -130,14 +153,64 @@ class ProductSerializer(serializers.ModelSerializer):
                 )
         return value
 
-    # TODO: Add serializer for product list and product detail
-
     def create(self, validated_data):
         if "slug" not in validated_data or not validated_data["slug"]:
             validated_data["slug"] = slugify(validated_data["title"])
         return super().create(validated_data)
 
 
+class ProductCardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source="product_id", read_only=True)
+    # Adding format to the datetime fields
+    created_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%S%z", read_only=True)
+
+    class Meta:
+        model = ProductCard
+        fields = [
+            "id",
+            "category",
+            "title",
+            "slug",
+            "available",
+            "image",
+            "lowest_price",
+            "highest_price",
+            "average_rating",
+            "review_count",
+            "in_stock",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Products in lists other than the product list, e.g. search results,
+    shaped like ProductCardSerializer. Needs the products with their card
+    selected, see ProductListSerializer.setup_queryset.
+    """
+
+    image = serializers.ImageField(source="card.image", read_only=True)
+    lowest_price = serializers.IntegerField(source="min_price", read_only=True)
+    highest_price = serializers.IntegerField(source="max_price", read_only=True)
+    average_rating = serializers.FloatField(
+        source="card.average_rating", read_only=True
+    )
+    review_count = serializers.IntegerField(source="card.review_count", read_only=True)
+    in_stock = serializers.BooleanField(source="card.in_stock", read_only=True)
+    # Adding format to the datetime fields
+    created_at = serializers.DateTimeField(format="%Y-%m-%dT%H:%M:%S%z", read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ProductCardSerializer.Meta.fields
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.select_related("card")
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -149,6 +222,15 @@ class TagSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class TagListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """The tag list, without the ids of every tagged product."""
+
+    class Meta:
+        model = Tag
+        fields = ["id", "name", "slug"]
+        read_only_fields = fields
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
     user = serializers.StringRelatedField(read_only=True)
@@ -163,7 +245,42 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 class InventorySerializer(serializers.ModelSerializer):
     product_variant = serializers.StringRelatedField(read_only=True)
+    # Number of rows the stock is spread over for hot variants, 0 for one row
+    shards = serializers.IntegerField(
+        source="shard_count",
+        min_value=0,
+        max_value=Inventory.MAX_SHARDS,
+        required=False,
+    )
 
     class Meta:
         model = Inventory
-        fields = ["id", "product_variant", "quantity"]
+        fields = ["id", "product_variant", "quantity", "reserved", "shards"]
+        read_only_fields = ["reserved"]
+
+    def validate(self, attrs):
+        if self.instance and self.instance.sharded and "quantity" in attrs:
+            raise serializers.ValidationError(
+                {"quantity": "Set shards to 0 before changing a sharded stock."}
+            )
+        return attrs
+
+    def create(self, validated_data):
+        shard_count = validated_data.pop("shard_count", 0)
+        instance = super().create(validated_data)
+        if shard_count:
+            instance.set_shards(shard_count)
+        return instance
+
+    def update(self, instance, validated_data):
+        shard_count = validated_data.pop("shard_count", instance.shard_count)
+        instance = super().update(instance, validated_data)
+        if shard_count != instance.shard_count:
+            instance.set_shards(shard_count)
+        return instance
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if instance.sharded:
+            representation["quantity"], representation["reserved"] = instance.totals()
+        return representation
@@ -0,0 +1,98 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.caching import invalidate_product_lists
+from products.models import (
+    Category,
+    Inventory,
+    Product,
+    ProductCard,
+    ProductImage,
+    ProductVariant,
+    Review,
+)
+from products.search import update_search_vector
+
+
+def deleted_along_with(origin, *models):
+    """True when a post_delete was triggered by cascading from one of ``models``."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+@receiver(post_save, sender=Product)
+def refresh_card_on_product_save(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    if not created and update_fields is None:
+        # A full save writes back whatever price range the instance was
+        # loaded with, which may predate later variant changes
+        Product.refresh_price_range(instance.pk)
+    ProductCard.objects.refresh(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def refresh_search_vector_on_product_save(
+    sender, instance, update_fields=None, **kwargs
+):
+    if update_fields is not None and not {"title", "description"} & set(update_fields):
+        return
+    update_search_vector(instance)
+
+
+@receiver(post_save, sender=ProductVariant)
+def refresh_prices_on_variant_save(sender, instance, **kwargs):
+    # The card reads the persisted price range, so it goes second
+    Product.refresh_price_range(instance.product_id)
+    ProductCard.objects.refresh(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductVariant)
+def refresh_prices_on_variant_delete(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, Product):
+        return
+    Product.refresh_price_range(instance.product_id)
+    ProductCard.objects.refresh(instance.product_id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Review)
+def refresh_card_on_child_save(sender, instance, **kwargs):
+    ProductCard.objects.refresh(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Review)
+def refresh_card_on_child_delete(sender, instance, origin=None, **kwargs):
+    # The card goes away with the product itself, nothing to refresh
+    if deleted_along_with(origin, Product):
+        return
+    ProductCard.objects.refresh(instance.product_id)
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def refresh_card_on_inventory_change(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, Product, ProductVariant):
+        return
+    product_id = (
+        ProductVariant.objects.filter(pk=instance.product_variant_id)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    if product_id is not None:
+        ProductCard.objects.refresh(product_id)
+
+
+@receiver(post_save, sender=ProductCard)
+@receiver(post_delete, sender=ProductCard)
+def invalidate_lists_on_card_change(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_values", {})
+    invalidate_product_lists(instance.category_id, loaded.get("category_id"))
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_lists_on_category_delete(sender, instance, **kwargs):
+    # Cards drop the category through SET_NULL, which sends no signals
+    invalidate_product_lists(instance.pk)
@@ -0,0 +1,5 @@
+from products.models import ProductCard
+
+
+def refresh_product_card(product_id):
+    ProductCard.objects.refresh(product_id)
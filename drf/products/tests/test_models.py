@@ -1,4 +1,16 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib import admin
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase
+from orders.models import Order
+from products.management.commands import benchmark_http
+from products.management.commands.explain_views import Command as ExplainViews
 from products.models import (
     Category,
     Product,
@@ -7,6 +19,7 @@ from products.models import (
     Tag,
     Review,
     Inventory,
+    ProductCard,
 )
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
@@ -40,6 +53,29 @@ class ProductModelTest(TestCase):
         self.assertTrue(isinstance(self.product, Product))
         self.assertEqual(self.product.__str__(), self.product.title)
 
+    def test_price_range_follows_variants(self):
+        self.assertIsNone(self.product.min_price)
+        variant = ProductVariant.objects.create(
+            product=self.product, title="Cheap", slug="cheap", price=100
+        )
+        ProductVariant.objects.create(
+            product=self.product, title="Pricey", slug="pricey", price=300
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.min_price, 100)
+        self.assertEqual(self.product.max_price, 300)
+
+        variant.price = 500
+        variant.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.min_price, 300)
+        self.assertEqual(self.product.max_price, 500)
+
+        variant.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.min_price, 300)
+        self.assertEqual(self.product.max_price, 300)
+
 
 class ProductVariantModelTest(TestCase):
     def setUp(self):
@@ -142,3 +178,317 @@ class InventoryModelTest(TestCase):
     def test_inventory_creation(self):
         self.assertTrue(isinstance(self.inventory, Inventory))
         self.assertEqual(self.inventory.__str__(), f"Inventory for {self.variant}")
+
+    def test_set_shards_spreads_stock(self):
+        self.inventory.set_shards(3)
+        self.assertEqual(
+            list(self.inventory.shards.order_by("index").values_list("quantity")),
+            [(4,), (3,), (3,)],
+        )
+        self.assertEqual(self.inventory.totals(), (10, 0))
+        self.assertEqual(self.inventory.available, 10)
+        # The card counts the shards, not the emptied row
+        ProductCard.objects.refresh(self.product.id)
+        self.assertTrue(ProductCard.objects.get(product=self.product).in_stock)
+
+        self.inventory.set_shards(0)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 10)
+        self.assertFalse(self.inventory.sharded)
+
+    def test_admin_keeps_sharded_quantity_read_only(self):
+        model_admin = admin.site._registry[Inventory]
+        request = RequestFactory().get("/")
+        request.user = get_user_model()(is_staff=True, is_superuser=True)
+        self.assertIn("quantity", model_admin.get_fields(request, self.inventory))
+
+        self.inventory.set_shards(2)
+        self.inventory.refresh_from_db()
+        self.assertEqual(
+            model_admin.get_fields(request, self.inventory),
+            ["product_variant", "shard_totals"],
+        )
+        form = model_admin.get_form(request, self.inventory)
+        self.assertNotIn("quantity", form.base_fields)
+        self.assertTrue(
+            model_admin.shard_totals(self.inventory).startswith("10 on hand")
+        )
+
+
+class ProductCardModelTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            phone_number="09658456634", password="12345"
+        )
+        self.category = Category.objects.create(
+            title="Test Category", slug="test-category"
+        )
+        self.product = Product.objects.create(
+            category=self.category,
+            title="Test Product",
+            slug="test-product",
+            description="Test description",
+            available=True,
+        )
+
+    def get_card(self):
+        return ProductCard.objects.get(product=self.product)
+
+    def test_card_created_with_product(self):
+        card = self.get_card()
+        self.assertEqual(card.title, self.product.title)
+        self.assertEqual(card.category_id, self.category.id)
+        self.assertEqual(card.image.name, "product_images/default.png")
+        self.assertIsNone(card.lowest_price)
+        self.assertIsNone(card.average_rating)
+        self.assertEqual(card.review_count, 0)
+        self.assertFalse(card.in_stock)
+
+    def test_card_follows_variants_and_inventory(self):
+        cheap = ProductVariant.objects.create(
+            product=self.product, title="Cheap", slug="cheap", price=100
+        )
+        ProductVariant.objects.create(
+            product=self.product, title="Pricey", slug="pricey", price=300
+        )
+        self.assertEqual(self.get_card().lowest_price, 100)
+
+        inventory = Inventory.objects.create(product_variant=cheap, quantity=5)
+        self.assertTrue(self.get_card().in_stock)
+
+        inventory.quantity = 0
+        inventory.save()
+        self.assertFalse(self.get_card().in_stock)
+
+        cheap.delete()
+        self.assertEqual(self.get_card().lowest_price, 300)
+
+    def test_card_follows_reviews(self):
+        Review.objects.create(
+            product=self.product, user=self.user, rating=4, comment="Good"
+        )
+        Review.objects.create(product=self.product, user=None, rating=1, comment="Bad")
+        card = self.get_card()
+        self.assertEqual(card.review_count, 2)
+        self.assertEqual(card.average_rating, 2.5)
+
+    def test_card_follows_product_update(self):
+        self.product.title = "Renamed Product"
+        self.product.available = False
+        self.product.save()
+        card = self.get_card()
+        self.assertEqual(card.title, "Renamed Product")
+        self.assertFalse(card.available)
+
+    def test_card_removed_with_product(self):
+        ProductVariant.objects.create(
+            product=self.product, title="Variant", slug="variant", price=100
+        )
+        self.product.delete()
+        self.assertFalse(ProductCard.objects.exists())
+
+
+def seed_load(seed=1):
+    """A small, fixed seed_load run."""
+    call_command(
+        "seed_load",
+        f"--seed={seed}",
+        "--until=2026-01-01",
+        "--users=20",
+        "--category-depth=2",
+        "--category-breadth=2",
+        "--tags=10",
+        "--coupons=2",
+        "--products=30",
+        "--orders=40",
+        "--carts=5",
+        "--notifications=20",
+        "--batch-size=7",
+        stdout=StringIO(),
+        stderr=StringIO(),
+    )
+
+
+class SeedLoadTest(TestCase):
+    def snapshot(self):
+        return (
+            list(ProductCard.objects.values_list("title", "lowest_price", "in_stock")),
+            list(Order.objects.values_list("transaction_id", "total_amount")),
+        )
+
+    def test_same_seed_same_data(self):
+        with transaction.atomic():
+            seed_load()
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        seed_load()
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(Product.objects.count(), 30)
+
+    def test_stored_aggregates_match_the_rows(self):
+        seed_load()
+        for order in Order.objects.all():
+            Order.refresh_totals(order.pk)
+            refreshed = Order.objects.get(pk=order.pk)
+            self.assertEqual(refreshed.total_amount, order.total_amount)
+            self.assertEqual(refreshed.item_count, order.item_count)
+
+        card = ProductCard.objects.order_by("pk").first()
+        self.assertEqual(
+            ProductCard.objects.refresh(card.pk).refreshed_at, card.refreshed_at
+        )
+
+    def test_tables_keep_counting_after_seed(self):
+        seed_load()
+        category = Category.objects.create(title="After", slug="after")
+        self.assertEqual(category.pk, Category.objects.latest("pk").pk)
+        with self.assertRaises(CommandError):
+            seed_load()
+
+    def test_seeds_do_not_share_phone_numbers(self):
+        seed_load(2)
+        with self.assertRaisesMessage(CommandError, "between 0 and 99"):
+            seed_load(102)
+        get_user_model().objects.create_user(
+            phone_number="09030000000", password="12345"
+        )
+        with self.assertRaisesMessage(CommandError, "Seed 3 is already loaded"):
+            seed_load(3)
+
+
+class ExplainViewsTest(TestCase):
+    def setUp(self):
+        seed_load()
+
+    def row_counts(self):
+        counts = {}
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names():
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}"
+                )
+                counts[table] = cursor.fetchone()[0]
+        return counts
+
+    def explain(self, *args):
+        stdout = StringIO()
+        call_command("explain_views", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_leaves_no_rows_behind(self):
+        before = self.row_counts()
+        output = self.explain("--verbose-plans")
+        self.assertEqual(self.row_counts(), before)
+        self.assertIn("product list (200,", output)
+        self.assertTrue(output.endswith("0 sequential scan(s) flagged\n"))
+
+    def test_fail_on_flagged_scans(self):
+        # Every table is big enough with --min-rows 0, the product list
+        # at least reads a whole table on SQLite
+        with self.assertRaisesMessage(CommandError, "products_"):
+            self.explain("--min-rows=0", "--fail")
+        self.explain("--fail")
+
+    def test_sequential_scans(self):
+        command = ExplainViews()
+        command.tables = {"products_product", "orders_order"}
+        plan = [
+            "Seq Scan on products_product  (cost=0.00..1.10 rows=10 width=4)",
+            "  ->  Seq Scan on u0  (cost=0.00..1.10 rows=10 width=4)",
+            "Index Scan using orders_order_pkey on orders_order",
+            "SCAN orders_order",
+            "SCAN products_product USING INDEX product_created_idx",
+        ]
+        self.assertEqual(
+            list(command.sequential_scans(plan)), ["products_product", "orders_order"]
+        )
+
+    def test_needs_seeded_database(self):
+        Order.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "seed the database first"):
+            self.explain()
+
+
+class BenchmarkHttpTest(TestCase):
+    """The baseline handling of benchmark_http, without a server to measure."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "baseline.json")
+        self.command = benchmark_http.Command(stdout=StringIO())
+        self.command.options = {
+            "tolerance": 0.2,
+            "url": "http://127.0.0.1:8000",
+            "concurrency": 2,
+            "requests": 10,
+            "warmup": 1,
+            "seed": 1,
+        }
+        self.before = {
+            "requests": 10,
+            "errors": 0,
+            "throughput": 100.0,
+            "p50": 5.0,
+            "p95": 10.0,
+            "p99": 12.0,
+            "queries": 4.0,
+        }
+
+    def compare(self, **changes):
+        return self.command.compare(
+            "products", {**self.before, **changes}, {"products": self.before}
+        )
+
+    def test_compare_within_tolerance(self):
+        self.assertEqual(self.compare(p95=11.9, throughput=81.0, queries=4.5), [])
+        self.assertEqual(self.compare(queries=None), [])
+
+    def test_compare_regressions(self):
+        self.assertEqual(self.compare(p95=12.1), ["products"])
+        self.assertEqual(self.compare(throughput=79.0), ["products"])
+        self.assertEqual(
+            self.compare(queries=4.0 + benchmark_http.QUERY_SLACK + 0.1), ["products"]
+        )
+        self.assertIn("queries 4.0 -> 4.6", self.command.stdout.getvalue())
+
+    def test_baseline_round_trip(self):
+        self.command.save_baseline(self.path, {"products": self.before})
+        self.assertEqual(
+            self.command.load_baseline(self.path), {"products": self.before}
+        )
+        with open(self.path) as file:
+            self.assertEqual(json.load(file)["options"]["requests"], 10)
+
+    def test_unreadable_baseline(self):
+        with self.assertRaisesMessage(CommandError, "Could not read the baseline"):
+            self.command.load_baseline(self.path)
+        with open(self.path, "w") as file:
+            json.dump({"products": self.before}, file)
+        with self.assertRaisesMessage(CommandError, "Could not read the baseline"):
+            self.command.load_baseline(self.path)
+
+    def benchmark(self, result, *args):
+        self.command.save_baseline(self.path, {"products": self.before})
+        scenario = benchmark_http.Scenario("products", send=None)
+        with mock.patch.multiple(
+            benchmark_http.Command,
+            pick_targets=mock.DEFAULT,
+            start_workers=mock.DEFAULT,
+            scenarios=mock.Mock(return_value=[scenario]),
+            run=mock.Mock(return_value={**self.before, **result}),
+        ):
+            call_command(
+                "benchmark_http", f"--compare={self.path}", *args, stdout=StringIO()
+            )
+
+    def test_fail_on_regression(self):
+        self.benchmark({"p95": 20.0})
+        self.benchmark({"p95": 10.5}, "--fail")
+        with self.assertRaisesMessage(CommandError, "Regressed: products"):
+            self.benchmark({"p95": 20.0}, "--fail")
+
+    def test_needs_two_samples(self):
+        for args in (["--requests=1"], ["--concurrency=0"]):
+            with self.assertRaisesMessage(CommandError, "--requests 2+"):
+                call_command("benchmark_http", *args, stdout=StringIO())
@@ -0,0 +1,114 @@
+import importlib
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from products.models import Category, Product
+from products.search import (
+    build_prefix_query,
+    search_products,
+    strip_html,
+    update_search_vectors,
+)
+
+product_search_migration = importlib.import_module(
+    "products.migrations.0005_product_search"
+)
+
+
+class BuildPrefixQueryTest(TestCase):
+    def test_every_term_is_a_prefix(self):
+        self.assertEqual(build_prefix_query("smart pho"), "smart:* & pho:*")
+
+    def test_tsquery_operators_are_dropped(self):
+        self.assertEqual(build_prefix_query("a|b & !c:*"), "a:* & b:* & c:*")
+
+    def test_persian_terms_are_kept(self):
+        self.assertEqual(build_prefix_query("گوشی هوشمند"), "گوشی:* & هوشمند:*")
+
+    def test_no_terms(self):
+        self.assertIsNone(build_prefix_query(" -- "))
+
+
+class StripHtmlTest(TestCase):
+    def test_adjacent_tags_keep_words_apart(self):
+        self.assertEqual(strip_html("<p>red</p><p>shoe</p>").split(), ["red", "shoe"])
+
+    def test_no_description(self):
+        self.assertEqual(strip_html(None), "")
+
+
+class SearchProductsFallbackTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Phones", slug="phones")
+        self.described = Product.objects.create(
+            category=category,
+            title="Charger",
+            slug="charger",
+            description="<p>Works with any <b>phone</b></p>",
+        )
+        self.titled = Product.objects.create(
+            category=category, title="Smartphone", slug="smartphone"
+        )
+        Product.objects.create(category=category, title="Cable", slug="cable")
+
+    def test_title_matches_ranked_first(self):
+        results = list(search_products(Product.objects.all(), "phone"))
+        self.assertEqual(results, [self.titled, self.described])
+
+
+@skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+class SearchProductsPostgresTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Phones", slug="phones")
+        self.described = Product.objects.create(
+            category=category,
+            title="Charger",
+            slug="charger",
+            # Adjacent block tags, which must not run words together
+            description="<p>Works with any</p><p><b>phone</b></p>",
+        )
+        self.titled = Product.objects.create(
+            category=category, title="Phone stand", slug="phone-stand"
+        )
+        Product.objects.create(category=category, title="Cable", slug="cable")
+
+    def search_vectors(self):
+        return dict(Product.objects.values_list("pk", "search_vector"))
+
+    def test_prefix_matches_ranked_by_weight(self):
+        results = list(search_products(Product.objects.all(), "phon"))
+        self.assertEqual(results, [self.titled, self.described])
+        self.assertGreater(results[0].rank, results[1].rank)
+
+    def test_every_term_must_match(self):
+        results = list(search_products(Product.objects.all(), "phon stan"))
+        self.assertEqual(results, [self.titled])
+
+    def test_typo_falls_back_to_title_similarity(self):
+        results = list(search_products(Product.objects.all(), "chargr"))
+        self.assertEqual(results, [self.described])
+        self.assertGreater(results[0].rank, 0.3)
+
+    def test_nothing_similar_enough(self):
+        self.assertFalse(search_products(Product.objects.all(), "xyzzy").exists())
+
+    def test_search_vector_follows_saves(self):
+        self.titled.title = "Tripod"
+        self.titled.save()
+        self.assertEqual(
+            list(search_products(Product.objects.all(), "tripo")), [self.titled]
+        )
+
+    def test_migration_backfill_matches_saved_vectors(self):
+        saved = self.search_vectors()
+        Product.objects.update(search_vector=None)
+        with connection.cursor() as cursor:
+            cursor.execute(product_search_migration.BACKFILL_SQL)
+        self.assertEqual(self.search_vectors(), saved)
+
+    def test_bulk_update_matches_saved_vectors(self):
+        saved = self.search_vectors()
+        Product.objects.update(search_vector=None)
+        update_search_vectors(Product.objects.all())
+        self.assertEqual(self.search_vectors(), saved)
@@ -7,17 +7,31 @@ from products.models import (
     Tag,
     Review,
     Inventory,
+    ProductCard,
+)
+from products.fast_serializers import (
+    CategoryListValuesSerializer,
+    CategoryValuesSerializer,
+    ProductCardValuesSerializer,
+    ProductValuesSerializer,
+    TagListValuesSerializer,
+    ValuesSerializer,
 )
 from products.serializers import (
+    CategoryListSerializer,
     CategorySerializer,
+    ProductCardSerializer,
+    ProductListSerializer,
     ProductSerializer,
     ProductVariantSerializer,
     ProductImageSerializer,
+    TagListSerializer,
     TagSerializer,
     ReviewSerializer,
     InventorySerializer,
 )
 from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
 
 
 class CategorySerializerTest(TestCase):
@@ -54,6 +68,14 @@ class CategorySerializerTest(TestCase):
         self.assertEqual(data["title"], self.category_attributes["title"])
         self.assertEqual(data["slug"], self.category_attributes["slug"])
 
+    def test_sparse_fields(self):
+        data = CategorySerializer(self.category, fields=["id", "title"]).data
+        self.assertEqual(set(data.keys()), {"id", "title"})
+
+    def test_list_serializer_leaves_out_schemas(self):
+        data = CategoryListSerializer(self.category).data
+        self.assertEqual(set(data.keys()), {"id", "parent", "title", "slug"})
+
 
 class ProductSerializerTest(TestCase):
     def setUp(self):
@@ -102,6 +124,19 @@ class ProductSerializerTest(TestCase):
         self.assertEqual(data["available"], self.product_attributes["available"])
         self.assertEqual(data["attributes"], self.product_attributes["attributes"])
 
+    def test_list_serializer_matches_product_card(self):
+        ProductVariant.objects.create(
+            product=self.product, title="Red", slug="red", price=1500
+        )
+        product = ProductListSerializer.setup_queryset(Product.objects).get(
+            pk=self.product.pk
+        )
+        self.assertEqual(
+            ProductListSerializer(product).data,
+            ProductCardSerializer(product.card).data,
+        )
+        self.assertEqual(ProductListSerializer(product).data["lowest_price"], 1500)
+
 
 class ProductVariantSerializerTest(TestCase):
     def setUp(self):
@@ -169,6 +204,10 @@ class TagSerializerTest(TestCase):
         self.assertEqual(data["name"], self.tag_attributes["name"])
         self.assertEqual(data["slug"], self.tag_attributes["slug"])
 
+    def test_list_serializer_leaves_out_products(self):
+        data = TagListSerializer(self.tag).data
+        self.assertEqual(set(data.keys()), {"id", "name", "slug"})
+
 
 class ReviewSerializerTest(TestCase):
     def setUp(self):
@@ -221,8 +260,122 @@ class InventorySerializerTest(TestCase):
 
     def test_contains_expected_fields(self):
         data = self.serializer.data
-        self.assertEqual(set(data.keys()), set(["id", "product_variant", "quantity"]))
+        self.assertEqual(
+            set(data.keys()),
+            set(["id", "product_variant", "quantity", "reserved", "shards"]),
+        )
 
     def test_field_content(self):
         data = self.serializer.data
         self.assertEqual(data["quantity"], self.inventory_attributes["quantity"])
+
+
+class ValuesSerializerParityTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        parent = Category.objects.create(title="Parent", slug="parent")
+        self.category = Category.objects.create(
+            title="Phones",
+            slug="phones",
+            parent=parent,
+            product_attributes_schema={"type": "object"},
+        )
+        Tag.objects.create(name="New", slug="new")
+        self.product = Product.objects.create(
+            category=self.category,
+            title="Phone",
+            slug="phone",
+            description="<p>A phone</p>",
+            attributes={"color": "black"},
+        )
+        ProductImage.objects.create(
+            product=self.product, image="product_images/phone.png", alt_text="Phone"
+        )
+        ProductVariant.objects.create(
+            product=self.product,
+            title="64GB",
+            slug="64gb",
+            price=3000,
+            attributes={"storage": 64},
+        )
+        ProductVariant.objects.create(
+            product=self.product, title="128GB", slug="128gb", price=2000
+        )
+        for phone_number, rating in [("09120000001", 5), ("09120000002", 4)]:
+            Review.objects.create(
+                product=self.product,
+                user=User.objects.create_user(
+                    phone_number=phone_number, password="12345"
+                ),
+                rating=rating,
+                comment="Fine",
+            )
+        # Nothing but the default image
+        Product.objects.create(category=self.category, title="Case", slug="case")
+
+    def assertRendersSame(self, expected, actual):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(expected), renderer.render(actual))
+
+    def test_categories(self):
+        for serializer_class, values_serializer_class in [
+            (CategorySerializer, CategoryValuesSerializer),
+            (CategoryListSerializer, CategoryListValuesSerializer),
+        ]:
+            categories = Category.objects.order_by("pk")
+            self.assertRendersSame(
+                serializer_class(categories, many=True).data,
+                values_serializer_class(
+                    values_serializer_class.setup_queryset(categories), many=True
+                ).data,
+            )
+
+    def test_tags(self):
+        tags = Tag.objects.order_by("pk")
+        self.assertRendersSame(
+            TagListSerializer(tags, many=True).data,
+            TagListValuesSerializer(
+                TagListValuesSerializer.setup_queryset(tags), many=True
+            ).data,
+        )
+
+    def test_product_cards(self):
+        cards = ProductCard.objects.all()
+        self.assertRendersSame(
+            ProductCardSerializer(cards, many=True).data,
+            ProductCardValuesSerializer(
+                ProductCardValuesSerializer.setup_queryset(cards), many=True
+            ).data,
+        )
+
+    def test_products(self):
+        products = Product.objects.order_by("pk")
+        rows = ProductValuesSerializer.setup_queryset(products)
+        with self.assertNumQueries(4):
+            data = ProductValuesSerializer(rows, many=True).data
+        self.assertRendersSame(ProductSerializer(products, many=True).data, data)
+        self.assertRendersSame(
+            ProductSerializer(self.product).data,
+            ProductValuesSerializer(rows.get(pk=self.product.pk)).data,
+        )
+        self.assertEqual(data[0]["average_rating"], 4.5)
+        self.assertEqual(data[0]["lowest_price"], 2000)
+
+    def test_sparse_fields(self):
+        fields = ["id", "title", "lowest_price"]
+        rows = ProductValuesSerializer.setup_queryset(Product.objects.order_by("pk"))
+        with self.assertNumQueries(2):
+            data = ProductValuesSerializer(rows, many=True, fields=fields).data
+        self.assertRendersSame(
+            ProductSerializer(
+                Product.objects.order_by("pk"), many=True, fields=fields
+            ).data,
+            data,
+        )
+
+    def test_related_fields_need_add_related(self):
+        with self.assertRaisesMessage(TypeError, "no add_related()"):
+
+            class TagValuesSerializer(ValuesSerializer):
+                mirrors = TagSerializer
+                related = ("products",)
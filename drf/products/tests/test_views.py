@@ -1,3 +1,11 @@
+import base64
+import datetime as dt
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -12,6 +20,9 @@ from products.factories import (
 )
 from products.models import Category, Product, ProductVariant, Tag, Review
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from renderers import FastJSONRenderer
 
 User = get_user_model()
 
@@ -28,6 +39,137 @@ class ProductListViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_product_list_served_from_cards(self):
+        ProductVariantFactory(product=self.product, price=2000)
+        ReviewFactory(product=self.product, rating=4)
+        cache.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["id"], self.product.id)
+        self.assertEqual(response.data[0]["lowest_price"], 2000)
+        self.assertEqual(response.data[0]["average_rating"], 4)
+        self.assertEqual(response.data[0]["review_count"], 1)
+        self.assertTrue(response.data[0]["in_stock"])
+
+    def test_product_list_query_count_is_constant(self):
+        for product in ProductFactory.create_batch(9, category=self.category):
+            ProductVariantFactory.create_batch(2, product=product)
+            ReviewFactory(product=product)
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 10)
+
+    def test_product_list_cursor_pagination(self):
+        ProductFactory.create_batch(11, category=self.category)
+        response = self.client.get(self.url, {"pagination": "cursor", "count": "true"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        self.assertIsNone(response.data["previous"])
+        first_page = [product["id"] for product in response.data["results"]]
+        self.assertEqual(len(first_page), 10)
+
+        # Rows added after the first page don't shift the next one
+        ProductFactory(category=self.category)
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data["next"])
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["next"])
+        second_page = [product["id"] for product in response.data["results"]]
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(set(first_page) & set(second_page))
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(
+            [product["id"] for product in response.data["results"]], first_page
+        )
+
+    def test_product_list_cache_invalidated_on_change(self):
+        cache.clear()
+        self.client.get(self.url)
+        self.product.title = "Renamed Product"
+        self.product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data[0]["title"], "Renamed Product")
+
+        variant = ProductVariantFactory(product=self.product, price=1500)
+        response = self.client.get(self.url, {"category": self.category.id})
+        self.assertEqual(response.data[0]["lowest_price"], 1500)
+        variant.inventory.quantity = 0
+        variant.inventory.save()
+        response = self.client.get(self.url, {"category": self.category.id})
+        self.assertFalse(response.data[0]["in_stock"])
+
+    def test_product_list_cache_scoped_by_category(self):
+        other_category = CategoryFactory()
+        cache.clear()
+        self.client.get(self.url, {"category": self.category.id})
+        ProductFactory(category=other_category)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"category": self.category.id})
+        self.assertEqual(len(response.data), 1)
+
+        # Moving a product away from a category invalidates that category too
+        self.product.category = other_category
+        self.product.save()
+        response = self.client.get(self.url, {"category": self.category.id})
+        self.assertEqual(len(response.data), 0)
+
+    def test_product_list_price_filter_and_sort(self):
+        ProductVariantFactory(product=self.product, price=5000)
+        cheap = ProductFactory(category=self.category)
+        ProductVariantFactory(product=cheap, price=1000)
+        ProductVariantFactory(product=cheap, price=3000)
+        cache.clear()
+
+        response = self.client.get(self.url, {"sort": "price_asc"})
+        self.assertEqual(
+            [product["id"] for product in response.data], [cheap.id, self.product.id]
+        )
+        response = self.client.get(self.url, {"sort": "price_desc"})
+        self.assertEqual(
+            [product["id"] for product in response.data], [self.product.id, cheap.id]
+        )
+
+        # Ranges overlap on any variant: cheap has a 3000 variant
+        response = self.client.get(self.url, {"min_price": 2500, "max_price": 4000})
+        self.assertEqual([product["id"] for product in response.data], [cheap.id])
+        self.assertEqual(response.data[0]["highest_price"], 3000)
+
+    def test_product_list_invalid_price_params(self):
+        response = self.client.get(self.url, {"min_price": "cheap"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"sort": "title"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            self.url, {"sort": "price_asc", "pagination": "cursor"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_product_list_sparse_fields(self):
+        response = self.client.get(self.url, {"fields": "id,title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {"id", "title"})
+        # Cached apart from the full list
+        response = self.client.get(self.url)
+        self.assertIn("lowest_price", response.data[0])
+
+    def test_product_list_unknown_fields(self):
+        response = self.client.get(self.url, {"fields": "id,description"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("description", str(response.data["fields"]))
+
+    def test_product_list_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_list_tampered_cursor(self):
+        for value in ("not-a-date", 5, None):
+            payload = json.dumps({"v": value, "p": self.product.pk, "r": False})
+            cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+            response = self.client.get(self.url, {"cursor": cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_product(self):
         self.client.force_authenticate(user=self.admin_user)
         data = {
@@ -47,6 +189,12 @@ class ProductListViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.product.title)
 
+    def test_get_product_detail_sparse_fields(self):
+        url = reverse("products:product-detail", kwargs={"pk": self.product.id})
+        response = self.client.get(url, {"fields": "title,variants"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {"title", "variants"})
+
 
 class ProductSearchFilterViewTestCase(APITestCase):
     def setUp(self):
@@ -97,6 +245,15 @@ class ProductSearchFilterViewTestCase(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["title"], "Smartphone")
 
+    def test_search_results_shaped_like_product_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"fields": "id,title,lowest_price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(set(response.data[0]), {"id", "title", "lowest_price"})
+        prices = {item["title"]: item["lowest_price"] for item in response.data}
+        self.assertEqual(prices, {"Smartphone": 50000, "Python Book": 5000})
+
     def test_search_by_description(self):
         response = self.client.get(self.url, {"search": "Python programming"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -121,6 +278,30 @@ class ProductSearchFilterViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
 
+    def test_filter_by_price_range_excludes_products(self):
+        response = self.client.get(self.url, {"min_price": "8000"})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["title"], "Smartphone")
+
+    def test_filter_by_invalid_price(self):
+        for params in ({"min_price": "abc"}, {"max_price": "1.5"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sort_by_price(self):
+        response = self.client.get(self.url, {"sort": "price_asc"})
+        self.assertEqual(
+            [product["title"] for product in response.data],
+            ["Python Book", "Smartphone"],
+        )
+        response = self.client.get(self.url, {"sort": "price_desc"})
+        self.assertEqual(
+            [product["title"] for product in response.data],
+            ["Smartphone", "Python Book"],
+        )
+        response = self.client.get(self.url, {"sort": "newest"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_combined_filters(self):
         response = self.client.get(
             self.url,
@@ -136,6 +317,41 @@ class ProductSearchFilterViewTestCase(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["title"], "Smartphone")
 
+    def test_facets(self):
+        self.product1.attributes = {"color": "black"}
+        self.product1.save()
+        self.category1.product_attributes_schema = {"color": "string"}
+        self.category1.save()
+        response = self.client.get(self.url, {"tags": "bestseller", "facets": "true"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+        facets = response.data["facets"]
+        self.assertCountEqual(
+            [
+                (category["slug"], category["count"])
+                for category in facets["categories"]
+            ],
+            [("electronics", 1), ("books", 1)],
+        )
+        self.assertEqual(
+            [(tag["slug"], tag["count"]) for tag in facets["tags"]],
+            [("bestseller", 2), ("new", 1)],
+        )
+        self.assertEqual(facets["price"][0], {"min": 0, "max": 1000000, "count": 2})
+        self.assertEqual(sum(band["count"] for band in facets["price"]), 2)
+        self.assertEqual(
+            facets["attributes"]["color"], [{"value": "black", "count": 1}]
+        )
+
+    def test_facets_follow_filters(self):
+        response = self.client.get(self.url, {"category": "books", "facets": "true"})
+        facets = response.data["facets"]
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            [(tag["slug"], tag["count"]) for tag in facets["tags"]],
+            [("bestseller", 1)],
+        )
+
     def test_no_results(self):
         response = self.client.get(self.url, {"search": "nonexistent"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -177,6 +393,7 @@ class CategoryListViewTest(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
+        self.assertNotIn("product_attributes_schema", response.data[0])
 
     def test_create_category(self):
         self.client.force_authenticate(user=self.admin_user)
@@ -213,6 +430,7 @@ class TagListViewTest(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
+        self.assertNotIn("products", response.data[0])
 
     def test_create_tag(self):
         self.client.force_authenticate(user=self.admin_user)
@@ -274,3 +492,43 @@ class ReviewViewTest(APITestCase):
         response = self.client.post(self.url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Review.objects.count(), 2)
+
+
+class JSONRenderingTest(APITestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        ProductVariantFactory(product=ProductFactory(category=self.category))
+        self.url = reverse("products:product-list")
+        self.admin_user = User.objects.create_superuser("09010521833", "password123")
+
+    def test_renders_like_json_renderer(self):
+        data = {
+            "created_at": datetime(
+                2024, 9, 29, 12, 34, 56, 789, tzinfo=dt.timezone.utc
+            ),
+            "day": date(2024, 9, 29),
+            "price": Decimal("19.99"),
+            "label": gettext_lazy("Phones"),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "counts": {1: 2},
+            "title": "Gerät\u2028",
+            "tags": ("new", None),
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_product_list_bytes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_json_only(self):
+        response = self.client.get(self.url, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_invalid_json_body(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            self.url, '{"title": NaN}', content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("JSON parse error", response.data["detail"])
@@ -2,35 +2,90 @@ import json
 
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Max, Min, Q
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from pagination import KeysetPagination
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from rest_framework.views import APIView
 
+from .caching import PRODUCT_LIST_TIMEOUT, product_list_cache_key
+from .facets import compute_facets
+from .fast_serializers import (
+    CategoryListValuesSerializer,
+    ProductCardValuesSerializer,
+    ProductValuesSerializer,
+    TagListValuesSerializer,
+)
 from .models import (
     Category,
     Product,
+    ProductCard,
     ProductImage,
     ProductVariant,
     Review,
     Tag,
 )
+from .search import search_products
 from .serializers import (
+    CategoryListSerializer,
     CategorySerializer,
     InventorySerializer,
+    ProductCardSerializer,
     ProductImageSerializer,
+    ProductListSerializer,
     ProductSerializer,
     ProductVariantSerializer,
     ReviewSerializer,
+    TagListSerializer,
     TagSerializer,
 )
 
+# Price sorting follows the cheapest variant, the price shown on a card
+PRICE_SORTS = {"price_asc": "asc", "price_desc": "desc"}
+
+
+def price_ordering(sort, field):
+    direction = PRICE_SORTS[sort]
+    return (getattr(F(field), direction)(nulls_last=True), "-pk")
+
+
+def get_price_param(request, name):
+    """The integer query parameter ``name``, None when not given."""
+    value = request.query_params.get(name)
+    return int(value) if value else None
+
+
+def price_param_error():
+    return Response(
+        {"error": "min_price and max_price must be integers"},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def get_sparse_fields(request, serializer_class):
+    """
+    The comma separated ``fields`` query parameter as a list, None when not
+    given. Names the serializer does not have are a 400.
+    """
+    value = request.query_params.get("fields")
+    if not value:
+        return None
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = set(fields) - set(serializer_class().fields)
+    if unknown:
+        raise ValidationError(
+            {"fields": f"Unknown fields: {', '.join(sorted(unknown))}"}
+        )
+    return fields
+
 
 class ProductListView(APIView):
     throttle_classes = [UserRateThrottle, AnonRateThrottle]
+    query_budget = {"GET": 4, "POST": 16, "PUT": 12, "DELETE": 19}
 
     def get_permissions(self):
         if self.request.method in ["POST", "PUT", "DELETE"]:
@@ -46,13 +101,18 @@ class ProductListView(APIView):
           - Get all list of products \n
         input: \n
           - optional: category_slug, search \n
+          - optional: min_price, max_price, sort=price_asc|price_desc \n
+          - optional: pagination=cursor or cursor, page_size, count=true \n
+          - optional: fields, comma separated names of the fields to return \n
         return: \n
           - list of products (for a category) \n
+          - in cursor mode: ['next', 'previous', 'results'] \n
 
         Method: GET for `api/products/{id}/` \n
           - Retrieves a single product by its primary key (pk).\n
         input: \n
           - pk: The primary key of the product to retrieve.\n
+          - optional: fields, comma separated names of the fields to return \n
         return: \n
         - A Response object containing the serialized data of the product.\n
         - Status code: 200 OK if the product is found.\n
@@ -65,38 +125,75 @@ class ProductListView(APIView):
         category_id = request.query_params.get("category")
         search_query = request.query_params.get("search")
         page = request.query_params.get("page", 1)
+        sort = request.query_params.get("sort")
+        fields = get_sparse_fields(request, ProductCardSerializer)
+        try:
+            min_price = get_price_param(request, "min_price")
+            max_price = get_price_param(request, "max_price")
+        except ValueError:
+            return price_param_error()
+        if sort is not None and sort not in PRICE_SORTS:
+            return Response(
+                {"error": f"sort must be one of {', '.join(PRICE_SORTS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        cache_key = f"products_list_{category_id}_{search_query}_{page}"
-        cached_data = cache.get(cache_key)
+        keyset = KeysetPagination()
+        use_cursor = keyset.is_requested(request)
+        if use_cursor and sort:
+            return Response(
+                {"error": "Cursor pagination only supports the default ordering"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if cached_data:
-            return Response(cached_data, status=status.HTTP_200_OK)
+        if not use_cursor:
+            cache_key = product_list_cache_key(
+                category_id, search_query, page, min_price, max_price, sort, fields
+            )
+            cached_data = cache.get(cache_key)
+            if cached_data:
+                return Response(cached_data, status=status.HTTP_200_OK)
 
-        products = Product.objects.select_related("category").prefetch_related(
-            "variants", "images"
-        )
+        # Served from the denormalized cards, so a page costs the same number
+        # of queries whatever its size.
+        products = ProductCard.objects.all()
 
         if category_id:
             products = products.filter(category_id=int(category_id))
 
-        # Searching by title
-        # TODO: if you are using title to search. add index to it.
+        # Searching by title, served by a trigram index on PostgreSQL, see
+        # migration 0009_card_title_search
         if search_query:
             products = products.filter(title__icontains=search_query)
 
+        # Products whose variant price range overlaps the requested one
+        if min_price is not None:
+            products = products.filter(highest_price__gte=min_price)
+        if max_price is not None:
+            products = products.filter(lowest_price__lte=max_price)
+
+        if sort:
+            products = products.order_by(*price_ordering(sort, "lowest_price"))
+
+        products = ProductCardValuesSerializer.setup_queryset(products)
+
+        if use_cursor:
+            # A cursor page is one indexed range scan, no need to cache it
+            products_page = keyset.paginate_queryset(products, request, view=self)
+            serializer = ProductCardValuesSerializer(
+                products_page, many=True, fields=fields
+            )
+            return keyset.get_paginated_response(serializer.data)
+
         paginator = Paginator(products, 10)
         products_page = paginator.get_page(page)
 
-        serializer = ProductSerializer(products_page, many=True)
-
-        data = {
-            "results": serializer.data,
-            "count": paginator.count,
-            "num_pages": paginator.num_pages,
-            "current_page": int(page),
-        }
+        serializer = ProductCardValuesSerializer(
+            products_page, many=True, fields=fields
+        )
 
-        cache.set(cache_key, data, timeout=300)  # Cache for 5 minutes
+        # Stays valid until a product of this list changes, see caching.py
+        cache.set(cache_key, serializer.data, timeout=PRODUCT_LIST_TIMEOUT)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -116,8 +213,11 @@ class ProductListView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def get_detail(self, request, pk, format=None):
-        product = self.get_object(pk)
-        serializer = ProductSerializer(product)
+        fields = get_sparse_fields(request, ProductSerializer)
+        product = get_object_or_404(
+            ProductValuesSerializer.setup_queryset(Product.objects.all()), pk=pk
+        )
+        serializer = ProductValuesSerializer(product, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def put(self, request, pk, format=None):
@@ -159,27 +259,31 @@ class ProductSearchFilterView(APIView):
       - Searches and filters products based on various criteria
 
     Input:
-      - search (str): Search query for product title or description
+      - search (str): Search query for product title or description. Ranked
+        full-text search with prefix matching and a typo-tolerant fallback
+        on PostgreSQL
       - category (str): Slug of the category to filter by
       - tags (list): List of tag slugs to filter by
       - min_price (float): Minimum price for filtering
       - max_price (float): Maximum price for filtering
+      - sort (str): "price_asc" or "price_desc", by the cheapest variant
+      - facets (str): "true" to also return facet counts for the results
+      - fields (str): Comma separated names of the fields to return
 
     Return:
-      - List of serialized Product objects matching the search and filter criteria
+      - List of products matching the search and filter criteria, shaped
+        like the product list
+      - With facets=true: {"results": [...], "facets": {"categories", "tags",
+        "price", "attributes", "variant_attributes"}}
       - Status code: 200 OK
     """
 
+    query_budget = 9
+
     def get(self, request):
+        fields = get_sparse_fields(request, ProductListSerializer)
         queryset = Product.objects.all()
 
-        search_query = request.query_params.get("search", None)
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-                | Q(description__icontains=search_query)
-            )
-
         category = request.query_params.get("category", None)
         if category:
             queryset = queryset.filter(category__slug=category)
@@ -188,23 +292,47 @@ class ProductSearchFilterView(APIView):
         if tags:
             queryset = queryset.filter(tags__slug__in=tags).distinct()
 
-        min_price = request.query_params.get("min_price", None)
-        max_price = request.query_params.get("max_price", None)
-        if min_price or max_price:
-            queryset = queryset.annotate(
-                min_variant_price=Min("variants__price"),
-                max_variant_price=Max("variants__price"),
+        # Products whose variant price range overlaps the requested one, read
+        # from the persisted range rather than aggregating the variants
+        try:
+            min_price = get_price_param(request, "min_price")
+            max_price = get_price_param(request, "max_price")
+        except ValueError:
+            return price_param_error()
+        if min_price is not None:
+            queryset = queryset.filter(max_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(min_price__lte=max_price)
+
+        # Searched last, so the typo fallback only kicks in when nothing
+        # matches within the other filters
+        search_query = request.query_params.get("search", None)
+        if search_query:
+            queryset = search_products(queryset, search_query)
+
+        sort = request.query_params.get("sort", None)
+        if sort:
+            if sort not in PRICE_SORTS:
+                return Response(
+                    {"error": f"sort must be one of {', '.join(PRICE_SORTS)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = queryset.order_by(*price_ordering(sort, "min_price"))
+
+        serializer = ProductListSerializer(
+            ProductListSerializer.setup_queryset(queryset), many=True, fields=fields
+        )
+        if request.query_params.get("facets") == "true":
+            return Response(
+                {"results": serializer.data, "facets": compute_facets(queryset)},
+                status=status.HTTP_200_OK,
             )
-            if min_price:
-                queryset = queryset.filter(max_variant_price__gte=min_price)
-            if max_price:
-                queryset = queryset.filter(min_variant_price__lte=max_price)
-
-        serializer = ProductSerializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class ProductVariantListView(APIView):
+    query_budget = {"GET": 1, "POST": 7}
+
     def get_permissions(self):
         if self.request.method in ["POST"]:
             return [IsAdminUser()]
@@ -255,6 +383,8 @@ class ProductVariantListView(APIView):
 
 
 class ProductVariantDetailView(APIView):
+    query_budget = {"GET": 1, "PUT": 7, "DELETE": 14}
+
     def get_permissions(self):
         if self.request.method in ["PUT", "DELETE"]:
             return [IsAdminUser()]
@@ -314,6 +444,8 @@ class ProductVariantDetailView(APIView):
 
 
 class CategoryListView(APIView):
+    query_budget = {"GET": 1, "POST": 2}
+
     def get_permissions(self):
         if self.request.method in ["POST"]:
             return [IsAdminUser()]
@@ -325,15 +457,17 @@ class CategoryListView(APIView):
     def get(self, request):
         """
         Method: GET \n
-          - Description: Retrieves a list of all categories.\n
+          - Description: Retrieves a list of all categories, without their
+            attribute schemas.\n
         input: \n
-          - None\n
+          - optional: fields, comma separated names of the fields to return \n
         return: \n
           - A Response object containing a list of serialized category data.\n
           - Status code: 200 OK.\n
         """
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
+        fields = get_sparse_fields(request, CategoryListSerializer)
+        categories = CategoryListValuesSerializer.setup_queryset(Category.objects.all())
+        serializer = CategoryListValuesSerializer(categories, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -355,6 +489,8 @@ class CategoryListView(APIView):
 
 
 class CategoryDetailView(APIView):
+    query_budget = {"GET": 1, "PUT": 3, "DELETE": 8}
+
     def get_permissions(self):
         if self.request.method in ["PUT", "DELETE"]:
             return [IsAdminUser()]
@@ -414,6 +550,8 @@ class CategoryDetailView(APIView):
 
 
 class ProductImageListView(APIView):
+    query_budget = {"GET": 1, "POST": 5}
+
     def get_permissions(self):
         if self.request.method in ["POST"]:
             return [IsAdminUser()]
@@ -458,6 +596,8 @@ class ProductImageListView(APIView):
 
 
 class ProductImageDetailView(APIView):
+    query_budget = {"GET": 1, "PUT": 5, "DELETE": 6}
+
     def get_permissions(self):
         if self.request.method in ["PUT", "DELETE"]:
             return [IsAdminUser()]
@@ -517,6 +657,8 @@ class ProductImageDetailView(APIView):
 
 
 class TagListView(APIView):
+    query_budget = {"GET": 1, "POST": 7}
+
     def get_permissions(self):
         if self.request.method in ["POST"]:
             return [IsAdminUser()]
@@ -525,15 +667,16 @@ class TagListView(APIView):
     def get(self, request):
         """
         Method: GET \n
-          - Description: Retrieves a list of all tags.\n
+          - Description: Retrieves a list of all tags, without their products.\n
         input: \n
-          - None\n
+          - optional: fields, comma separated names of the fields to return \n
         return: \n
           - A Response object containing a list of serialized tag data.\n
           - Status code: 200 OK.\n
         """
-        tags = Tag.objects.all()
-        serializer = TagSerializer(tags, many=True)
+        fields = get_sparse_fields(request, TagListSerializer)
+        tags = TagListValuesSerializer.setup_queryset(Tag.objects.all())
+        serializer = TagListValuesSerializer(tags, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request):
@@ -555,66 +698,67 @@ class TagListView(APIView):
 
 
 class TagDetailView(APIView):
+    query_budget = {"GET": 2, "PUT": 5, "DELETE": 4}
+
     def get_permissions(self):
         if self.request.method in ["PUT", "DELETE"]:
             return [IsAdminUser()]
         return [AllowAny()]
 
-    def get_object(self, pk):
-        try:
-            return Tag.objects.get(pk=pk)
-        except Tag.DoesNotExist:
-            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+    def get_object(self, slug):
+        return get_object_or_404(Tag, slug=slug)
 
-    def get(self, request, pk):
+    def get(self, request, slug):
         """
         Method: GET \n
-          - Description: Retrieves a single tag by its primary key (pk).\n
+          - Description: Retrieves a single tag by its slug.\n
         input: \n
-          - pk: The primary key of the tag to retrieve.\n
+          - slug: The slug of the tag to retrieve.\n
         return: \n
           - A Response object containing the serialized data of the retrieved tag.\n
           - Status code: 200 OK.\n
         """
-        tag = self.get_object(pk)
+        tag = self.get_object(slug)
         serializer = TagSerializer(tag)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def put(self, request, pk):
+    def put(self, request, slug):
         """
         Method: PUT \n
-          - Description: Updates an existing tag by its primary key (pk).\n
+          - Description: Updates an existing tag by its slug.\n
         input: \n
-          - pk: The primary key of the tag to update.\n
+          - slug: The slug of the tag to update.\n
           - request.data: A dictionary containing the updated data for the tag.\n
         return: \n
           - A Response object containing the serialized data of the updated tag.\n
           - Status code: 200 OK if the update is successful.\n
           - Status code: 400 BAD REQUEST if the data is invalid.\n
         """
-        tag = self.get_object(pk)
+        tag = self.get_object(slug)
         serializer = TagSerializer(tag, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def delete(self, request, pk):
+    def delete(self, request, slug):
         """
         Method: DELETE \n
-          - Description: Deletes a tag by its primary key (pk).\n
+          - Description: Deletes a tag by its slug.\n
         input: \n
-          - pk: The primary key of the tag to delete.\n
+          - slug: The slug of the tag to delete.\n
         return: \n
           - A Response object with no content.\n
           - Status code: 204 NO CONTENT.\n
         """
-        tag = self.get_object(pk)
+        tag = self.get_object(slug)
         tag.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class InventoryView(APIView):
+    query_budget = {"GET": 3, "PUT": 8, "DELETE": 8}
+
     def get_permissions(self):
         if self.request.method in ["POST", "PUT", "DELETE"]:
             return [IsAdminUser()]
@@ -693,6 +837,8 @@ class InventoryView(APIView):
 
 
 class ReviewView(APIView):
+    query_budget = {"GET": 1, "POST": 6}
+
     def get_permissions(self):
         if self.request.method in ["POST", "PUT", "DELETE"]:
             return [IsAdminUser()]
@@ -700,7 +846,7 @@ class ReviewView(APIView):
 
     def get_object(self, product_id):
         try:
-            return Review.objects.filter(product=product_id)
+            return Review.objects.filter(product=product_id).select_related("user")
         except Review.DoesNotExist:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -0,0 +1,153 @@
+import logging
+import re
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+
+# Every view declares how many queries a request may cost, whatever the
+# amount of data behind it: ``query_budget = 3`` on the view class, a dict
+# per HTTP method or viewset action like ``{"GET": 2, "create": 4}``, or
+# the query_budget decorator on function views. OnlineShop/tests.py holds
+# every route to its budget at two data sizes; QueryBudgetMiddleware
+# reports the counts of live requests.
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+NUMBER = re.compile(r"\b\d+\b")
+# Transaction control, not queries. SQLite sends BEGIN and COMMIT through
+# the cursor where PostgreSQL does not, and savepoints are what transactions
+# become inside a test case's.
+TRANSACTION_CONTROL = (
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+    "SAVEPOINT",
+    "RELEASE SAVEPOINT",
+)
+
+
+def sql_shape(sql):
+    """``sql`` with IN lists of any length and inlined numbers made alike."""
+    return NUMBER.sub("N", IN_LIST.sub("IN (...)", sql))
+
+
+class QueryRecorder:
+    """
+    Counts the queries run on the default database while in use, and how
+    often each shape of SQL ran. The same shape running again and again
+    is what an N+1 looks like.
+    """
+
+    def __init__(self):
+        self.shapes = Counter()
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(TRANSACTION_CONTROL):
+            self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.shapes.values())
+
+    @property
+    def duplicates(self):
+        """``{shape: times}`` of the shapes that ran more than once."""
+        return {shape: times for shape, times in self.shapes.items() if times > 1}
+
+
+def query_budget(budget):
+    """Declare the budget of a function view, above its @api_view."""
+
+    def decorator(view):
+        view.query_budget = budget
+        return view
+
+    return decorator
+
+
+def get_budget(view, method):
+    """The budget ``view``, as resolved from a URL, declared for ``method``."""
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        # Set by APIView.as_view, and by ViewSetMixin.as_view respectively
+        view_class = getattr(view, "view_class", None) or getattr(view, "cls", None)
+        budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        action = (getattr(view, "actions", None) or {}).get(method.lower())
+        return budget.get(action, budget.get(method))
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Adds X-Query-Count, X-Query-Duplicates (queries repeating an earlier
+    shape) and X-Query-Budget to responses, and logs requests going over
+    their view's budget. Enabled by the QUERY_BUDGETS setting.
+
+    Streaming responses get no headers, their queries mostly run after the
+    headers went out.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Connections belong to threads. Under ASGI, the sync code of one
+        # request, views and ORM calls of async views alike, runs in one
+        # thread, so the recorder is installed there.
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        if response.streaming:
+            return response
+        budget = getattr(request, "query_budget", None)
+        repeated = sum(recorder.duplicates.values()) - len(recorder.duplicates)
+        response["X-Query-Count"] = recorder.count
+        response["X-Query-Duplicates"] = repeated
+        if budget is not None:
+            response["X-Query-Budget"] = budget
+            if recorder.count > budget:
+                logger.warning(
+                    "%s %s ran %d queries, over its budget of %d",
+                    request.method,
+                    request.path,
+                    recorder.count,
+                    budget,
+                )
+        for shape, times in recorder.duplicates.items():
+            logger.info(
+                "%s %s ran %d times: %s", request.method, request.path, times, shape
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_budget(view_func, request.method)
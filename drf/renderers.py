@@ -0,0 +1,58 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer writing the same bytes through orjson, several times faster
+    on long lists. Anything orjson has no native encoding for, datetimes
+    included, goes through DRF's encoder so it is written the same way.
+
+    Without orjson, or when asked to indent, JSONRenderer does the work.
+    """
+
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            # E.g. integers past 64 bits, which the json module still writes
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped as JSONRenderer does, to stay a strict javascript subset
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class JSONOnlyContentNegotiation(DefaultContentNegotiation):
+    """
+    Views offering a single renderer answer with it whatever the Accept
+    header asks for, instead of parsing it only to reply 406. Views with
+    several, like the schema views, negotiate as usual.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if len(renderers) == 1:
+            return renderers[0], renderers[0].media_type
+        return super().select_renderer(request, renderers, format_suffix)
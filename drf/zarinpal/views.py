@@ -63,12 +63,17 @@ def verify(authority, amount):
     data = json.dumps(data)
     # set content length by data
     headers = {"content-type": "application/json", "content-length": str(len(data))}
-    response = requests.post(ZP_API_VERIFY, data=data, headers=headers)
+    try:
+        response = requests.post(ZP_API_VERIFY, data=data, headers=headers, timeout=10)
+        if response.status_code == 200:
+            response = response.json()
+            if response["Status"] == 100:
+                return {"status": True, "RefID": response["RefID"]}
+            else:
+                return {"status": False, "code": str(response["Status"])}
+        return response
 
-    if response.status_code == 200:
-        response = response.json()
-        if response["Status"] == 100:
-            return {"status": True, "RefID": response["RefID"]}
-        else:
-            return {"status": False, "code": str(response["Status"])}
-    return response
+    except requests.exceptions.Timeout:
+        return {"status": False, "code": "timeout"}
+    except requests.exceptions.ConnectionError:
+        return {"status": False, "code": "connection error"}